@@ -0,0 +1,195 @@
+# encoding: utf-8
+"""
+Benchmark of the public FSM operations on generated DFAs (see dfa.generate()).
+Each operation is timed on a freshly prepared FSM (the best of several repetitions is kept), and its peak memory
+is measured in a separate, traced repetition. The report is written as JSON, for example:
+
+    python benchmark/bench.py --states 1000 --symbols 16 --density 0.5 --output report.json
+"""
+
+import argparse
+from collections import namedtuple
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fsm'))
+
+from cursor import Cursor
+from dfa import STRUCTURES, BenchmarkFSM, generate, build, walk
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+
+# Version of the report format
+REPORT_VERSION = 1
+
+# Monotonic high-resolution clock where available (Python 3)
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Benchmarked operation: setup(definition, sequence) prepares the context (untimed), run(context) is timed,
+# count(definition, sequence) is the number of items the operation processes
+Operation = namedtuple('Operation', ['name', 'setup', 'run', 'count'])
+
+
+def _with_states(definition):
+    fsm = BenchmarkFSM()
+    for state in definition.states:
+        fsm.add_state(state)
+    fsm.initial_state = definition.states[0]
+    if definition.dead_state is not None:
+        fsm.dead_state = definition.dead_state
+    return fsm
+
+
+def _compiled(definition):
+    fsm = build(definition)
+    fsm.compile()
+    return fsm
+
+
+def _step_all(fsm, sequence):
+    step = fsm.step
+    for symbol in sequence:
+        step(symbol)
+
+
+def _removed_states(definition):
+    # Any state but the initial one
+    return definition.states[1:]
+
+
+OPERATIONS = [
+    Operation('add_state', lambda d, s: (BenchmarkFSM(), d.states),
+              lambda c: [c[0].add_state(state) for state in c[1]], lambda d, s: len(d.states)),
+    Operation('add_transition', lambda d, s: (_with_states(d), d.transitions),
+              lambda c: [c[0].add_transition(transition) for transition in c[1]], lambda d, s: len(d.transitions)),
+    Operation('add_transitions', lambda d, s: (_with_states(d), d.transitions),
+              lambda c: c[0].add_transitions(c[1]), lambda d, s: len(d.transitions)),
+    Operation('validate', lambda d, s: build(d, validate=False),
+              lambda fsm: fsm.validate(), lambda d, s: len(d.transitions)),
+    Operation('compile', lambda d, s: build(d),
+              lambda fsm: fsm.compile(), lambda d, s: len(d.transitions)),
+    Operation('minimize', lambda d, s: build(d),
+              lambda fsm: fsm.minimize(), lambda d, s: len(d.states)),
+    Operation('step', lambda d, s: (build(d), s),
+              lambda c: _step_all(*c), lambda d, s: len(s)),
+    Operation('run', lambda d, s: (build(d), s),
+              lambda c: c[0].run(c[1]), lambda d, s: len(s)),
+    Operation('step_compiled', lambda d, s: (_compiled(d), s),
+              lambda c: _step_all(*c), lambda d, s: len(s)),
+    Operation('run_compiled', lambda d, s: (_compiled(d), s),
+              lambda c: c[0].run(c[1]), lambda d, s: len(s)),
+    Operation('cursor_run', lambda d, s: (Cursor(_compiled(d).table), s),
+              lambda c: c[0].run(c[1]), lambda d, s: len(s)),
+    Operation('match', lambda d, s: (_compiled(d), s),
+              lambda c: c[0].match(c[1]), lambda d, s: len(s)),
+    Operation('remove_transition', lambda d, s: (build(d), d.transitions),
+              lambda c: [c[0].remove_transition(transition) for transition in c[1]], lambda d, s: len(d.transitions)),
+    Operation('remove_transitions', lambda d, s: (build(d), d.transitions),
+              lambda c: c[0].remove_transitions(c[1]), lambda d, s: len(d.transitions)),
+    Operation('remove_state', lambda d, s: (build(d), _removed_states(d)),
+              lambda c: [c[0].remove_state(state) for state in c[1]], lambda d, s: len(d.states) - 1),
+    Operation('remove_states', lambda d, s: (build(d), _removed_states(d)),
+              lambda c: c[0].remove_states(c[1]), lambda d, s: len(d.states) - 1),
+]
+
+
+def measure(operation, definition, sequence, repeat=3, memory=True):
+    """
+    Measures a single operation.
+    :param operation: Operation
+    :type operation: Operation
+    :param definition: Generated DFA
+    :type definition: Definition
+    :param sequence: Symbols used by stepping operations
+    :type sequence: list
+    :param repeat: Number of timed repetitions
+    :type repeat: int
+    :param memory: Indicates whether to measure peak memory (Python 3 only)
+    :type memory: bool
+    :return: Result of the operation
+    :rtype: dict
+    """
+    best = None
+    for _ in range(repeat):
+        context = operation.setup(definition, sequence)
+        start = _clock()
+        operation.run(context)
+        elapsed = _clock() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak_memory = None
+    if memory and tracemalloc is not None:
+        context = operation.setup(definition, sequence)
+        tracemalloc.start()
+        try:
+            operation.run(context)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    count = operation.count(definition, sequence)
+    return {
+        'operation': operation.name,
+        'count': count,
+        'seconds': best,
+        'per_second': count / best if best else None,
+        'peak_memory': peak_memory
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the public FSM operations')
+    parser.add_argument('--states', type=int, default=1000, help='number of states')
+    parser.add_argument('--symbols', type=int, default=16, help='size of the alphabet')
+    parser.add_argument('--density', type=float, default=1.0,
+                        help='fraction of (state, symbol) pairs with a transition')
+    parser.add_argument('--no-dead-state', dest='dead_state', action='store_false', help='DFA without a dead state')
+    parser.add_argument('--structure', choices=STRUCTURES, default='random', help='shape of the DFA')
+    parser.add_argument('--callbacks', action='store_true', help='attach no-op callbacks to states and transitions')
+    parser.add_argument('--steps', type=int, default=100000, help='length of the stepped sequence')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed repetitions (best is reported)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generator')
+    parser.add_argument('--operations', help='comma-separated operations to run (all by default)')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip peak memory measurement')
+    parser.add_argument('--output', help='file to write the JSON report to (standard output by default)')
+    args = parser.parse_args(argv)
+
+    operations = OPERATIONS
+    if args.operations:
+        names = args.operations.split(',')
+        unknown = set(names) - set(operation.name for operation in OPERATIONS)
+        if unknown:
+            parser.error('Unknown operations: {}'.format(', '.join(sorted(unknown))))
+        operations = [operation for operation in OPERATIONS if operation.name in names]
+
+    definition = generate(args.states, args.symbols, args.density, args.dead_state, args.structure,
+                          callbacks=args.callbacks, seed=args.seed)
+    sequence = walk(definition, args.steps, seed=args.seed)
+    report = {
+        'version': REPORT_VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'parameters': dict((name, value) for (name, value) in vars(args).items() if name != 'output'),
+        'transitions': len(definition.transitions),
+        'results': [measure(operation, definition, sequence, args.repeat, args.memory) for operation in operations]
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
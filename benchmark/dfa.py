@@ -0,0 +1,137 @@
+# encoding: utf-8
+
+from collections import namedtuple
+import random
+
+from fsm import FSM
+from state import State, DeadState
+from transition import Transition
+
+
+# Generated DFA: its states (initial state first), dead state (or None), symbols and transitions
+Definition = namedtuple('Definition', ['states', 'dead_state', 'symbols', 'transitions'])
+
+# Shapes of generated DFAs
+STRUCTURES = ('random', 'chain')
+
+
+class BenchmarkFSM(FSM):
+    pass
+
+
+def _noop():
+    pass
+
+
+def generate(num_states, num_symbols, density=1.0, dead_state=True, structure='random', final_ratio=0.5,
+             callbacks=False, seed=None):
+    """
+    Generates a DFA with the given number of states and symbols. Every state is reachable from the initial state
+    and has at least one outgoing transition. Random DFAs connect the states by a random spanning tree first,
+    chains by a path through all of them (and back edges); remaining transitions are then added until
+    the requested density is reached.
+
+    :param num_states: Number of states (dead state excluded)
+    :type num_states: int
+    :param num_symbols: Size of the alphabet
+    :type num_symbols: int
+    :param density: Fraction of (state, symbol) pairs with a transition, must be 1 without a dead state
+    :type density: float
+    :param dead_state: Indicates whether the DFA has a dead state
+    :type dead_state: bool
+    :param structure: Shape of the DFA (see STRUCTURES)
+    :type structure: str
+    :param final_ratio: Fraction of final states (at least one state is final)
+    :type final_ratio: float
+    :param callbacks: Indicates whether every state and transition gets (no-op) callbacks
+    :type callbacks: bool
+    :param seed: Seed of the random generator
+    :type seed: (int|None)
+    :rtype: Definition
+    """
+    assert structure in STRUCTURES, 'Unknown structure: {}'.format(structure)
+    assert dead_state or density == 1.0, 'DFA without a dead state must be complete'
+    rng = random.Random(seed)
+    cells = num_states * num_symbols
+    count = max(int(round(density * cells)), num_states)
+    assert count <= cells, 'Density is too high'
+
+    fn = _noop if callbacks else None
+    states = [State(i, final=rng.random() < final_ratio, on_enter=fn, on_exit=fn, on_loop_enter=fn,
+                    on_loop_exit=fn) for i in range(num_states)]
+    states[rng.randrange(num_states)].final = True
+    symbols = list(range(num_symbols))
+
+    # Destination state ids by (source state id, symbol)
+    destinations = dict()
+    if structure == 'random':
+        for dst in range(1, num_states):
+            while True:
+                cell = (rng.randrange(dst), rng.randrange(num_symbols))
+                if cell not in destinations:
+                    destinations[cell] = dst
+                    break
+    else:
+        for dst in range(1, num_states):
+            destinations[(dst - 1, 0)] = dst
+
+    def destination(src, symbol):
+        return rng.randrange(num_states) if structure == 'random' else (src - symbol) % num_states
+
+    # States without any outgoing transition yet (leaves of the tree, end of the chain)
+    for src in set(range(num_states)) - set(src for (src, _) in destinations):
+        symbol = rng.randrange(num_symbols)
+        destinations[(src, symbol)] = destination(src, symbol)
+    remaining = [cell for cell in ((src, symbol) for src in range(num_states) for symbol in symbols)
+                 if cell not in destinations]
+    for (src, symbol) in rng.sample(remaining, count - len(destinations)):
+        destinations[(src, symbol)] = destination(src, symbol)
+
+    transitions = [Transition(symbol, states[src], states[dst], on_transition=fn)
+                   for ((src, symbol), dst) in sorted(destinations.items())]
+    return Definition(states, DeadState('dead', on_enter=fn) if dead_state else None, symbols, transitions)
+
+
+def build(definition, validate=True):
+    """
+    Builds an FSM from the given definition.
+    :param definition: Generated DFA
+    :type definition: Definition
+    :param validate: Indicates whether to validate the FSM
+    :type validate: bool
+    :rtype: BenchmarkFSM
+    """
+    fsm = BenchmarkFSM()
+    for state in definition.states:
+        fsm.add_state(state)
+    fsm.initial_state = definition.states[0]
+    if definition.dead_state is not None:
+        fsm.dead_state = definition.dead_state
+    for transition in definition.transitions:
+        fsm.add_transition(transition)
+    if validate:
+        fsm.validate()
+    return fsm
+
+
+def walk(definition, length, seed=None):
+    """
+    Generates a random sequence of symbols following defined transitions only (so it never leads into the dead state).
+    :param definition: Generated DFA
+    :type definition: Definition
+    :param length: Number of symbols
+    :type length: int
+    :param seed: Seed of the random generator
+    :type seed: (int|None)
+    :rtype: list
+    """
+    rng = random.Random(seed)
+    outgoing = dict((state, []) for state in definition.states)
+    for transition in definition.transitions:
+        outgoing[transition.src_state].append((transition.symbol, transition.dst_state))
+    sequence = []
+    state = definition.states[0]
+    for _ in range(length):
+        (symbol, state) = rng.choice(outgoing[state])
+        sequence.append(symbol)
+    return sequence
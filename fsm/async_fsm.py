@@ -0,0 +1,144 @@
+# encoding: utf-8
+
+import asyncio
+import inspect
+
+from fsm import FSM, RunResult
+from fsm_exceptions import ValidationRequired, UnknownSymbol
+
+
+class AsyncFSM(FSM):
+
+    def __init__(self):
+        """
+        FSM variant for asyncio applications. Its step() and run() are coroutines which await callbacks
+        that return awaitables (e.g. coroutine functions); plain callbacks are simply called.
+        Steps of the same instance are serialized with a per-instance lock, other instances are not affected.
+        """
+        # We are forcing AsyncFSM to be "abstract", each instance must be an instance of its subclass
+        assert type(self) is not AsyncFSM, 'AsyncFSM must be inherited from'
+        super(AsyncFSM, self).__init__()
+
+        # Lock serializing steps of this instance (created lazily, within the running event loop)
+        self._lock = None
+
+    async def step(self, symbol, concurrent=False):
+        """
+        Follows a transition corresponding to the given symbol and the current state, into the destination state.
+        Callbacks are awaited in the on_exit -> on_transition -> on_enter order.
+        Throws an exception if the symbol is not in the alphabet.
+        :param symbol: Symbol to follow
+        :type symbol: object
+        :param concurrent: Indicates whether the callbacks are independent of each other. If so, the current state
+                           is set first and the callbacks are then run concurrently (started in the usual order).
+        :type concurrent: bool
+        """
+        async with self._get_lock():
+            await self._step(symbol, concurrent)
+
+    async def run(self, symbols, stop_on_dead=False, concurrent=False):
+        """
+        Follows transitions for all of the given symbols (see FSM.run()), holding the lock for the whole batch.
+        :param symbols: Symbols to follow
+        :type symbols: (iterable|async iterable)
+        :param stop_on_dead: Indicates whether to stop consuming symbols once the FSM is in the dead state
+        :type stop_on_dead: bool
+        :param concurrent: Indicates whether the callbacks of each step are independent of each other (see step())
+        :type concurrent: bool
+        :return: Final state, number of consumed symbols and position of the symbol that led into the dead state
+        :rtype: RunResult
+        """
+        async with self._get_lock():
+            # Throw exception if FSM has not been validated (dirty)
+            if self._dirty:
+                raise ValidationRequired
+            consumed = 0
+            dead_at = None
+            if stop_on_dead and self.is_dead_state_on() and self.is_in_dead_state():
+                return RunResult(self.current_state, consumed, dead_at)
+
+            async for symbol in _iterate(symbols):
+                if symbol not in self._lookup_map():
+                    raise UnknownSymbol(symbol)
+                if await self._step(symbol, concurrent):
+                    dead_at = consumed
+                consumed += 1
+                if stop_on_dead and self.is_dead_state_on() and self.is_in_dead_state():
+                    break
+            return RunResult(self.current_state, consumed, dead_at)
+
+    async def _step(self, symbol, concurrent):
+        """
+        Helper function. Implementation of step(), must be called with the lock held.
+        :return: True if this step led into the dead state, False otherwise.
+        :rtype: bool
+        """
+        (dst_state, on_transition_fn, loop) = self._next(symbol)
+        src_state = self.current_state
+        # Callbacks with their profiling labels (state and kind, see CallbackProfiler)
+        on_exit = (src_state.on_loop_exit, src_state, 'on_loop_exit') if loop else \
+            (src_state.on_exit, src_state, 'on_exit')
+        on_transition = (on_transition_fn, src_state, 'on_transition')
+        on_enter = (dst_state.on_loop_enter, dst_state, 'on_loop_enter') if loop else \
+            (dst_state.on_enter, dst_state, 'on_enter')
+        if concurrent:
+            self._set_current_state(dst_state)
+            await asyncio.gather(self._perform_call_async(symbol, *on_exit),
+                                 self._perform_call_async(symbol, *on_transition),
+                                 self._perform_call_async(symbol, *on_enter))
+        else:
+            await self._perform_call_async(symbol, *on_exit)
+            await self._perform_call_async(symbol, *on_transition)
+            self._set_current_state(dst_state)
+            await self._perform_call_async(symbol, *on_enter)
+        self._record(symbol, src_state, dst_state, loop)
+        return not loop and dst_state is self._dead_state
+
+    def _get_lock(self):
+        """
+        Helper function.
+        :return: Lock of this instance
+        :rtype: asyncio.Lock
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _perform_call_async(self, symbol, fn, state, kind):
+        """
+        Helper function. The latency of the callback (awaiting included) is recorded if profiling is enabled.
+        :param symbol: Followed symbol
+        :type symbol: object
+        :param fn: Callable object that need to be called (if it is actually callable), its result is awaited
+                   if it is awaitable
+        :param fn: (callable|None)
+        :param state: State the callback belongs to
+        :type state: State
+        :param kind: Kind of the callback
+        :type kind: str
+        """
+        if not callable(fn):
+            return
+        profiler = self._profiler
+        start = profiler.clock() if profiler is not None else None
+        try:
+            result = fn()
+            if inspect.isawaitable(result):
+                await result
+        finally:
+            if profiler is not None:
+                profiler.record(state, kind, symbol, profiler.clock() - start)
+
+
+async def _iterate(symbols):
+    """
+    Helper function. Iterates over both regular and asynchronous iterables.
+    :param symbols: Symbols
+    :type symbols: (iterable|async iterable)
+    """
+    if hasattr(symbols, '__aiter__'):
+        async for symbol in symbols:
+            yield symbol
+    else:
+        for symbol in symbols:
+            yield symbol
@@ -0,0 +1,91 @@
+# encoding: utf-8
+
+import csv
+
+from state import State
+from transition import Transition
+
+
+def build(target, rows, initial, final=(), states=None, dead_state=None, validate=True):
+    """
+    Populates the given empty FSM from a transition table, in bulk: states are created from the ids in the table,
+    all transitions are checked and added as a single batch (see FSM.add_transitions()) and the FSM is validated
+    once at the end.
+
+    :param target: Empty FSM to populate
+    :type target: FSM
+    :param rows: Transition table as (symbol, src_id, dst_id) rows (see rows_from_dict() and rows_from_csv())
+    :type rows: iterable
+    :param initial: Id of the initial state
+    :type initial: object
+    :param final: Ids of the final states (of the created states)
+    :type final: iterable
+    :param states: States to use for their ids (e.g. to give them callbacks), other states are created
+    :type states: (iterable|None)
+    :param dead_state: Dead state of the FSM
+    :type dead_state: (DeadState|None)
+    :param validate: Indicates whether to validate the FSM
+    :type validate: bool
+    :return: Populated FSM
+    :rtype: FSM
+    """
+    known = dict((state.id, state) for state in states) if states is not None else dict()
+    final = set(final)
+
+    def state_of(state_id):
+        state = known.get(state_id)
+        if state is None:
+            state = known[state_id] = State(state_id, final=state_id in final)
+        return state
+
+    transitions = [Transition(symbol, state_of(src_id), state_of(dst_id)) for (symbol, src_id, dst_id) in rows]
+    initial_state = state_of(initial)
+    target.add_states(known.values())
+    target.initial_state = initial_state
+    if dead_state is not None:
+        target.dead_state = dead_state
+    target.add_transitions(transitions)
+    if validate:
+        target.validate()
+    return target
+
+
+def rows_from_dict(table):
+    """
+    :param table: Transition table as a two-level dict {symbol: {src_id: dst_id}} (same structure as FSM._map)
+    :type table: dict
+    :return: Transition table as (symbol, src_id, dst_id) rows
+    :rtype: generator
+    """
+    for (symbol, inner_dict) in table.items():
+        for (src_id, dst_id) in inner_dict.items():
+            yield (symbol, src_id, dst_id)
+
+
+def rows_from_csv(lines, symbol_type=None, state_type=None, header=False, **fmtparams):
+    """
+    Reads a transition table with one symbol,src_id,dst_id row per transition. Empty lines are skipped.
+    :param lines: Lines of the CSV file (e.g. the opened file)
+    :type lines: iterable
+    :param symbol_type: Function converting symbols (e.g. int), symbols are strings if undefined
+    :type symbol_type: (callable|None)
+    :param state_type: Function converting state ids (e.g. int), ids are strings if undefined
+    :type state_type: (callable|None)
+    :param header: Indicates whether the first row is a header to skip
+    :type header: bool
+    :param fmtparams: Formatting parameters of csv.reader()
+    :return: Transition table as (symbol, src_id, dst_id) rows
+    :rtype: generator
+    """
+    reader = csv.reader(lines, **fmtparams)
+    if header:
+        next(reader, None)
+    for row in reader:
+        if not row:
+            continue
+        (symbol, src_id, dst_id) = row
+        if symbol_type is not None:
+            symbol = symbol_type(symbol)
+        if state_type is not None:
+            (src_id, dst_id) = (state_type(src_id), state_type(dst_id))
+        yield (symbol, src_id, dst_id)
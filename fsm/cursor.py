@@ -0,0 +1,130 @@
+# encoding: utf-8
+
+from state import perform_call
+from table import RunResult
+from fsm_exceptions import UnknownSymbol
+
+
+class Cursor(object):
+
+    # Cursors are meant to be created in large numbers, so they only hold a reference
+    # to the shared transition table and the id of the current state
+    __slots__ = ('_table', '_current')
+
+    def __init__(self, table, state=None):
+        """
+        Initializes a new cursor. A cursor is a lightweight runtime of an FSM:
+        it steps against a shared (compiled) transition table and only tracks its own current state.
+        Any number of cursors can share the same table.
+
+        :param table: Transition table of a compiled FSM (see FSM.compile())
+        :type table: TransitionTable
+        :param state: State to start in, initial state of the table if undefined
+        :type state: (State|None)
+        """
+        self._table = table
+        self._current = table.initial if state is None else table.state_index[state]
+
+    @property
+    def table(self):
+        """
+        Gets the transition table this cursor steps against.
+        :return: Transition table
+        :rtype: TransitionTable
+        """
+        return self._table
+
+    @property
+    def current_state(self):
+        """
+        Gets the current state of the cursor.
+        :return: Current state
+        :rtype: State
+        """
+        return self._table.states[self._current]
+
+    def is_in_final_state(self):
+        """
+        :return: True if the current state is final, False otherwise.
+        :rtype: bool
+        """
+        return self.current_state.final
+
+    def is_in_dead_state(self):
+        """
+        :return: True if the current state is "dead" state, False otherwise.
+        :rtype: bool
+        """
+        return self._current == self._table.dead
+
+    def reset(self):
+        """
+        Moves the cursor back into the initial state (no callbacks are performed).
+        """
+        self._current = self._table.initial
+
+    def step(self, symbol):
+        """
+        Follows a transition corresponding to the given symbol and the current state, into the destination state.
+        Callbacks are performed exactly as in FSM.step().
+        Throws an exception if the symbol is not in the alphabet.
+        :param symbol: Symbol to follow
+        :type symbol: object
+        """
+        table = self._table
+        column = table.symbol_index.get(symbol)
+        assert column is not None, 'Unknown symbol: {}'.format(symbol)
+        src = self._current
+        cell = src * table.width + column
+        dst = table.next_states[cell]
+        src_state = table.states[src]
+        dst_state = table.states[dst]
+        loop = src == dst
+        perform_call(src_state.on_loop_exit if loop else src_state.on_exit)
+        perform_call(table.callbacks[cell])
+        self._current = dst
+        perform_call(dst_state.on_loop_enter if loop else dst_state.on_enter)
+
+    def run(self, symbols, stop_on_dead=False):
+        """
+        Follows transitions for all of the given symbols (see FSM.run()).
+        :param symbols: Symbols to follow
+        :type symbols: iterable
+        :param stop_on_dead: Indicates whether to stop consuming symbols once the cursor is in the dead state
+        :type stop_on_dead: bool
+        :return: Final state, number of consumed symbols and position of the symbol that led into the dead state
+        :rtype: RunResult
+        """
+        table = self._table
+        symbol_index = table.symbol_index
+        next_states = table.next_states
+        callbacks = table.callbacks
+        states = table.states
+        width = table.width
+        dead = table.dead
+        src = self._current
+        consumed = 0
+        dead_at = None
+        if stop_on_dead and src == dead:
+            return RunResult(states[src], consumed, dead_at)
+
+        for symbol in symbols:
+            column = symbol_index.get(symbol)
+            if column is None:
+                raise UnknownSymbol(symbol)
+            cell = src * width + column
+            dst = next_states[cell]
+            src_state = states[src]
+            dst_state = states[dst]
+            loop = src == dst
+            if not loop and dst == dead:
+                dead_at = consumed
+
+            perform_call(src_state.on_loop_exit if loop else src_state.on_exit)
+            perform_call(callbacks[cell])
+            self._current = src = dst
+            perform_call(dst_state.on_loop_enter if loop else dst_state.on_enter)
+            consumed += 1
+            if stop_on_dead and src == dead:
+                break
+        return RunResult(states[src], consumed, dead_at)
@@ -0,0 +1,191 @@
+# encoding: utf-8
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Condition
+
+from fsm import FSM, RunResult
+from fsm_exceptions import ValidationRequired, UnknownSymbol
+
+
+class DeferredFSM(FSM):
+
+    def __init__(self, executor=None):
+        """
+        FSM variant which performs callbacks in the background. step() and run() change the current state
+        immediately and enqueue the callbacks (in the usual on_exit -> on_transition -> on_enter order) onto
+        a per-instance queue, which is drained by an executor. Callbacks of an instance are always performed
+        one at a time and in order, even when the executor is shared by many instances.
+        An error raised by a callback discards the callbacks queued after it, and is raised again by the next
+        call of step(), run() or flush().
+
+        :param executor: Executor performing the callbacks (e.g. a thread pool shared by many instances),
+                         a single-thread pool owned by this instance if undefined
+        :type executor: (concurrent.futures.Executor|None)
+        """
+        # We are forcing DeferredFSM to be "abstract", each instance must be an instance of its subclass
+        assert type(self) is not DeferredFSM, 'DeferredFSM must be inherited from'
+        super(DeferredFSM, self).__init__()
+
+        self._executor = executor
+        # Indicates whether the executor was created by (and has to be shut down with) this instance
+        self._owns_executor = executor is None
+
+        # Callbacks waiting to be performed, guarded by the condition
+        self._queue = deque()
+        self._condition = Condition()
+        # Indicates whether a task draining the queue has been submitted to the executor
+        self._draining = False
+        # First error raised by a callback, until it is raised again
+        self._error = None
+
+    def step(self, symbol):
+        """
+        Follows a transition corresponding to the given symbol and the current state, into the destination state.
+        The callbacks are enqueued, and performed in the background.
+        Throws an exception if the symbol is not in the alphabet, or if a callback has failed.
+        :param symbol: Symbol to follow
+        :type symbol: object
+        """
+        self._raise_error()
+        callbacks = []
+        self._step(symbol, callbacks)
+        self._enqueue(callbacks)
+
+    def run(self, symbols, stop_on_dead=False):
+        """
+        Follows transitions for all of the given symbols (see FSM.run()), enqueuing the callbacks of all steps.
+        Throws an exception if a symbol is not in the alphabet, or if a callback has failed.
+        :param symbols: Symbols to follow
+        :type symbols: iterable
+        :param stop_on_dead: Indicates whether to stop consuming symbols once the FSM is in the dead state
+        :type stop_on_dead: bool
+        :return: Final state, number of consumed symbols and position of the symbol that led into the dead state
+        :rtype: RunResult
+        """
+        self._raise_error()
+        # Throw exception if FSM has not been validated (dirty)
+        if self._dirty:
+            raise ValidationRequired
+        consumed = 0
+        dead_at = None
+        if stop_on_dead and self.is_dead_state_on() and self.is_in_dead_state():
+            return RunResult(self.current_state, consumed, dead_at)
+
+        callbacks = []
+        try:
+            for symbol in symbols:
+                if symbol not in self._lookup_map():
+                    raise UnknownSymbol(symbol)
+                if self._step(symbol, callbacks):
+                    dead_at = consumed
+                consumed += 1
+                if stop_on_dead and self.is_dead_state_on() and self.is_in_dead_state():
+                    break
+        finally:
+            # Steps that were taken keep their callbacks
+            self._enqueue(callbacks)
+        return RunResult(self.current_state, consumed, dead_at)
+
+    def flush(self, timeout=None):
+        """
+        Waits until all enqueued callbacks have been performed.
+        Throws an exception if a callback has failed.
+        :param timeout: Maximum time to wait in seconds, no limit if undefined
+        :type timeout: (float|None)
+        :return: True if the queue was drained, False if the timeout expired
+        :rtype: bool
+        """
+        with self._condition:
+            drained = self._condition.wait_for(lambda: not self._draining, timeout)
+        self._raise_error()
+        return drained
+
+    def join(self):
+        """
+        Waits until all enqueued callbacks have been performed (see flush()) and shuts down the executor
+        owned by this instance (a new one is created by the next step). A shared executor is left running.
+        """
+        try:
+            self.flush()
+        finally:
+            if self._owns_executor and self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _step(self, symbol, callbacks):
+        """
+        Helper function. Changes the current state and appends the callbacks of the step to the given list.
+        :return: True if this step led into the dead state, False otherwise.
+        :rtype: bool
+        """
+        (dst_state, on_transition_fn, loop) = self._next(symbol)
+        src_state = self.current_state
+        self._set_current_state(dst_state)
+        profiler = self._profiler
+        for (fn, state, kind) in ((src_state.on_loop_exit, src_state, 'on_loop_exit') if loop else
+                                  (src_state.on_exit, src_state, 'on_exit'),
+                                  (on_transition_fn, src_state, 'on_transition'),
+                                  (dst_state.on_loop_enter, dst_state, 'on_loop_enter') if loop else
+                                  (dst_state.on_enter, dst_state, 'on_enter')):
+            if callable(fn):
+                # Profiled callbacks are timed when they are performed, in the background
+                callbacks.append(fn if profiler is None else partial(profiler.call, fn, state, kind, symbol))
+        self._record(symbol, src_state, dst_state, loop)
+        return not loop and dst_state is self._dead_state
+
+    def _enqueue(self, callbacks):
+        """
+        Helper function. Enqueues the given callbacks, making sure the queue is being drained.
+        :param callbacks: Callbacks, in the order they have to be performed
+        :type callbacks: list
+        """
+        if not callbacks:
+            return
+        with self._condition:
+            self._queue.extend(callbacks)
+            if self._draining:
+                return
+            self._draining = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            executor = self._executor
+        try:
+            executor.submit(self._drain)
+        except Exception:
+            with self._condition:
+                self._queue.clear()
+                self._draining = False
+                self._condition.notify_all()
+            raise
+
+    def _drain(self):
+        """
+        Helper function. Runs in the executor. Performs enqueued callbacks until the queue is empty.
+        """
+        while True:
+            with self._condition:
+                if not self._queue or self._error is not None:
+                    self._queue.clear()
+                    self._draining = False
+                    self._condition.notify_all()
+                    return
+                (batch, self._queue) = (self._queue, deque())
+            for fn in batch:
+                try:
+                    fn()
+                except Exception as e:
+                    with self._condition:
+                        self._error = e
+                        self._queue.clear()
+                    break
+
+    def _raise_error(self):
+        """
+        Helper function. Raises the error of a failed callback (once).
+        """
+        with self._condition:
+            (error, self._error) = (self._error, None)
+        if error is not None:
+            raise error
@@ -1,7 +1,14 @@
 # encoding: utf-8
 
-from state import State, DeadState
+from state import State, DeadState, perform_call
 from transition import Transition
+from table import TransitionTable, RunResult, MatchResult
+from cursor import Cursor
+from minimize import minimize
+from stats import Stats
+from profiler import CallbackProfiler
+from tracing import TransitionTrace, TraceEntry
+from symbols import is_label, classify
 from fsm_exceptions import *
 
 
@@ -17,23 +24,55 @@ class FSM(object):
         # Set of all transitions in this FSM
         self._transitions = set()
 
+        # Adjacency indexes: outgoing and incoming transitions of every state
+        self._outgoing = dict()
+        self._incoming = dict()
+
+        # Set of states reachable from the initial state, kept up to date while transitions are being added.
+        # None indicates that the set has to be recomputed (e.g. after a reachable transition was removed).
+        self._reachable = None
+
         # Current state of the FSM
         self._current_state = None
 
         # Initial state of this FSM
         self._initial_state = None
 
-        # Set of all symbols
+        # Set of all symbols (SymbolSet and OTHERWISE transition symbols excluded)
         self._alphabet = set()
 
+        # When the FSM has SymbolSet or OTHERWISE transitions, this variable contains the transitions resolved
+        # for every class of equivalent symbols by the last validation (see symbols.classify()).
+        # It is then used instead of the map to look up symbols.
+        self._class_map = None
+
         # When defined, this variable contains the dead state for this FSM.
         # Note that there will never be a transition that involves a dead state.
         # Hence, on_transition callback should be merged into on_enter/on_loop_enter callback of the dead state.
         self._dead_state = None
 
+        # Indicates whether validation requires a final state (an FSM of the empty language has none)
+        self._require_final = True
+
         # Indicates whether this FSM needs validation before next step
         self._dirty = False
 
+        # When compiled, this variable contains the dense transition table of this FSM.
+        # A compiled FSM is frozen: its states and transitions can no longer be modified.
+        self._table = None
+
+        # Id of the current state in the transition table (only maintained when compiled)
+        self._current_index = None
+
+        # When enabled, this variable contains the instrumentation counters recorded by each step
+        self._stats = None
+
+        # When enabled, this variable contains the ring buffer of the last steps
+        self._trace = None
+
+        # When enabled, this variable contains the profiler timing each callback performed by a step
+        self._profiler = None
+
         # Data structure for finding destination states
         # (and corresponding callbacks) based on symbol and source state
         self._map = dict()
@@ -85,6 +124,51 @@ class FSM(object):
         """
         return self._dead_state
 
+    @property
+    def table(self):
+        """
+        Gets the compiled transition table of the FSM.
+        :return: Transition table
+        :rtype: (TransitionTable|None)
+        """
+        return self._table
+
+    @property
+    def stats(self):
+        """
+        Gets the instrumentation counters of the FSM (see enable_stats()).
+        :return: Counters
+        :rtype: (Stats|None)
+        """
+        return self._stats
+
+    @property
+    def trace(self):
+        """
+        Gets the transition trace of the FSM (see enable_trace()).
+        :return: Trace
+        :rtype: (TransitionTrace|None)
+        """
+        return self._trace
+
+    @property
+    def profiler(self):
+        """
+        Gets the callback profiler of the FSM (see enable_profiling()).
+        :return: Profiler
+        :rtype: (CallbackProfiler|None)
+        """
+        return self._profiler
+
+    @property
+    def require_final(self):
+        """
+        Gets whether the FSM must have a final state to be validated.
+        :return: True by default
+        :rtype: bool
+        """
+        return self._require_final
+
     @initial_state.setter
     def initial_state(self, value):
         """
@@ -92,10 +176,14 @@ class FSM(object):
         :param value: Initial state
         :type value: State
         """
+        self._check_not_compiled()
         # Only State objects are accepted
         assert isinstance(value, State), 'Invalid argument type'
         assert value in self._states, 'State not in the set of known states'
         # Does not require dirty flag if it passed the asserts
+        if value != self._initial_state:
+            # Reachability has to be recomputed from the new initial state
+            self._reachable = None
         self._initial_state = value
 
     @dead_state.setter
@@ -105,6 +193,7 @@ class FSM(object):
         :param value: Dead state
         :type value: State
         """
+        self._check_not_compiled()
         # Only DeadState or None objects are accepted
         assert value is None or isinstance(value, DeadState), 'Invalid argument type'
         # If FSM is in dead state
@@ -117,6 +206,20 @@ class FSM(object):
         else:
             self._dead_state = value
 
+    @require_final.setter
+    def require_final(self, value):
+        """
+        Sets whether the FSM must have a final state to be validated. It does not when it is built
+        for the empty language (see product.product() and NFA.to_dfa()).
+        :param value: Whether a final state is required
+        :type value: bool
+        """
+        self._check_not_compiled()
+        if value and not self._require_final:
+            # Need to revalidate FSM
+            self._dirty = True
+        self._require_final = bool(value)
+
     def is_dead_state_on(self):
         """
         :return: True if this FSM contains a dead state, False otherwise.
@@ -124,6 +227,13 @@ class FSM(object):
         """
         return self._dead_state is not None
 
+    def is_compiled(self):
+        """
+        :return: True if this FSM has been compiled (and is therefore frozen), False otherwise.
+        :rtype: bool
+        """
+        return self._table is not None
+
     def is_in_final_state(self):
         """
         :return: True if the current state is final, False otherwise.
@@ -145,30 +255,33 @@ class FSM(object):
         :param symbol: Symbol to follow
         :param symbol: object
         """
-        assert symbol in self._alphabet, 'Unknown symbol: {}'.format(symbol)
-        # Throw exception if FSM has not been validated (dirty)
-        if self._dirty:
-            raise ValidationRequired
-        # Set current state to initial state if current state is undefined
-        if self._current_state is None:
-            self._current_state = self._initial_state
+        if self._profiler is not None:
+            self._profiled_step(symbol)
+            return
+        table = self._table
+        # Compiled FSM is frozen and validated, so a single table lookup gives the destination state
+        if table is not None:
+            column = table.symbol_index.get(symbol)
+            assert column is not None, 'Unknown symbol: {}'.format(symbol)
+            src = self._current_index
+            cell = src * table.width + column
+            dst = table.next_states[cell]
+            src_state = table.states[src]
+            dst_state = table.states[dst]
+            # Dead state only ever loops into itself, so src == dst covers it as well
+            loop = src == dst
+            self._perform_call(src_state.on_loop_exit if loop else src_state.on_exit)
+            self._perform_call(table.callbacks[cell])
+            self._current_state = dst_state
+            self._current_index = dst
+            self._perform_call(dst_state.on_loop_enter if loop else dst_state.on_enter)
+            if self._stats is not None or self._trace is not None:
+                self._record(symbol, src_state, dst_state, loop)
+            return
 
         # "loop" variable indicates whether to invoke the on_loop_* versions of the callbacks
-        # If already in dead state - stay in dead state (loop)
-        if self.is_dead_state_on() and self.is_in_dead_state():
-            dst_state = self._dead_state
-            on_transition_fn = None
-            loop = True
-        # If dead state is defined and transition not defined - transition into dead state
-        elif self.is_dead_state_on() and self._current_state not in self._map[symbol]:
-            dst_state = self._dead_state
-            on_transition_fn = None
-            loop = False
-        # All other cases - retrieve dst_state from the map
-        else:
-            (dst_state, on_transition_fn) = self._map[symbol][self._current_state]
-            loop = True if self._current_state == dst_state else False
-
+        (dst_state, on_transition_fn, loop) = self._next(symbol)
+        src_state = self._current_state
         # Perform on_exit callbacks
         self._perform_call(self._current_state.on_loop_exit) if loop \
             else self._perform_call(self._current_state.on_exit)
@@ -179,6 +292,186 @@ class FSM(object):
         # Perform on_enter callbacks
         self._perform_call(self._current_state.on_loop_enter) if loop \
             else self._perform_call(self._current_state.on_enter)
+        # Record the step if instrumentation is enabled
+        if self._stats is not None or self._trace is not None:
+            self._record(symbol, src_state, dst_state, loop)
+
+    def run(self, symbols, stop_on_dead=False):
+        """
+        Follows transitions for all of the given symbols, performing the same callbacks as a series of step() calls.
+        The validation check is done once for the whole batch and the alphabet check is folded into the map lookup.
+        Throws an exception if a symbol is not in the alphabet, leaving the FSM in the state reached by the symbols
+        that precede it.
+        :param symbols: Symbols to follow
+        :type symbols: iterable
+        :param stop_on_dead: Indicates whether to stop consuming symbols once the FSM is in the dead state
+        :type stop_on_dead: bool
+        :return: Final state, number of consumed symbols and position of the symbol that led into the dead state
+        :rtype: RunResult
+        """
+        # Take the map before checking the dirty bit: edits set the dirty bit before they replace the map
+        fsm_map = self._lookup_map()
+        # Throw exception if FSM has not been validated (dirty)
+        if self._dirty:
+            raise ValidationRequired
+        if self._profiler is not None:
+            return self._run_profiled(symbols, stop_on_dead)
+        if self._table is not None:
+            return self._run_compiled(symbols, stop_on_dead)
+
+        # Keep everything used in the loop in local variables
+        dead_state = self._dead_state
+        miss = (dead_state, None)
+        perform_call = self._perform_call
+        recording = self._stats is not None or self._trace is not None
+        state = self.current_state
+        consumed = 0
+        dead_at = None
+        if stop_on_dead and state is dead_state:
+            return RunResult(state, consumed, dead_at)
+
+        for symbol in symbols:
+            inner_dict = fsm_map.get(symbol)
+            if inner_dict is None:
+                raise UnknownSymbol(symbol)
+            # Same rules as in step(), see _follow() (inlined: a call per symbol would double the cost of the loop)
+            if state is dead_state:
+                (dst_state, on_transition_fn, loop) = (dead_state, None, True)
+            else:
+                (dst_state, on_transition_fn) = inner_dict.get(state, miss)
+                loop = state == dst_state
+                if dst_state is dead_state:
+                    dead_at = consumed
+
+            perform_call(state.on_loop_exit if loop else state.on_exit)
+            perform_call(on_transition_fn)
+            self._current_state = dst_state
+            perform_call(dst_state.on_loop_enter if loop else dst_state.on_enter)
+            if recording:
+                self._record(symbol, state, dst_state, loop)
+            state = dst_state
+            consumed += 1
+            if stop_on_dead and state is dead_state:
+                break
+        return RunResult(state, consumed, dead_at)
+
+    def _run_compiled(self, symbols, stop_on_dead):
+        """
+        Helper function. Implementation of run() for a compiled FSM.
+        :param symbols: Symbols to follow
+        :type symbols: iterable
+        :param stop_on_dead: Indicates whether to stop consuming symbols once the FSM is in the dead state
+        :type stop_on_dead: bool
+        :rtype: RunResult
+        """
+        table = self._table
+        symbol_index = table.symbol_index
+        next_states = table.next_states
+        callbacks = table.callbacks
+        states = table.states
+        width = table.width
+        dead = table.dead
+        perform_call = self._perform_call
+        recording = self._stats is not None or self._trace is not None
+        src = self._current_index
+        consumed = 0
+        dead_at = None
+        if stop_on_dead and src == dead:
+            return RunResult(states[src], consumed, dead_at)
+
+        for symbol in symbols:
+            column = symbol_index.get(symbol)
+            if column is None:
+                raise UnknownSymbol(symbol)
+            cell = src * width + column
+            dst = next_states[cell]
+            src_state = states[src]
+            dst_state = states[dst]
+            loop = src == dst
+            if not loop and dst == dead:
+                dead_at = consumed
+
+            perform_call(src_state.on_loop_exit if loop else src_state.on_exit)
+            perform_call(callbacks[cell])
+            self._current_state = dst_state
+            self._current_index = src = dst
+            perform_call(dst_state.on_loop_enter if loop else dst_state.on_enter)
+            if recording:
+                self._record(symbol, src_state, dst_state, loop)
+            consumed += 1
+            if stop_on_dead and src == dead:
+                break
+        return RunResult(states[src], consumed, dead_at)
+
+    def _run_profiled(self, symbols, stop_on_dead):
+        """
+        Helper function. Implementation of run() with callback profiling enabled.
+        :param symbols: Symbols to follow
+        :type symbols: iterable
+        :param stop_on_dead: Indicates whether to stop consuming symbols once the FSM is in the dead state
+        :type stop_on_dead: bool
+        :rtype: RunResult
+        """
+        consumed = 0
+        dead_at = None
+        if stop_on_dead and self.is_dead_state_on() and self.is_in_dead_state():
+            return RunResult(self.current_state, consumed, dead_at)
+
+        for symbol in symbols:
+            if symbol not in self._lookup_map():
+                raise UnknownSymbol(symbol)
+            if self._profiled_step(symbol):
+                dead_at = consumed
+            consumed += 1
+            if stop_on_dead and self.is_dead_state_on() and self.is_in_dead_state():
+                break
+        return RunResult(self.current_state, consumed, dead_at)
+
+    def _profiled_step(self, symbol):
+        """
+        Helper function. Implementation of step() with callback profiling enabled.
+        :param symbol: Symbol to follow
+        :type symbol: object
+        :return: True if this step led into the dead state, False otherwise.
+        :rtype: bool
+        """
+        (dst_state, on_transition_fn, loop) = self._next(symbol)
+        src_state = self.current_state
+        call = self._profiler.call
+        if loop:
+            call(src_state.on_loop_exit, src_state, 'on_loop_exit', symbol)
+        else:
+            call(src_state.on_exit, src_state, 'on_exit', symbol)
+        call(on_transition_fn, src_state, 'on_transition', symbol)
+        self._set_current_state(dst_state)
+        if loop:
+            call(dst_state.on_loop_enter, dst_state, 'on_loop_enter', symbol)
+        else:
+            call(dst_state.on_enter, dst_state, 'on_enter', symbol)
+        self._record(symbol, src_state, dst_state, loop)
+        return not loop and dst_state is self._dead_state
+
+    def match(self, sequence):
+        """
+        Checks whether the given sequence, followed from the initial state, ends in a final state.
+        No callbacks are performed and the current state of this (compiled) FSM is not changed.
+        :param sequence: Symbols to follow
+        :type sequence: iterable
+        :return: Accept/reject, end state and number of consumed symbols
+        :rtype: MatchResult
+        """
+        if self._table is None:
+            raise CompilationRequired
+        return self._table.match(sequence)
+
+    def accepts(self, sequence):
+        """
+        :param sequence: Symbols to follow
+        :type sequence: iterable
+        :return: True if the given sequence ends in a final state (see match()), False otherwise.
+        :rtype: bool
+        """
+        return self.match(sequence).accepted
 
     def add_state(self, state):
         """
@@ -186,6 +479,7 @@ class FSM(object):
         :param state: State to be added to this FSM.
         :type state: State
         """
+        self._check_not_compiled()
         # State must be 'regular' state
         assert isinstance(state, State), 'Invalid argument type'
         assert not isinstance(state, DeadState), 'Invalid argument type'
@@ -194,6 +488,33 @@ class FSM(object):
             raise DuplicateState
         else:
             self._states.add(state)
+            self._outgoing[state] = set()
+            self._incoming[state] = set()
+        # Set the dirty bit
+        self._dirty = True
+
+    def add_states(self, states):
+        """
+        Adds all of the given states (see add_state()). All of them are checked before any of them is added.
+        :param states: States to add
+        :type states: iterable
+        """
+        self._check_not_compiled()
+        states = list(states)
+        added = set()
+        for state in states:
+            # State must be 'regular' state
+            assert isinstance(state, State), 'Invalid argument type'
+            assert not isinstance(state, DeadState), 'Invalid argument type'
+            # If such state already exists
+            if state in self._states or state in added:
+                raise DuplicateState
+            added.add(state)
+
+        self._states.update(added)
+        for state in added:
+            self._outgoing[state] = set()
+            self._incoming[state] = set()
         # Set the dirty bit
         self._dirty = True
 
@@ -201,9 +522,13 @@ class FSM(object):
         """
         Adds the given transition to the FSM. If the given transition already exists it will be ignored.
         If the given transition contains unknown states, they will automatically be added to the set of states.
+        The symbol of the transition may stand for several symbols: a SymbolSet (e.g. a range of characters)
+        is followed for any of its symbols, and OTHERWISE for any symbol of the alphabet for which the source state
+        has no other transition. Conflicts between such transitions are detected by validate().
         :param transition: Transition to be added to this FSM
         :type transition: Transition
         """
+        self._check_not_compiled()
         assert isinstance(transition, Transition), 'Invalid argument type'
         # Throw error if transition is a duplicate
         if transition in self._transitions:
@@ -212,19 +537,99 @@ class FSM(object):
         if transition.src_state not in self._states or transition.dst_state not in self._states:
             raise TransitionContainsUnknownState
         # Throw error if transition results in an NFA behavior
-        if transition.symbol in self._map.keys() and transition.src_state in self._map[transition.symbol].keys():
+        if transition.src_state in self._map.get(transition.symbol, ()):
             raise StateCannotHaveSameSymbolTransitions
 
+        # Symbol classes have to be recomputed (set the dirty bit before any modification, see _edit_map())
+        label = is_label(transition.symbol)
+        if label or self._class_map is not None:
+            self._dirty = True
+
+        # Update the transition map (before the alphabet, so that a known symbol is always in the map)
+        fsm_map = self._edit_map([transition.symbol])
+        if transition.symbol not in fsm_map:
+            # Create an entry for symbol if it does not already exist in the outer dict
+            fsm_map[transition.symbol] = dict()
+        # Insert src-dst pair
+        fsm_map[transition.symbol][transition.src_state] = (transition.dst_state, transition.on_transition)
+        self._map = fsm_map
         # Add transition to the set of transitions
         self._transitions.add(transition)
         # Add symbol to the alphabet
-        self._alphabet.add(transition.symbol)
-        # Update the transition map
-        if transition.symbol not in self._map.keys():
-            # Create an entry for symbol if it does not already exist in the outer dict
-            self._map[transition.symbol] = dict()
-        # Insert src-dst pair
-        self._map[transition.symbol][transition.src_state] = (transition.dst_state, transition.on_transition)
+        if not label:
+            self._alphabet.add(transition.symbol)
+        # Update the adjacency indexes
+        self._outgoing[transition.src_state].add(transition)
+        self._incoming[transition.dst_state].add(transition)
+        # New transition can only extend the set of reachable states
+        if self._reachable is not None and transition.src_state in self._reachable \
+                and transition.dst_state not in self._reachable:
+            self._extend_reachable(transition.dst_state)
+
+    def add_transitions(self, transitions):
+        """
+        Adds all of the given transitions (see add_transition()). Duplicates and NFA behavior are checked
+        by indexing the batch by symbol and source state in a single pass, before any of the transitions is added;
+        the map is then updated with whole inner dicts and the alphabet once per batch.
+        :param transitions: Transitions to add
+        :type transitions: iterable
+        """
+        self._check_not_compiled()
+        transitions = list(transitions)
+        states = self._states
+        fsm_map = self._map
+        # Inner dicts of the batch, indexed by symbol (same structure as the map)
+        batch_map = dict()
+        for transition in transitions:
+            assert isinstance(transition, Transition), 'Invalid argument type'
+            (src_state, dst_state) = (transition.src_state, transition.dst_state)
+            # Throw error if transition contains an unknown state
+            if src_state not in states or dst_state not in states:
+                raise TransitionContainsUnknownState
+            inner_dict = batch_map.get(transition.symbol)
+            if inner_dict is None:
+                inner_dict = batch_map[transition.symbol] = dict()
+            elif src_state in inner_dict:
+                # Throw error if transition is a duplicate, or if it results in an NFA behavior
+                raise DuplicateTransition if inner_dict[src_state][0] == dst_state \
+                    else StateCannotHaveSameSymbolTransitions
+            inner_dict[src_state] = (dst_state, transition.on_transition)
+        for (symbol, inner_dict) in batch_map.items():
+            known_dict = fsm_map.get(symbol)
+            if known_dict:
+                for src_state in inner_dict:
+                    if src_state in known_dict:
+                        raise DuplicateTransition if known_dict[src_state][0] == inner_dict[src_state][0] \
+                            else StateCannotHaveSameSymbolTransitions
+
+        # Symbol classes have to be recomputed (set the dirty bit before any modification, see _edit_map())
+        labels = set(symbol for symbol in batch_map if is_label(symbol))
+        if labels or self._class_map is not None:
+            self._dirty = True
+
+        # Update the transition map (before the alphabet, so that a known symbol is always in the map)
+        fsm_map = self._edit_map(batch_map)
+        for (symbol, inner_dict) in batch_map.items():
+            if symbol in fsm_map:
+                fsm_map[symbol].update(inner_dict)
+            else:
+                fsm_map[symbol] = inner_dict
+        self._map = fsm_map
+        # Update the adjacency indexes
+        outgoing = self._outgoing
+        incoming = self._incoming
+        for transition in transitions:
+            outgoing[transition.src_state].add(transition)
+            incoming[transition.dst_state].add(transition)
+        # Add transitions to the set of transitions and symbols to the alphabet
+        self._transitions.update(transitions)
+        self._alphabet.update(symbol for symbol in batch_map if symbol not in labels)
+        # New transitions can only extend the set of reachable states
+        # (the search follows the whole batch, as all of it is in the adjacency indexes already)
+        if self._reachable is not None:
+            for transition in transitions:
+                if transition.src_state in self._reachable and transition.dst_state not in self._reachable:
+                    self._extend_reachable(transition.dst_state)
 
     def remove_state(self, state):
         """
@@ -233,32 +638,52 @@ class FSM(object):
         :param state: State to remove
         :type state: State
         """
-        # State must be 'regular' state
-        assert isinstance(state, State), 'Invalid argument type'
-        assert not isinstance(state, DeadState), 'Invalid argument type'
+        self.remove_states([state])
 
-        # We cannot remove state that is current
-        if state == self._current_state:
-            raise CannotModifyStateThatIsCurrent
+    def remove_states(self, states):
+        """
+        Removes all of the given states, together with their transitions (see remove_state()).
+        Takes time proportional to the number of removed transitions; the alphabet is updated once per batch.
+        :param states: States to remove
+        :type states: iterable
+        """
+        self._check_not_compiled()
+        # Check all of the states before anything is modified (a state given twice is removed once)
+        removed = set()
+        for state in states:
+            # State must be 'regular' state
+            assert isinstance(state, State), 'Invalid argument type'
+            assert not isinstance(state, DeadState), 'Invalid argument type'
+            # We cannot remove state that is current
+            if state == self._current_state:
+                raise CannotModifyStateThatIsCurrent
+            if state not in self._states:
+                raise KeyError(state)
+            removed.add(state)
+        states = removed
 
-        # Remove state from set of states
-        self._states.remove(state)
-        # Remove from map
-        for symbol in list(self._map.keys()):
-            inner_dict = self._map[symbol]
-            for src in list(inner_dict.keys()):
-                (dst, _) = inner_dict[src]
-                if src == state or dst == state:
-                    # Remove transition from map
-                    inner_dict.pop(src, None)
-                    # Remove transition from set of transitions
-                    self._transitions.remove(Transition(symbol, src, dst))
-            # Check if the inner dict is empty
-            if len(inner_dict) == 0:
-                self._alphabet.remove(symbol)
-                self._map.pop(symbol, None)
-        # Set the dirty bit
+        # Set the dirty bit (before any modification, see _edit_map())
         self._dirty = True
+        # All transitions originating from or leading into the removed states
+        transitions = set()
+        for state in states:
+            transitions.update(self._outgoing[state])
+            transitions.update(self._incoming[state])
+        symbols = set(transition.symbol for transition in transitions)
+        fsm_map = self._edit_map(symbols)
+        for transition in transitions:
+            self._discard_transition(transition, fsm_map)
+        self._prune_alphabet(symbols, fsm_map)
+        self._map = fsm_map
+
+        for state in states:
+            # Remove state from set of states
+            self._states.remove(state)
+            self._outgoing.pop(state)
+            self._incoming.pop(state)
+            # Unreachable state only has transitions from other unreachable states, so reachability is not affected
+            if self._reachable is not None and state in self._reachable:
+                self._reachable = None
 
     def remove_transition(self, transition):
         """
@@ -266,29 +691,320 @@ class FSM(object):
         :param transition: Transition to remove
         :type transition: Transition
         """
-        assert isinstance(transition, Transition), 'Invalid argument type'
-        # Remove transition from set of transitions
-        self._transitions.remove(transition)
-        # Remove transition from map
-        self._map[transition.symbol].pop(transition.src_state, None)
-        # If this was the last remaining transition with the corresponding symbol
-        if len(self._map[transition.symbol]) == 0:
-            self._alphabet.remove(transition.symbol)
-            self._map.pop(transition.symbol, None)
-        # Set the dirty bit
+        self.remove_transitions([transition])
+
+    def remove_transitions(self, transitions):
+        """
+        Removes all of the given transitions (see remove_transition()). The alphabet is updated once per batch.
+        :param transitions: Transitions to remove
+        :type transitions: iterable
+        """
+        self._check_not_compiled()
+        # Check all of the transitions before anything is modified (a transition given twice is removed once)
+        removed = set()
+        for transition in transitions:
+            assert isinstance(transition, Transition), 'Invalid argument type'
+            if transition not in self._transitions:
+                raise KeyError(transition)
+            removed.add(transition)
+        transitions = removed
+
+        # Set the dirty bit (before any modification, see _edit_map())
         self._dirty = True
+        symbols = set(transition.symbol for transition in transitions)
+        fsm_map = self._edit_map(symbols)
+        for transition in transitions:
+            self._discard_transition(transition, fsm_map)
+        self._prune_alphabet(symbols, fsm_map)
+        self._map = fsm_map
 
     def validate(self):
         """
         Attempts to validate the FSM. Throws errors if the FSM does not satisfy some of the constraints.
+        SymbolSet and OTHERWISE transitions are resolved into transitions of classes of equivalent symbols.
         """
+        class_map = classify(self._map)
         if self.is_dead_state_on():
             self._validate_with_dead_state()
         else:
-            self._validate_deterministic()
+            self._validate_deterministic(class_map)
         # If we reached this point, then no error were found
+        self._class_map = class_map
         self._dirty = False
 
+    def compile(self):
+        """
+        Compiles the validated FSM into a dense transition table (see TransitionTable) and freezes it.
+        Once compiled, steps are performed using integer ids instead of the transition map,
+        and any attempt to modify states or transitions throws an error.
+        :return: Transition table
+        :rtype: TransitionTable
+        """
+        # Only validated FSM can be compiled: a new FSM is not dirty, but it has no current state until populated
+        if self._dirty or self.current_state is None:
+            raise ValidationRequired
+        if self._table is None:
+            if self._class_map is not None:
+                # Columns of the table are the classes of symbols
+                class_map = self._class_map
+                table = TransitionTable(self._states, range(len(class_map.maps)), dict(enumerate(class_map.maps)),
+                                        self._initial_state, self._dead_state, class_map.classes)
+            else:
+                table = TransitionTable(self._states, self._alphabet, self._map, self._initial_state,
+                                        self._dead_state)
+            # Steps switch to the table as soon as they see it: the current index has to be set first
+            self._current_index = table.state_index[self.current_state]
+            self._table = table
+        return self._table
+
+    def minimize(self, target=None):
+        """
+        Creates an equivalent FSM with the minimal number of states (see minimize.minimize()).
+        States with different callbacks are never merged.
+        :param target: Empty FSM to populate, new instance of the same class if undefined
+        :type target: (FSM|None)
+        :return: Minimized FSM and a dict mapping every state of this FSM to its state in the minimized FSM
+        :rtype: tuple
+        """
+        return minimize(self, target)
+
+    def enable_stats(self):
+        """
+        Enables instrumentation: from now on, each step records the transition that fired,
+        enters, exits and loops of the states involved, and time spent in each state.
+        When disabled (the default), steps only check that it is disabled.
+        :return: Counters, with a snapshot()/reset() API
+        :rtype: Stats
+        """
+        if self._stats is None:
+            self._stats = Stats(self.current_state)
+        return self._stats
+
+    def disable_stats(self):
+        """
+        Disables instrumentation, dropping the recorded counters.
+        """
+        self._stats = None
+
+    def enable_trace(self, capacity=1024):
+        """
+        Enables tracing: from now on, each step is recorded in a fixed-size ring buffer holding the last steps
+        (symbol, source and destination state, loop and dead state flags), which can be dumped on demand.
+        When disabled (the default), steps only check that it is disabled.
+        :param capacity: Number of recorded steps
+        :type capacity: int
+        :return: Trace
+        :rtype: TransitionTrace
+        """
+        if self._trace is None or self._trace.capacity != capacity:
+            self._trace = TransitionTrace(capacity)
+        return self._trace
+
+    def disable_trace(self):
+        """
+        Disables tracing, dropping the recorded steps.
+        """
+        self._trace = None
+
+    def replay(self, trace):
+        """
+        Rebuilds the position of the FSM from a trace: the recorded steps are followed from the source state
+        of the oldest one, checking that each of them is a step of this FSM, and the FSM is left in the destination
+        state of the newest one. No callbacks are performed. Throws an exception if the steps do not match,
+        leaving the current state unchanged.
+        :param trace: Trace, or recorded steps as sequences of the TraceEntry fields
+                      (see TransitionTrace.entries() and TransitionTrace.dump())
+        :type trace: (TransitionTrace|iterable)
+        :return: New current state
+        :rtype: State
+        """
+        entries = trace.entries() if isinstance(trace, TransitionTrace) else [TraceEntry(*entry) for entry in trace]
+        # Take the map before checking the dirty bit: edits set the dirty bit before they replace the map
+        fsm_map = self._lookup_map()
+        # Throw exception if FSM has not been validated (dirty)
+        if self._dirty:
+            raise ValidationRequired
+        if not entries:
+            return self.current_state
+
+        # Recorded states may be given by their ids
+        states = dict((state.id, state) for state in self._states)
+        if self._dead_state is not None:
+            states[self._dead_state.id] = self._dead_state
+
+        def resolve(state):
+            if isinstance(state, State):
+                state = state.id
+            if state not in states:
+                raise ReplayMismatch('Unknown state: {}'.format(state))
+            return states[state]
+
+        state = resolve(entries[0].src_state)
+        for (position, entry) in enumerate(entries):
+            if resolve(entry.src_state) != state:
+                raise ReplayMismatch('Step {} does not start where step {} ended'.format(position, position - 1))
+            inner_dict = fsm_map.get(entry.symbol)
+            if inner_dict is None:
+                raise UnknownSymbol(entry.symbol)
+            dst_state = self._follow(state, inner_dict, self._dead_state)[0]
+            if dst_state is None or dst_state != resolve(entry.dst_state):
+                raise ReplayMismatch('Step {} is not a transition of this FSM'.format(position))
+            state = dst_state
+        self._set_current_state(state)
+        return state
+
+    def enable_profiling(self, threshold=None, on_slow=None):
+        """
+        Enables callback profiling: from now on, each callback performed by a step is timed,
+        and its latency recorded in a histogram labelled with state id, callback kind and symbol.
+        When disabled (the default), steps only check that it is disabled.
+        :param threshold: Latency budget of a single callback in seconds, no budget if undefined
+        :type threshold: (float|None)
+        :param on_slow: Function called with the label and the latency of each callback that exceeded the budget
+        :type on_slow: (callable|None)
+        :return: Profiler
+        :rtype: CallbackProfiler
+        """
+        self._profiler = CallbackProfiler(threshold, on_slow)
+        return self._profiler
+
+    def disable_profiling(self):
+        """
+        Disables callback profiling, dropping the recorded latencies.
+        """
+        self._profiler = None
+
+    def cursor(self, state=None):
+        """
+        Creates a new lightweight cursor stepping against the transition table of this (compiled) FSM.
+        Cursors share the table, so any number of them can run the same FSM independently.
+        :param state: State to start in, initial state if undefined
+        :type state: (State|None)
+        :return: New cursor
+        :rtype: Cursor
+        """
+        if self._table is None:
+            raise CompilationRequired
+        return Cursor(self._table, state)
+
+    def _next(self, symbol):
+        """
+        Helper function. Resolves the transition that step() would follow for the given symbol,
+        without performing any callbacks or changing the current state.
+        :param symbol: Symbol to follow
+        :type symbol: object
+        :return: Destination state, on_transition callback and whether the transition is a loop
+        :rtype: tuple
+        """
+        table = self._table
+        if table is not None:
+            column = table.symbol_index.get(symbol)
+            assert column is not None, 'Unknown symbol: {}'.format(symbol)
+            src = self._current_index
+            cell = src * table.width + column
+            dst = table.next_states[cell]
+            return (table.states[dst], table.callbacks[cell], src == dst)
+
+        # Take the map before checking the dirty bit: edits set the dirty bit before they replace the map
+        fsm_map = self._lookup_map()
+        assert symbol in fsm_map, 'Unknown symbol: {}'.format(symbol)
+        # Throw exception if FSM has not been validated (dirty)
+        if self._dirty:
+            raise ValidationRequired
+        # Set current state to initial state if current state is undefined
+        if self._current_state is None:
+            self._current_state = self._initial_state
+        return self._follow(self._current_state, fsm_map[symbol], self._dead_state)
+
+    @staticmethod
+    def _follow(state, inner_dict, dead_state):
+        """
+        Helper function. Resolves the transition from the given state for a symbol, by the rules of step():
+        stay in the dead state, fall into the dead state if the transition is not defined, or follow the map.
+        Without a dead state, an undefined transition leads into None.
+        :param state: Source state
+        :type state: State
+        :param inner_dict: Inner dict of the symbol in the map {src_state: (dst_state, callback)}
+        :type inner_dict: dict
+        :param dead_state: Dead state of the FSM
+        :type dead_state: (DeadState|None)
+        :return: Destination state, on_transition callback and whether the transition is a loop
+        :rtype: tuple
+        """
+        if state is dead_state:
+            return (dead_state, None, True)
+        (dst_state, on_transition_fn) = inner_dict.get(state, (dead_state, None))
+        return (dst_state, on_transition_fn, state == dst_state)
+
+    def _lookup_map(self):
+        """
+        Helper function. Returns the map in which symbols are looked up: the transition map,
+        or its resolved view if the FSM has symbol classes (see validate()).
+        :return: Map from symbols to inner dicts {src_state: (dst_state, callback)}
+        :rtype: (dict|ClassMap)
+        """
+        return self._map if self._class_map is None else self._class_map
+
+    def _set_current_state(self, state):
+        """
+        Helper function. Sets the current state (and its id when compiled) without performing any callbacks.
+        :param state: New current state
+        :type state: State
+        """
+        self._current_state = state
+        if self._table is not None:
+            self._current_index = self._table.state_index[state]
+
+    def _edit_map(self, symbols):
+        """
+        Helper function. Returns the transition map to be modified by an edit touching the given symbols.
+        Edits store the returned map back into self._map once they are done, and they set the dirty bit
+        before making any change that requires revalidation. By default the map is modified in place;
+        subclasses may return a modified copy instead (see ThreadSafeFSM).
+        :param symbols: Symbols whose inner dicts are going to be modified
+        :type symbols: iterable
+        :return: Transition map
+        :rtype: dict
+        """
+        return self._map
+
+    def _discard_transition(self, transition, fsm_map):
+        """
+        Helper function. Removes the given transition from the set of transitions, the map and the adjacency indexes.
+        :param transition: Transition to remove
+        :type transition: Transition
+        :param fsm_map: Transition map being edited (see _edit_map())
+        :type fsm_map: dict
+        """
+        self._transitions.remove(transition)
+        fsm_map[transition.symbol].pop(transition.src_state, None)
+        self._outgoing[transition.src_state].discard(transition)
+        self._incoming[transition.dst_state].discard(transition)
+        # Transitions of unreachable states do not affect reachability
+        if self._reachable is not None and transition.src_state in self._reachable:
+            self._reachable = None
+
+    def _prune_alphabet(self, symbols, fsm_map):
+        """
+        Helper function. Removes the given symbols from the alphabet and the map
+        if there are no transitions with those symbols left.
+        :param symbols: Symbols to check
+        :type symbols: set
+        :param fsm_map: Transition map being edited (see _edit_map())
+        :type fsm_map: dict
+        """
+        for symbol in symbols:
+            if symbol in fsm_map and len(fsm_map[symbol]) == 0:
+                self._alphabet.discard(symbol)
+                fsm_map.pop(symbol, None)
+
+    def _check_not_compiled(self):
+        """
+        Helper function. Throws an error if this FSM is compiled (frozen).
+        """
+        if self._table is not None:
+            raise CannotModifyCompiledFSM
+
     def _validate_with_dead_state(self):
         """
         Checks whether this FSM follows some of the constraints for an ideal FSM.
@@ -302,47 +1018,72 @@ class FSM(object):
         # Set of transitions must not be empty (otherwise there is no FSM)
         if len(self._transitions) == 0:
             raise EmptySetOfTransitions
-        # There must be at least one final state
-        if len([state for state in self._states if state.final]) == 0:
+        # There must be at least one final state (unless the FSM is built for an empty language)
+        if self._require_final and not any(state.final for state in self._states):
             raise NoFinalState
-        # There must be an initial state
-        if not self.initial_state:
+        # There must be an initial state (and it must not have been removed)
+        if not self.initial_state or self._initial_state not in self._states:
             raise NoInitialState
         # Starting in initial state, all nodes should be reachable
-        states_not_visited = [state for state in self._states
-                              if state != self.initial_state]
-        transition_stack = [transition for transition in self._transitions
-                            if transition.src_state != self.initial_state]
-        while transition_stack and states_not_visited:
-            transition = transition_stack.pop()
-            dst_state = transition.dst_state
-            if dst_state in states_not_visited:
-                # Remove from not visited states
-                states_not_visited.remove(dst_state)
-                # Add its transitions to the stack
-                transition_stack.extend([transition for transition in self._transitions
-                                         if transition.src_state == dst_state])
-        if states_not_visited:
+        if self._reachable is None:
+            self._reachable = set()
+            self._extend_reachable(self._initial_state)
+        if len(self._reachable) != len(self._states):
             raise UnreachableStateDetected
 
-    def _validate_deterministic(self):
+    def _extend_reachable(self, state):
+        """
+        Helper function. Adds the given state and all states reachable from it to the set of reachable states.
+        Runs a depth-first search over the adjacency index, in time linear in the size of the newly visited part.
+        :param state: Newly reachable state
+        :type state: State
+        """
+        reachable = self._reachable
+        outgoing = self._outgoing
+        reachable.add(state)
+        stack = [state]
+        while stack:
+            for transition in outgoing[stack.pop()]:
+                dst_state = transition.dst_state
+                if dst_state not in reachable:
+                    reachable.add(dst_state)
+                    stack.append(dst_state)
+
+    def _validate_deterministic(self, class_map=None):
         """
         Checks whether this FSM follows all of the constraints for an ideal FSM.
         Throws exceptions to indicate the problem.
         'Initial state must belong to the set of states' constraint is enforced in the setter.
+        :param class_map: Transitions resolved for every class of symbols (see symbols.classify())
+        :type class_map: (ClassMap|None)
         """
         # "dead" state mode covers most of the ideal requirements
         self._validate_with_dead_state()
 
+        # Every state must have a transition for every class of symbols
+        if class_map is not None:
+            if any(len(inner_dict) != len(self._states) for inner_dict in class_map.maps):
+                raise MissingTransitions
         # The number of transitions must be equal to the number of states times the size of the alphabet
-        if len(self._transitions) != len(self._states) * len(self._alphabet):
+        elif len(self._transitions) != len(self._states) * len(self._alphabet):
             raise MissingTransitions
 
-    def _perform_call(self, fn):
+    def _record(self, symbol, src_state, dst_state, loop):
         """
-        Helper function.
-        :param fn: Callable object that need to be called (if it is actually callable)
-        :param fn: (callable|None)
+        Helper function. Records a step in the counters and the trace, if they are enabled.
+        :param symbol: Followed symbol
+        :type symbol: object
+        :param src_state: Source state
+        :type src_state: State
+        :param dst_state: Destination state
+        :type dst_state: State
+        :param loop: Whether the transition is a loop
+        :type loop: bool
         """
-        if callable(fn):
-            fn()
+        if self._stats is not None:
+            self._stats.record(symbol, src_state, dst_state, loop)
+        if self._trace is not None:
+            self._trace.record(symbol, src_state, dst_state, loop)
+
+    # Helper function, see perform_call()
+    _perform_call = staticmethod(perform_call)
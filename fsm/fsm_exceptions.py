@@ -63,3 +63,23 @@ class CannotModifyStateThatIsCurrent(FSMException):
 
 class StateCannotHaveSameSymbolTransitions(FSMException):
     pass
+
+
+class CannotModifyCompiledFSM(FSMException):
+    pass
+
+
+class CompilationRequired(FSMException):
+    pass
+
+
+class SerializationError(FSMException):
+    pass
+
+
+class ReplayMismatch(FSMException):
+    pass
+
+
+class UnsupportedOperation(FSMException):
+    pass
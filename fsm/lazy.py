@@ -0,0 +1,254 @@
+# encoding: utf-8
+
+from collections import OrderedDict, namedtuple
+
+from fsm import FSM
+from state import State, DeadState
+from tracing import TransitionTrace, TraceEntry
+from fsm_exceptions import *
+
+
+# Statistics of the transition cache of a LazyFSM
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'size', 'capacity'])
+
+
+class LazyFSM(FSM):
+
+    def __init__(self, transition_fn, initial_id, is_final, dead_state=None, alphabet=None, cache_size=4096):
+        """
+        FSM variant whose transitions are computed on demand, for state spaces too large to be enumerated.
+        States are identified by their ids (any hashable object): transition_fn(state_id, symbol) gives the id
+        of the destination state, or None for the dead state. Transitions are computed the first time they are
+        followed and kept in a size-bounded LRU cache. Steps have the same semantics (and callbacks)
+        as steps of a regular FSM; states are created by create_state(), which can be overridden to give them
+        callbacks. States and transitions cannot be added, removed or compiled.
+
+        :param transition_fn: Transition function
+        :type transition_fn: callable
+        :param initial_id: Id of the initial state
+        :type initial_id: object
+        :param is_final: Predicate telling whether the state with the given id is final
+        :type is_final: callable
+        :param dead_state: Dead state, required if the transition function may return None
+        :type dead_state: (DeadState|None)
+        :param alphabet: Set of all symbols, any symbol is accepted if undefined
+        :type alphabet: (iterable|None)
+        :param cache_size: Maximum number of cached transitions
+        :type cache_size: int
+        """
+        # We are forcing LazyFSM to be "abstract", each instance must be an instance of its subclass
+        assert type(self) is not LazyFSM, 'LazyFSM must be inherited from'
+        assert dead_state is None or isinstance(dead_state, DeadState), 'Invalid argument type'
+        assert cache_size > 0, 'Cache size must be positive'
+        super(LazyFSM, self).__init__()
+
+        self._transition_fn = transition_fn
+        self._is_final = is_final
+        self._dead_state = dead_state
+        self._alphabet = set(alphabet) if alphabet is not None else None
+        self._initial_state = self._current_state = self.create_state(initial_id)
+
+        # LRU cache of destination states by (source state id, symbol), least recently used first
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lazy_map = LazyMap(self)
+
+    def create_state(self, id):
+        """
+        Creates the state with the given id, the first time a transition into it is computed.
+        The initial state is created by the constructor: subclasses overriding this function have to set up
+        what it needs before calling the LazyFSM constructor.
+        :param id: Id of the state
+        :type id: object
+        :rtype: State
+        """
+        return State(id, final=bool(self._is_final(id)))
+
+    def cache_info(self):
+        """
+        :return: Statistics of the transition cache
+        :rtype: CacheInfo
+        """
+        return CacheInfo(self._hits, self._misses, self._evictions, len(self._cache), self._cache_size)
+
+    def cache_clear(self):
+        """
+        Drops all cached transitions and resets the statistics.
+        """
+        self._cache.clear()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def replay(self, trace):
+        """
+        Rebuilds the position of the FSM from a trace (see FSM.replay()). Recorded states are given by their ids
+        or as states; each recorded step is checked against the transition function (through the cache).
+        No callbacks are performed. Throws an exception if the steps do not match, leaving the current state
+        unchanged.
+        :param trace: Trace, or recorded steps as sequences of the TraceEntry fields
+        :type trace: (TransitionTrace|iterable)
+        :return: New current state
+        :rtype: State
+        """
+        entries = trace.entries() if isinstance(trace, TransitionTrace) else [TraceEntry(*entry) for entry in trace]
+        if not entries:
+            return self.current_state
+
+        def resolve(state):
+            if isinstance(state, State):
+                state = state.id
+            if self._dead_state is not None and state == self._dead_state.id:
+                return self._dead_state
+            return self.create_state(state)
+
+        state = resolve(entries[0].src_state)
+        for (position, entry) in enumerate(entries):
+            if resolve(entry.src_state) != state:
+                raise ReplayMismatch('Step {} does not start where step {} ended'.format(position, position - 1))
+            if self._alphabet is not None and entry.symbol not in self._alphabet:
+                raise UnknownSymbol(entry.symbol)
+            # Same rules as in step(): stay in dead state, or follow the transition function
+            if self._dead_state is not None and state == self._dead_state:
+                dst_state = self._dead_state
+            else:
+                try:
+                    dst_state = self._transition(state, entry.symbol)
+                except MissingTransitions:
+                    dst_state = None
+            if dst_state is None or dst_state != resolve(entry.dst_state):
+                raise ReplayMismatch('Step {} is not a transition of this FSM'.format(position))
+            state = dst_state
+        self._set_current_state(state)
+        return state
+
+    def validate(self):
+        """
+        Nothing to validate: transitions are checked as they are computed.
+        """
+        pass
+
+    # States and transitions are defined by the transition function, so they cannot be edited
+    def add_state(self, state):
+        raise UnsupportedOperation('States of a LazyFSM are created on demand')
+
+    def add_transition(self, transition):
+        raise UnsupportedOperation('Transitions of a LazyFSM are computed on demand')
+
+    def add_states(self, states):
+        raise UnsupportedOperation('States of a LazyFSM are created on demand')
+
+    def add_transitions(self, transitions):
+        raise UnsupportedOperation('Transitions of a LazyFSM are computed on demand')
+
+    def remove_states(self, states):
+        raise UnsupportedOperation('States of a LazyFSM are created on demand')
+
+    def remove_transitions(self, transitions):
+        raise UnsupportedOperation('Transitions of a LazyFSM are computed on demand')
+
+    def compile(self):
+        raise UnsupportedOperation('LazyFSM cannot be compiled')
+
+    def minimize(self, target=None):
+        raise UnsupportedOperation('LazyFSM cannot be minimized')
+
+    def _lookup_map(self):
+        """
+        Helper function. Returns the view of the transition function in which steps look up symbols
+        (see FSM._lookup_map()), so that step() and run() are the ones of FSM.
+        :rtype: LazyMap
+        """
+        return self._lazy_map
+
+    def _transition(self, state, symbol):
+        """
+        Helper function. Looks up the destination state of the given (regular) state and symbol in the cache,
+        computing it if it is not cached.
+        :param state: Source state
+        :type state: State
+        :param symbol: Symbol to follow
+        :type symbol: object
+        :return: Destination state
+        :rtype: State
+        """
+        key = (state.id, symbol)
+        cache = self._cache
+        dst_state = cache.pop(key, None)
+        if dst_state is not None:
+            self._hits += 1
+        else:
+            self._misses += 1
+            dst_id = self._transition_fn(state.id, symbol)
+            if dst_id is None:
+                if self._dead_state is None:
+                    raise MissingTransitions
+                dst_state = self._dead_state
+            else:
+                dst_state = self.create_state(dst_id)
+            if len(cache) >= self._cache_size:
+                cache.popitem(last=False)
+                self._evictions += 1
+        # Most recently used last
+        cache[key] = dst_state
+        return dst_state
+
+
+class LazyMap(object):
+
+    def __init__(self, fsm):
+        """
+        Initializes a new symbol-keyed view of the transition function of the given LazyFSM.
+        It stands in for the transition map (see FSM._map): its inner dicts compute the transitions
+        through the cache of the FSM as they are looked up.
+
+        :param fsm: LazyFSM
+        :type fsm: LazyFSM
+        """
+        self._fsm = fsm
+
+    def get(self, symbol, default=None):
+        """
+        :param symbol: Symbol
+        :type symbol: object
+        :return: Inner dict of the given symbol, default if it is not in the alphabet
+        :rtype: LazyTransitions
+        """
+        return LazyTransitions(self._fsm, symbol) if symbol in self else default
+
+    def __getitem__(self, symbol):
+        if symbol not in self:
+            raise KeyError(symbol)
+        return LazyTransitions(self._fsm, symbol)
+
+    def __contains__(self, symbol):
+        alphabet = self._fsm._alphabet
+        return alphabet is None or symbol in alphabet
+
+
+class LazyTransitions(object):
+
+    def __init__(self, fsm, symbol):
+        """
+        Initializes a new view of the transitions of the given LazyFSM for one symbol (see LazyMap).
+
+        :param fsm: LazyFSM
+        :type fsm: LazyFSM
+        :param symbol: Symbol
+        :type symbol: object
+        """
+        self._fsm = fsm
+        self._symbol = symbol
+
+    def get(self, state, default=None):
+        """
+        :param state: Source (regular) state
+        :type state: State
+        :param default: Ignored, every transition is defined by the transition function
+        :return: Destination state and on_transition callback (always None)
+        :rtype: tuple
+        """
+        return (self._fsm._transition(state, self._symbol), None)
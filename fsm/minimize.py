@@ -0,0 +1,128 @@
+# encoding: utf-8
+
+from transition import Transition
+from fsm_exceptions import ValidationRequired
+
+
+def minimize(fsm, target=None):
+    """
+    Minimizes the given (validated) FSM using Hopcroft's partition refinement, in O(n * k * log(n)) time
+    for n states and k symbols. Missing transitions lead into the dead state, which acts as the implicit sink.
+    If the FSM has symbol classes (see FSM.validate()), k is the number of classes and the transitions
+    of the minimized FSM are SymbolSets, one for each destination (and callback) of every state.
+
+    Two states are merged only if they agree on finality, on all of their callbacks (on_enter, on_exit,
+    on_loop_enter, on_loop_exit and the on_transition callbacks of their outgoing transitions) and lead into
+    equivalent states for every symbol. Note that a transition between two merged states becomes a loop,
+    so it performs the on_loop_* callbacks of the merged state.
+
+    :param fsm: FSM to minimize
+    :type fsm: FSM
+    :param target: Empty FSM to populate, new instance of the same class as fsm if undefined
+    :type target: (FSM|None)
+    :return: Minimized FSM and a dict mapping every state of fsm (including its dead state) to its new state
+    :rtype: tuple
+    """
+    if fsm._dirty:
+        raise ValidationRequired
+
+    # Integer ids of states (the dead state sink gets the last id) and symbols
+    states = [fsm.initial_state] + [state for state in fsm._states if state != fsm.initial_state]
+    sink = len(states)
+    class_map = fsm._class_map
+    if class_map is None:
+        symbols = list(fsm._alphabet)
+        columns = [fsm._map[symbol] for symbol in symbols]
+    else:
+        symbols = class_map.classes.symbol_sets()
+        columns = class_map.maps
+    state_index = dict((state, index) for (index, state) in enumerate(states))
+
+    # Transition function, on_transition callbacks and its inverse
+    delta = [[sink] * len(symbols) for _ in range(sink + 1)]
+    callbacks = [[None] * len(symbols) for _ in range(sink + 1)]
+    inverse = [dict() for _ in symbols]
+    for (column, inner_dict) in enumerate(columns):
+        for (src, (dst, on_transition)) in inner_dict.items():
+            delta[state_index[src]][column] = state_index[dst]
+            callbacks[state_index[src]][column] = on_transition
+    for src in range(sink + 1):
+        for column in range(len(symbols)):
+            inverse[column].setdefault(delta[src][column], []).append(src)
+
+    # Initial partition: states that differ in finality or callbacks can never be merged,
+    # and the sink is never merged with a regular state
+    groups = dict()
+    for (index, state) in enumerate(states):
+        key = (state.final, state.on_enter, state.on_exit, state.on_loop_enter, state.on_loop_exit,
+               tuple(callbacks[index]))
+        groups.setdefault(key, set()).add(index)
+    blocks = list(groups.values()) + [set([sink])]
+    block_of = [0] * (sink + 1)
+    for (block_id, block) in enumerate(blocks):
+        for index in block:
+            block_of[index] = block_id
+
+    # Hopcroft's refinement
+    pending = set((block_id, column) for block_id in range(len(blocks)) for column in range(len(symbols)))
+    while pending:
+        (splitter, column) = pending.pop()
+        # States leading into the splitter block with the given symbol
+        predecessors = set()
+        for dst in blocks[splitter]:
+            predecessors.update(inverse[column].get(dst, ()))
+        # Group them by their current block
+        touched = dict()
+        for src in predecessors:
+            touched.setdefault(block_of[src], set()).add(src)
+        for (block_id, intersection) in touched.items():
+            block = blocks[block_id]
+            if len(intersection) == len(block):
+                continue
+            # Split the block: the intersection moves into a new block
+            block -= intersection
+            new_block_id = len(blocks)
+            blocks.append(intersection)
+            for index in intersection:
+                block_of[index] = new_block_id
+            for other_column in range(len(symbols)):
+                if (block_id, other_column) in pending:
+                    pending.add((new_block_id, other_column))
+                elif len(intersection) <= len(block):
+                    pending.add((new_block_id, other_column))
+                else:
+                    pending.add((block_id, other_column))
+
+    # Build the minimized FSM, each block being represented by one of its states (initial state for its block)
+    if target is None:
+        target = fsm.__class__()
+    representatives = dict()
+    for (index, state) in enumerate(states):
+        representatives.setdefault(block_of[index], index)
+    mapping = dict((state, states[representatives[block_of[index]]]) for (index, state) in enumerate(states))
+    if fsm.is_dead_state_on():
+        mapping[fsm.dead_state] = fsm.dead_state
+
+    for (block_id, index) in representatives.items():
+        target.add_state(states[index])
+    target.initial_state = states[0]
+    target.dead_state = fsm.dead_state
+    for (block_id, index) in representatives.items():
+        # Classes of symbols leading into the same state with the same callback are merged into one SymbolSet
+        merged = dict()
+        for (column, symbol) in enumerate(symbols):
+            dst = delta[index][column]
+            if dst == sink:
+                continue
+            dst = representatives[block_of[dst]]
+            if class_map is None:
+                target.add_transition(Transition(symbol, states[index], states[dst],
+                                                 on_transition=callbacks[index][column]))
+            else:
+                merged.setdefault((dst, id(callbacks[index][column])), (callbacks[index][column], []))[1].append(symbol)
+        for ((dst, _), (on_transition, symbol_sets)) in merged.items():
+            target.add_transition(Transition(symbol_sets[0].union(*symbol_sets[1:]), states[index], states[dst],
+                                             on_transition=on_transition))
+    target.require_final = fsm.require_final
+    target.validate()
+    return (target, mapping)
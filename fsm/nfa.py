@@ -0,0 +1,291 @@
+# encoding: utf-8
+
+from collections import deque
+
+from fsm import FSM
+from lazy import LazyFSM
+from state import State, DeadState
+from transition import Transition
+from fsm_exceptions import *
+
+
+class _Epsilon(object):
+
+    def __repr__(self):
+        return 'EPSILON'
+
+    def __reduce__(self):
+        # Pickled by reference, so that it stays a singleton
+        return 'EPSILON'
+
+
+# Symbol of an epsilon transition: it is followed without consuming any symbol
+EPSILON = _Epsilon()
+
+
+# Regular FSM created by NFA.to_dfa() when no target is given
+class DFA(FSM):
+    pass
+
+
+class LazyDFA(LazyFSM):
+
+    def __init__(self, nfa, cache_size=4096):
+        """
+        Deterministic FSM following an NFA by lazy subset construction (see NFA.determinize()).
+        States are identified by frozensets of ids of NFA states, the empty set being the dead state.
+
+        :param nfa: NFA to follow
+        :type nfa: NFA
+        :param cache_size: Maximum number of cached transitions
+        :type cache_size: int
+        """
+        self._nfa = nfa
+        super(LazyDFA, self).__init__(nfa.subset_step, nfa.initial_subset(), nfa.is_final_subset,
+                                      dead_state=DeadState(frozenset()), alphabet=nfa.alphabet,
+                                      cache_size=cache_size)
+
+    @property
+    def nfa(self):
+        """
+        :return: Followed NFA
+        :rtype: NFA
+        """
+        return self._nfa
+
+
+class NFA(object):
+
+    def __init__(self):
+        """
+        Initializes a new nondeterministic finite automaton: a state may have any number of transitions
+        for the same symbol, and EPSILON transitions followed without consuming a symbol. An NFA is not stepped
+        itself; it is followed by a deterministic FSM built from it by subset construction, either lazily
+        (see determinize()) or eagerly (see to_dfa()). Only the final flags of the states matter:
+        callbacks of NFA states and transitions are never performed.
+        """
+        # Set of all states and all transitions in this NFA
+        self._states = set()
+        self._transitions = set()
+
+        # Initial state of this NFA
+        self._initial_state = None
+
+        # Set of all symbols (EPSILON excluded)
+        self._alphabet = set()
+
+        # Ids of all final states
+        self._final = set()
+
+        # Two-level dict {symbol: {src_id: set(dst_ids)}}, EPSILON transitions included
+        self._map = dict()
+
+        # Epsilon closures of single states, by state id (cleared by every epsilon transition)
+        self._closures = dict()
+
+    @property
+    def initial_state(self):
+        """
+        Gets the initial state of the NFA.
+        :return: Initial state
+        :rtype: (State|None)
+        """
+        return self._initial_state
+
+    @initial_state.setter
+    def initial_state(self, value):
+        """
+        Sets the initial state of the NFA.
+        :param value: Initial state
+        :type value: State
+        """
+        assert isinstance(value, State), 'Invalid argument type'
+        assert value in self._states, 'State not in the set of known states'
+        self._initial_state = value
+
+    @property
+    def alphabet(self):
+        """
+        :return: Set of all symbols (EPSILON excluded)
+        :rtype: frozenset
+        """
+        return frozenset(self._alphabet)
+
+    def add_state(self, state):
+        """
+        Adds the given state to the NFA. New state must have a unique id, otherwise an error is thrown.
+        :param state: State to be added to this NFA
+        :type state: State
+        """
+        # State must be 'regular' state
+        assert isinstance(state, State), 'Invalid argument type'
+        assert not isinstance(state, DeadState), 'Invalid argument type'
+        if state in self._states:
+            raise DuplicateState
+        self._states.add(state)
+        if state.final:
+            self._final.add(state.id)
+
+    def add_transition(self, transition):
+        """
+        Adds the given transition to the NFA. Unlike in an FSM, a state may have several transitions
+        with the same symbol; the symbol may also be EPSILON.
+        :param transition: Transition to be added to this NFA
+        :type transition: Transition
+        """
+        assert isinstance(transition, Transition), 'Invalid argument type'
+        if transition in self._transitions:
+            raise DuplicateTransition
+        if transition.src_state not in self._states or transition.dst_state not in self._states:
+            raise TransitionContainsUnknownState
+        self._transitions.add(transition)
+        self._map.setdefault(transition.symbol, dict()).setdefault(transition.src_state.id, set()).add(
+            transition.dst_state.id)
+        if transition.symbol is EPSILON:
+            self._closures.clear()
+        else:
+            self._alphabet.add(transition.symbol)
+
+    def initial_subset(self):
+        """
+        :return: Ids of the states the NFA is in initially (epsilon closure of the initial state)
+        :rtype: frozenset
+        """
+        if self._initial_state is None:
+            raise NoInitialState
+        return self._closure([self._initial_state.id])
+
+    def subset_step(self, subset, symbol):
+        """
+        Follows the given symbol from all of the given states at once.
+        :param subset: Ids of states (closed under epsilon transitions)
+        :type subset: frozenset
+        :param symbol: Symbol to follow
+        :type symbol: object
+        :return: Ids of the reached states (epsilon closure included), None if there are none
+        :rtype: (frozenset|None)
+        """
+        inner_dict = self._map.get(symbol)
+        if not inner_dict:
+            return None
+        reached = set()
+        for state_id in subset:
+            dst_ids = inner_dict.get(state_id)
+            if dst_ids:
+                reached.update(dst_ids)
+        return self._closure(reached) if reached else None
+
+    def is_final_subset(self, subset):
+        """
+        :param subset: Ids of states
+        :type subset: frozenset
+        :return: True if any of the given states is final, False otherwise.
+        :rtype: bool
+        """
+        return not self._final.isdisjoint(subset)
+
+    def accepts(self, sequence):
+        """
+        Simulates the NFA on the given sequence, without building any deterministic FSM.
+        Throws an exception if a symbol is not in the alphabet.
+        :param sequence: Symbols to follow
+        :type sequence: iterable
+        :return: True if the sequence leads into a final state, False otherwise.
+        :rtype: bool
+        """
+        subset = self.initial_subset()
+        for symbol in sequence:
+            if symbol not in self._alphabet:
+                raise UnknownSymbol(symbol)
+            subset = self.subset_step(subset, symbol)
+            if subset is None:
+                return False
+        return self.is_final_subset(subset)
+
+    def determinize(self, cache_size=4096):
+        """
+        Creates a deterministic FSM following this NFA by lazy subset construction: each state (a set of NFA states)
+        and each transition is computed the first time it is reached, and transitions are kept in a size-bounded
+        LRU cache (see LazyFSM). The NFA must not be modified while the FSM is in use.
+        :param cache_size: Maximum number of cached transitions
+        :type cache_size: int
+        :rtype: LazyDFA
+        """
+        return LazyDFA(self, cache_size)
+
+    def to_dfa(self, target=None):
+        """
+        Converts this NFA into an equivalent (validated) FSM by eager subset construction.
+        Only the sets of NFA states reachable from the initial state are generated; their ids are frozensets
+        of ids of NFA states, and the empty set is the dead state. If the FSM would have no transitions at all
+        (e.g. for the language of the empty word only), the empty set is a regular state looping on every symbol
+        instead. The FSM may have no final state when the NFA accepts nothing (see FSM.require_final).
+        Throws EmptySetOfTransitions if the NFA has no symbols (only EPSILON transitions, or none):
+        an FSM needs at least one transition, use accepts() for such an NFA.
+        :param target: Empty FSM to populate, new DFA if undefined
+        :type target: (FSM|None)
+        :rtype: FSM
+        """
+        initial = self.initial_subset()
+        if not self._alphabet:
+            raise EmptySetOfTransitions
+        states = {initial: State(initial, final=self.is_final_subset(initial))}
+        transitions = []
+        pending = deque([initial])
+        while pending:
+            subset = pending.popleft()
+            for symbol in self._alphabet:
+                reached = self.subset_step(subset, symbol)
+                if reached is None:
+                    continue
+                if reached not in states:
+                    states[reached] = State(reached, final=self.is_final_subset(reached))
+                    pending.append(reached)
+                transitions.append(Transition(symbol, states[subset], states[reached]))
+
+        dead_state = DeadState(frozenset())
+        if not transitions:
+            # Every symbol leads from the initial state into the (regular) empty set, which it never leaves
+            dead_state = None
+            states[frozenset()] = State(frozenset())
+            for symbol in self._alphabet:
+                for state in states.values():
+                    transitions.append(Transition(symbol, state, states[frozenset()]))
+
+        if target is None:
+            target = DFA()
+        target.add_states(states.values())
+        target.initial_state = states[initial]
+        target.dead_state = dead_state
+        target.add_transitions(transitions)
+        target.require_final = False
+        target.validate()
+        return target
+
+    def _closure(self, state_ids):
+        """
+        Helper function.
+        :param state_ids: Ids of states
+        :type state_ids: iterable
+        :return: Ids of the given states and of all states reachable from them by epsilon transitions
+        :rtype: frozenset
+        """
+        epsilon = self._map.get(EPSILON)
+        if not epsilon:
+            return frozenset(state_ids)
+        closures = self._closures
+        result = set()
+        for state_id in state_ids:
+            closure = closures.get(state_id)
+            if closure is None:
+                # Depth-first search over epsilon transitions
+                closure = set([state_id])
+                stack = [state_id]
+                while stack:
+                    for dst_id in epsilon.get(stack.pop(), ()):
+                        if dst_id not in closure:
+                            closure.add(dst_id)
+                            stack.append(dst_id)
+                closure = closures[state_id] = frozenset(closure)
+            result.update(closure)
+        return frozenset(result)
@@ -0,0 +1,153 @@
+# encoding: utf-8
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+import os
+
+
+# Recognizer of the worker process, shipped once per worker by _init_worker()
+_recognizer = None
+
+
+def recognize_many(table, sequences, max_workers=None, chunk_size=1000, ordered=True):
+    """
+    Checks many independent sequences against a compiled FSM using a pool of worker processes.
+    The callback-free part of the table (see Recognizer) is shipped to each worker once; sequences are then
+    streamed to the workers in chunks. At most two chunks per worker are in flight at any time,
+    so sequences may come from an iterable that is too large to be held in memory.
+    Errors raised in the workers (e.g. UnknownSymbol) are raised again when the corresponding result is reached.
+
+    :param table: Transition table of a compiled FSM (see FSM.compile())
+    :type table: TransitionTable
+    :param sequences: Sequences of symbols, each of them must be picklable
+    :type sequences: iterable
+    :param max_workers: Number of worker processes, number of CPUs if undefined
+    :type max_workers: (int|None)
+    :param chunk_size: Number of sequences sent to a worker at once
+    :type chunk_size: int
+    :param ordered: Indicates whether results are yielded in the order of sequences, or as they complete
+    :type ordered: bool
+    :return: Generator of (index, accepted, end_state) tuples, index being the position of the sequence
+    :rtype: generator
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = 2 * max_workers
+    chunks = _chunks(enumerate(sequences), chunk_size)
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(table.recognizer,)) as executor:
+        if ordered:
+            pending = deque(executor.submit(_recognize_chunk, chunk) for chunk in islice(chunks, max_pending))
+            while pending:
+                results = pending.popleft().result()
+                for chunk in islice(chunks, 1):
+                    pending.append(executor.submit(_recognize_chunk, chunk))
+                for result in _results(table, results):
+                    yield result
+        else:
+            pending = set(executor.submit(_recognize_chunk, chunk) for chunk in islice(chunks, max_pending))
+            while pending:
+                (done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+                for chunk in islice(chunks, len(done)):
+                    pending.add(executor.submit(_recognize_chunk, chunk))
+                for future in done:
+                    for result in _results(table, future.result()):
+                        yield result
+
+
+def recognize_parallel(table, sequence, max_workers=None, chunk_size=100000):
+    """
+    Checks a single (very long) sequence against a compiled FSM using a pool of worker processes.
+    The sequence is split into chunks, and for each chunk a worker computes where it leads from every state
+    (see Recognizer.transfer()). Composing those mappings left to right gives the true end state.
+    This pays off for FSMs with few states, as each chunk is followed from all of them.
+    At most two chunks per worker are in flight at any time.
+
+    :param table: Transition table of a compiled FSM (see FSM.compile())
+    :type table: TransitionTable
+    :param sequence: Symbols to follow, sliceable sequences (e.g. list, str, bytes) are split without iterating
+    :type sequence: iterable
+    :param max_workers: Number of worker processes, number of CPUs if undefined
+    :type max_workers: (int|None)
+    :param chunk_size: Number of symbols sent to a worker at once
+    :type chunk_size: int
+    :return: Whether the sequence was accepted, and the end state
+    :rtype: tuple
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = 2 * max_workers
+    if hasattr(sequence, '__getitem__') and hasattr(sequence, '__len__'):
+        chunks = (sequence[start:start + chunk_size] for start in range(0, len(sequence), chunk_size))
+    else:
+        chunks = _chunks(sequence, chunk_size)
+    state = table.initial
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(table.recognizer,)) as executor:
+        pending = deque(executor.submit(_transfer_chunk, chunk) for chunk in islice(chunks, max_pending))
+        while pending:
+            mapping = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(_transfer_chunk, chunk))
+            state = mapping[state]
+    return (bool(table.final[state]), table.states[state])
+
+
+def _chunks(iterable, chunk_size):
+    """
+    Helper function. Splits the given iterable into lists of (at most) chunk_size items.
+    :param iterable: Items
+    :type iterable: iterable
+    :param chunk_size: Size of the chunks
+    :type chunk_size: int
+    :rtype: generator
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _results(table, results):
+    """
+    Helper function. Translates (index, end state id) pairs computed by a worker into results.
+    :param table: Transition table
+    :type table: TransitionTable
+    :param results: Pairs computed by _recognize_chunk()
+    :type results: list
+    :rtype: generator
+    """
+    for (index, end) in results:
+        yield (index, bool(table.final[end]), table.states[end])
+
+
+def _init_worker(recognizer):
+    """
+    Helper function. Initializes a worker process.
+    :param recognizer: Recognizer to use in this worker
+    :type recognizer: Recognizer
+    """
+    global _recognizer
+    _recognizer = recognizer
+
+
+def _recognize_chunk(chunk):
+    """
+    Helper function. Runs in a worker process.
+    :param chunk: List of (index, sequence) pairs
+    :type chunk: list
+    :return: List of (index, end state id) pairs
+    :rtype: list
+    """
+    follow = _recognizer.follow
+    return [(index, follow(sequence)[0]) for (index, sequence) in chunk]
+
+
+def _transfer_chunk(chunk):
+    """
+    Helper function. Runs in a worker process.
+    :param chunk: Symbols
+    :type chunk: iterable
+    :return: List of end state ids, indexed by the id of the start state
+    :rtype: list
+    """
+    return _recognizer.transfer(chunk)
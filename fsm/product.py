@@ -0,0 +1,152 @@
+# encoding: utf-8
+
+from collections import deque
+
+from fsm import FSM
+from state import State
+from transition import Transition
+from fsm_exceptions import ValidationRequired
+
+
+# Acceptance of a product FSM: final when all of the components are in final states, or when any of them is
+INTERSECTION = 'intersection'
+UNION = 'union'
+
+
+class ProductState(State):
+
+    __slots__ = ('_components',)
+
+    def __init__(self, components, final=False):
+        """
+        Initializes a new state of a product FSM (see product()). Its id is the tuple of the ids of its components.
+        The state itself has no callbacks: those of the components are performed by the transitions.
+
+        :param components: State of every component FSM (its dead state included)
+        :type components: tuple
+        :param final: Indicates whether the state is final or not.
+        :type final: bool
+        """
+        self._components = tuple(components)
+        super(ProductState, self).__init__(tuple(state.id for state in self._components), final=final)
+
+    @property
+    def components(self):
+        """
+        Gets the state of every component FSM, in the order in which the components were given to product().
+        :return: Component states
+        :rtype: tuple
+        """
+        return self._components
+
+
+class _Dispatch(object):
+
+    __slots__ = ('_fns',)
+
+    def __init__(self, fns):
+        """
+        Helper class. on_transition callback of a product FSM, performing the callbacks of the components in order.
+        :param fns: Callbacks
+        :type fns: tuple
+        """
+        self._fns = fns
+
+    def __call__(self):
+        for fn in self._fns:
+            fn()
+
+
+def product(fsms, target=None, accept=INTERSECTION):
+    """
+    Combines the given (validated) FSMs into a single FSM which follows all of them at once: every symbol is
+    looked up once, instead of once per component. The alphabet of the product is the union of their alphabets;
+    a component ignores the symbols that are not in its own alphabet (it stays in its state, without callbacks),
+    which is what stepping each of them only with its own symbols would do.
+
+    Only product states reachable from the initial states of the components are generated. Each transition
+    of the product performs the callbacks of the components which follow the symbol, component after component,
+    in the same order as separate steps of the components would (callbacks are taken when the product is built).
+    Components which fall into their dead state stay in it, so the product itself has no dead state.
+    The product may have no final state at all (e.g. the intersection of disjoint languages): it does not
+    require one (see FSM.require_final).
+    The current state of the product can be projected back onto the components (see project()).
+
+    :param fsms: Component FSMs (without symbol classes)
+    :type fsms: sequence
+    :param target: Empty FSM to populate, new instance of the same class as the first component if undefined
+    :type target: (FSM|None)
+    :param accept: Whether a product state is final when all of its components are (INTERSECTION),
+                   or when any of them is (UNION)
+    :type accept: str
+    :return: Product FSM
+    :rtype: FSM
+    """
+    fsms = list(fsms)
+    assert fsms, 'At least one FSM is required'
+    assert accept in (INTERSECTION, UNION), 'Unknown acceptance: {}'.format(accept)
+    for fsm in fsms:
+        if fsm._dirty:
+            raise ValidationRequired
+        assert fsm._class_map is None, 'FSMs with symbol classes are not supported'
+    is_final = all if accept == INTERSECTION else any
+
+    # Symbols of the product, and the components following each of them (with the inner dict of their map)
+    symbols = set()
+    for fsm in fsms:
+        symbols.update(fsm._alphabet)
+    followers = dict((symbol, [(index, fsm._map[symbol], fsm.dead_state) for (index, fsm) in enumerate(fsms)
+                               if symbol in fsm._alphabet]) for symbol in symbols)
+
+    # Breadth-first generation of the reachable product states
+    initial = ProductState([fsm.initial_state for fsm in fsms], is_final(fsm.initial_state.final for fsm in fsms))
+    states = {initial.components: initial}
+    transitions = []
+    pending = deque([initial])
+    while pending:
+        src_state = pending.popleft()
+        for symbol in symbols:
+            components = list(src_state.components)
+            fns = []
+            for (index, inner_dict, dead_state) in followers[symbol]:
+                (dst, on_transition_fn, loop) = FSM._follow(components[index], inner_dict, dead_state)
+                src = components[index]
+                # Same callbacks, in the same order, as FSM.step() of the component
+                fns.extend(fn for fn in (src.on_loop_exit if loop else src.on_exit, on_transition_fn,
+                                         dst.on_loop_enter if loop else dst.on_enter) if callable(fn))
+                components[index] = dst
+            components = tuple(components)
+            dst_state = states.get(components)
+            if dst_state is None:
+                dst_state = states[components] = ProductState(components, is_final(state.final for state in components))
+                pending.append(dst_state)
+            transitions.append(Transition(symbol, src_state, dst_state,
+                                          on_transition=_Dispatch(tuple(fns)) if fns else None))
+
+    if target is None:
+        target = fsms[0].__class__()
+    target.add_states(states.values())
+    target.initial_state = initial
+    target.add_transitions(transitions)
+    target.require_final = False
+    target.validate()
+    return target
+
+
+def project(fsm, components=None):
+    """
+    Projects the current state of a product FSM back onto its components.
+    :param fsm: Product FSM (see product())
+    :type fsm: FSM
+    :param components: Component FSMs to move into their projected states (without performing any callbacks)
+    :type components: (sequence|None)
+    :return: Current state of every component
+    :rtype: tuple
+    """
+    states = fsm.current_state.components
+    if components is not None:
+        assert len(components) == len(states), 'Number of components does not match the product'
+        for (component, state) in zip(components, states):
+            component._set_current_state(state)
+    return states
+
@@ -0,0 +1,165 @@
+# encoding: utf-8
+
+from array import array
+from collections import namedtuple
+import math
+import time
+
+
+# Monotonic high-resolution clock where available (Python 3)
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Latency histogram buckets: bucket 0 holds latencies below the resolution, each following bucket
+# covers latencies up to _BUCKETS_PER_OCTAVE times finer than powers of two (~19% relative error)
+_RESOLUTION = 1e-6
+_BUCKETS_PER_OCTAVE = 4
+_BUCKET_COUNT = 32 * _BUCKETS_PER_OCTAVE + 2
+
+# Label of a profiled callback: id of the state it belongs to (source state for on_transition),
+# callback kind (on_exit, on_loop_exit, on_transition, on_enter or on_loop_enter) and followed symbol
+CallbackLabel = namedtuple('CallbackLabel', ['state_id', 'kind', 'symbol'])
+
+# Summary of a latency histogram (all latencies in seconds)
+LatencySummary = namedtuple('LatencySummary', ['count', 'total', 'p50', 'p99', 'max'])
+
+
+class LatencyHistogram(object):
+
+    __slots__ = ('_buckets', '_count', '_total', '_max')
+
+    def __init__(self):
+        """
+        Initializes a new fixed-memory latency histogram with logarithmic buckets.
+        Percentiles are reported as the upper bound of their bucket (capped by the maximum latency).
+        """
+        self._buckets = array('L', [0] * _BUCKET_COUNT)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    @property
+    def count(self):
+        """
+        :return: Number of recorded latencies
+        :rtype: int
+        """
+        return self._count
+
+    def add(self, latency):
+        """
+        Records a latency.
+        :param latency: Latency in seconds
+        :type latency: float
+        """
+        if latency < _RESOLUTION:
+            bucket = 0
+        else:
+            bucket = min(int(math.log(latency / _RESOLUTION, 2) * _BUCKETS_PER_OCTAVE) + 1, _BUCKET_COUNT - 1)
+        self._buckets[bucket] += 1
+        self._count += 1
+        self._total += latency
+        if latency > self._max:
+            self._max = latency
+
+    def percentile(self, q):
+        """
+        :param q: Percentile, between 0 and 100
+        :type q: float
+        :return: Latency below which the given percentage of recorded latencies falls (0 if nothing was recorded)
+        :rtype: float
+        """
+        rank = q / 100.0 * self._count
+        seen = 0
+        for (bucket, count) in enumerate(self._buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(_RESOLUTION * 2 ** (float(bucket) / _BUCKETS_PER_OCTAVE), self._max)
+        return self._max
+
+    def summary(self):
+        """
+        :rtype: LatencySummary
+        """
+        return LatencySummary(self._count, self._total, self.percentile(50), self.percentile(99), self._max)
+
+
+class CallbackProfiler(object):
+
+    def __init__(self, threshold=None, on_slow=None, clock=_clock):
+        """
+        Initializes a new callback profiler of an FSM (see FSM.enable_profiling()).
+        Every callback performed by a step is timed, and its latency recorded in a histogram of its label
+        (see CallbackLabel). Callbacks which are not defined are neither called nor recorded.
+
+        :param threshold: Latency budget of a single callback in seconds, no budget if undefined
+        :type threshold: (float|None)
+        :param on_slow: Function called with the label and the latency of each callback that exceeded the budget
+        :type on_slow: (callable|None)
+        :param clock: Function returning the current time in seconds
+        :type clock: callable
+        """
+        self._threshold = threshold
+        self._on_slow = on_slow
+        self._clock = clock
+        self._histograms = dict()
+
+    def call(self, fn, state, kind, symbol):
+        """
+        Performs the given callback (if it is actually callable) and records its latency.
+        :param fn: Callback
+        :type fn: (callable|None)
+        :param state: State the callback belongs to
+        :type state: State
+        :param kind: Kind of the callback
+        :type kind: str
+        :param symbol: Followed symbol
+        :type symbol: object
+        """
+        if not callable(fn):
+            return
+        start = self._clock()
+        try:
+            fn()
+        finally:
+            self.record(state, kind, symbol, self._clock() - start)
+
+    def clock(self):
+        """
+        :return: Current time in seconds, as measured by this profiler
+        :rtype: float
+        """
+        return self._clock()
+
+    def record(self, state, kind, symbol, latency):
+        """
+        Records the latency of a callback timed by the caller (e.g. one that is awaited, see AsyncFSM).
+        :param state: State the callback belongs to
+        :type state: State
+        :param kind: Kind of the callback
+        :type kind: str
+        :param symbol: Followed symbol
+        :type symbol: object
+        :param latency: Latency in seconds
+        :type latency: float
+        """
+        label = CallbackLabel(state.id, kind, symbol)
+        histogram = self._histograms.get(label)
+        if histogram is None:
+            histogram = self._histograms[label] = LatencyHistogram()
+        histogram.add(latency)
+        if self._threshold is not None and latency > self._threshold and self._on_slow is not None:
+            self._on_slow(label, latency)
+
+    def report(self):
+        """
+        Summarizes the recorded latencies.
+        :return: Dict from labels to their summaries
+        :rtype: dict
+        """
+        return dict((label, histogram.summary()) for (label, histogram) in self._histograms.items())
+
+    def reset(self):
+        """
+        Drops all recorded latencies.
+        """
+        self._histograms = dict()
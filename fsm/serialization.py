@@ -0,0 +1,205 @@
+# encoding: utf-8
+
+from array import array
+from importlib import import_module
+import json
+import mmap
+import struct
+import sys
+import zlib
+
+from state import State, DeadState
+from table import TransitionTable
+from fsm_exceptions import SerializationError
+
+
+# Binary format of a compiled FSM (all numbers are little-endian):
+#   header    magic, format version, flags (reserved), number of states (including the dead state),
+#             number of symbols, length of metadata, offset of the table, CRC32 of the metadata, CRC32 of the table
+#   metadata  UTF-8 JSON with state ids, final flags, symbols and callbacks (as importable names)
+#   table     int32 array of destination state ids (see TransitionTable), aligned to 8 bytes
+MAGIC = b'CFSM'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sHHIIIIII')
+
+# Callback attributes of regular states and of the dead state
+_STATE_CALLBACKS = ('on_enter', 'on_exit', 'on_loop_enter', 'on_loop_exit')
+_DEAD_STATE_CALLBACKS = ('on_enter', 'on_loop_enter', 'on_loop_exit')
+
+
+def dumps(table):
+    """
+    Serializes a compiled FSM into the binary format.
+    State ids and symbols must be JSON scalars (str, int, float or bool); callbacks must be importable
+    module-level functions (or other objects reachable as module:qualified.name), otherwise an error is thrown.
+    :param table: Transition table of a compiled FSM (see FSM.compile())
+    :type table: TransitionTable
+    :return: Serialized FSM
+    :rtype: bytes
+    """
+    if not isinstance(table.symbol_index, dict):
+        raise SerializationError('Tables indexed by symbol classes cannot be serialized')
+    metadata = {
+        'states': [_dump_state(state, _STATE_CALLBACKS) for state in table.states[:-1]],
+        'dead_state': _dump_state(table.states[-1], _DEAD_STATE_CALLBACKS) if table.states[-1] is not None else None,
+        'symbols': [_check_scalar(symbol) for symbol in table.symbols],
+        'callbacks': [[cell, _callback_name(fn)] for (cell, fn) in enumerate(table.callbacks) if fn is not None]
+    }
+    metadata = json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+    next_states = array('i', table.next_states)
+    if sys.byteorder == 'big':
+        next_states.byteswap()
+
+    next_states = next_states.tobytes()
+    table_offset = _align(_HEADER.size + len(metadata))
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(table.states), table.width, len(metadata), table_offset,
+                          zlib.crc32(metadata) & 0xffffffff, zlib.crc32(next_states) & 0xffffffff)
+    return header + metadata + b'\0' * (table_offset - _HEADER.size - len(metadata)) + next_states
+
+
+def dump(table, path):
+    """
+    Serializes a compiled FSM into the given file (see dumps()).
+    :param table: Transition table of a compiled FSM
+    :type table: TransitionTable
+    :param path: Path of the file
+    :type path: str
+    """
+    with open(path, 'wb') as f:
+        f.write(dumps(table))
+
+
+def loads(buffer, verify=True):
+    """
+    Loads a compiled FSM from the given buffer. The transition table is not copied: it is a view of the buffer.
+    No validation is performed; the stored checksum of the metadata is checked instead, and when verify is set,
+    that of the table as well (which reads the whole table).
+    :param buffer: Serialized FSM (see dumps())
+    :type buffer: (bytes|bytearray|memoryview|mmap)
+    :param verify: Indicates whether to verify the checksum of the table
+    :type verify: bool
+    :rtype: TransitionTable
+    """
+    view = memoryview(buffer)
+    if len(view) < _HEADER.size:
+        raise SerializationError('Truncated header')
+    (magic, version, _, state_count, width, metadata_length, table_offset, metadata_checksum, table_checksum) = \
+        _HEADER.unpack(view[:_HEADER.size].tobytes())
+    if magic != MAGIC:
+        raise SerializationError('Not a serialized FSM')
+    if version != FORMAT_VERSION:
+        raise SerializationError('Unsupported format version: {}'.format(version))
+    table_end = table_offset + 4 * state_count * width
+    if len(view) < table_end:
+        raise SerializationError('Truncated table')
+    metadata = view[_HEADER.size:_HEADER.size + metadata_length].tobytes()
+    if zlib.crc32(metadata) & 0xffffffff != metadata_checksum:
+        raise SerializationError('Checksum mismatch')
+    if verify and zlib.crc32(view[table_offset:table_end]) & 0xffffffff != table_checksum:
+        raise SerializationError('Checksum mismatch')
+
+    metadata = json.loads(metadata.decode('utf-8'))
+    states = [_load_state(State, data, _STATE_CALLBACKS) for data in metadata['states']]
+    states.append(_load_state(DeadState, metadata['dead_state'], _DEAD_STATE_CALLBACKS)
+                  if metadata['dead_state'] else None)
+    if sys.byteorder == 'big':
+        next_states = array('i', view[table_offset:table_end].tobytes())
+        next_states.byteswap()
+    else:
+        next_states = view[table_offset:table_end].cast('i')
+    callbacks = [None] * (state_count * width)
+    for (cell, name) in metadata['callbacks']:
+        callbacks[cell] = _resolve(name)
+    return TransitionTable.from_arrays(states, metadata['symbols'], next_states, callbacks)
+
+
+def load(path, verify=False):
+    """
+    Loads a compiled FSM from the given file (see loads()). The file is memory-mapped,
+    so the pages of the transition table are only read when they are used. By default only the metadata
+    is verified: verifying the checksum of the table would read all of its pages up front.
+    :param path: Path of the file
+    :type path: str
+    :param verify: Indicates whether to verify the checksum of the table
+    :type verify: bool
+    :rtype: TransitionTable
+    """
+    with open(path, 'rb') as f:
+        # The map stays open for as long as the table (a view of it) is in use
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(buffer, verify)
+
+
+def _align(offset):
+    """
+    Helper function.
+    :return: Given offset rounded up to a multiple of 8
+    :rtype: int
+    """
+    return (offset + 7) & ~7
+
+
+def _dump_state(state, callbacks):
+    """
+    Helper function.
+    :return: JSON representation of the given state
+    :rtype: dict
+    """
+    data = {'id': _check_scalar(state.id), 'final': state.final}
+    for name in callbacks:
+        fn = getattr(state, name)
+        if fn is not None:
+            data[name] = _callback_name(fn)
+    return data
+
+
+def _load_state(cls, data, callbacks):
+    """
+    Helper function.
+    :return: State created from its JSON representation
+    :rtype: State
+    """
+    kwargs = dict((name, _resolve(data[name])) for name in callbacks if name in data)
+    return cls(data['id'], final=data['final'], **kwargs)
+
+
+def _check_scalar(value):
+    """
+    Helper function. Throws an error if the given value cannot be stored as a JSON scalar.
+    :return: Value
+    :rtype: object
+    """
+    if not isinstance(value, (str, int, float)):
+        raise SerializationError('Not a JSON scalar: {!r}'.format(value))
+    return value
+
+
+def _callback_name(fn):
+    """
+    Helper function. Throws an error if the given callback cannot be imported back by its name.
+    :return: Importable name of the callback (module:qualified.name)
+    :rtype: str
+    """
+    qualified_name = getattr(fn, '__qualname__', getattr(fn, '__name__', None))
+    name = '{}:{}'.format(getattr(fn, '__module__', None), qualified_name)
+    try:
+        if _resolve(name) is fn:
+            return name
+    except (ImportError, AttributeError, ValueError):
+        pass
+    raise SerializationError('Callback cannot be imported by its name: {!r}'.format(fn))
+
+
+def _resolve(name):
+    """
+    Helper function.
+    :param name: Importable name (module:qualified.name)
+    :type name: str
+    :return: Object with the given name
+    :rtype: object
+    """
+    (module, qualified_name) = name.split(':', 1)
+    obj = import_module(module)
+    for attribute in qualified_name.split('.'):
+        obj = getattr(obj, attribute)
+    return obj
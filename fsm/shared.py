@@ -0,0 +1,163 @@
+# encoding: utf-8
+
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import os
+import struct
+import sys
+
+from serialization import dumps, loads
+
+
+# Header of the shared memory segment: number of attached handles and length of the serialized FSM
+_HEADER = struct.Struct('<QQ')
+
+# Indicates whether SharedMemory can be opened without the resource tracker (Python >= 3.13)
+_TRACK_PARAMETER = sys.version_info >= (3, 13)
+
+
+class SharedTable(object):
+
+    def __init__(self, name, lock):
+        """
+        Initializes a new handle of a compiled FSM published in shared memory (see publish()).
+        Handles are passed to worker processes (e.g. as Process arguments, or inherited when forking);
+        each worker then attaches to the shared table, and detaches when done.
+        The segment is unlinked when the last attached handle detaches.
+
+        :param name: Name of the shared memory segment
+        :type name: str
+        :param lock: Lock guarding the reference count stored in the segment
+        :type lock: multiprocessing.Lock
+        """
+        self._name = name
+        self._lock = lock
+        # Segment and table of this handle while attached, and the attached process (forked children
+        # inherit attached handles, but have to attach on their own)
+        self._shm = None
+        self._table = None
+        self._pid = None
+
+    @classmethod
+    def publish(cls, table, lock=None):
+        """
+        Publishes the given compiled FSM into a new shared memory segment (using the format of serialization.dumps()).
+        The returned handle is already attached.
+        :param table: Transition table of a compiled FSM (see FSM.compile())
+        :type table: TransitionTable
+        :param lock: Lock guarding the reference count, new lock if undefined
+        :type lock: (multiprocessing.Lock|None)
+        :return: Attached handle
+        :rtype: SharedTable
+        """
+        data = dumps(table)
+        shm = _open(size=_HEADER.size + len(data), create=True)
+        shm.buf[_HEADER.size:_HEADER.size + len(data)] = data
+        _HEADER.pack_into(shm.buf, 0, 0, len(data))
+        shared = cls(shm.name, lock or multiprocessing.Lock())
+        shared._attach(shm)
+        return shared
+
+    @property
+    def name(self):
+        """
+        Gets the name of the shared memory segment.
+        :return: Name
+        :rtype: str
+        """
+        return self._name
+
+    @property
+    def table(self):
+        """
+        Gets the transition table of this handle (only available while attached).
+        :return: Transition table
+        :rtype: (TransitionTable|None)
+        """
+        return self._table
+
+    def attach(self):
+        """
+        Attaches to the shared memory segment. The returned table is a read-only view of the segment:
+        only the states (and their callbacks) are created in this process.
+        :return: Transition table
+        :rtype: TransitionTable
+        """
+        if self._pid != os.getpid():
+            if self._shm is not None:
+                # Inherited from the parent process, which is still attached to it on its own
+                self._release()
+            self._attach(_open(name=self._name))
+        return self._table
+
+    def detach(self):
+        """
+        Detaches from the shared memory segment, unlinking it if this was the last attached handle.
+        The table returned by attach() must no longer be used.
+        """
+        if self._shm is None or self._pid != os.getpid():
+            return
+        with self._lock:
+            (count, length) = _HEADER.unpack_from(self._shm.buf, 0)
+            _HEADER.pack_into(self._shm.buf, 0, count - 1, length)
+        shm = self._release()
+        if count == 1:
+            _unlink(shm)
+
+    def _attach(self, shm):
+        """
+        Helper function. Registers this handle in the given segment and loads the table.
+        :param shm: Shared memory segment
+        :type shm: SharedMemory
+        """
+        with self._lock:
+            (count, length) = _HEADER.unpack_from(shm.buf, 0)
+            _HEADER.pack_into(shm.buf, 0, count + 1, length)
+        self._shm = shm
+        self._pid = os.getpid()
+        self._table = loads(shm.buf[_HEADER.size:_HEADER.size + length].toreadonly())
+
+    def _release(self):
+        """
+        Helper function. Closes the segment of this handle, without unregistering it.
+        :return: Closed segment
+        :rtype: SharedMemory
+        """
+        # Views of the segment have to be released before it can be closed
+        if isinstance(self._table.next_states, memoryview):
+            self._table.next_states.release()
+        shm = self._shm
+        shm.close()
+        self._shm = None
+        self._table = None
+        self._pid = None
+        return shm
+
+    def __getstate__(self):
+        # Only the name and the lock are passed to other processes, they attach on their own
+        return {'_name': self._name, '_lock': self._lock, '_shm': None, '_table': None, '_pid': None}
+
+
+def _open(name=None, size=0, create=False):
+    """
+    Helper function. Opens a shared memory segment whose lifetime is managed by SharedTable only
+    (the resource tracker would otherwise unlink it as soon as the process that opened it exits).
+    :rtype: SharedMemory
+    """
+    if _TRACK_PARAMETER:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _unlink(shm):
+    """
+    Helper function. Unlinks a shared memory segment opened by _open().
+    :param shm: Shared memory segment
+    :type shm: SharedMemory
+    """
+    if not _TRACK_PARAMETER:
+        # SharedMemory.unlink() unregisters the segment from the resource tracker, which must know it then
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
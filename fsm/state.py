@@ -3,8 +3,22 @@
 from fsm_exceptions import OnExitNotSupportedInDeadState
 
 
+def perform_call(fn):
+    """
+    Performs a callback of a state or a transition (shared by FSM and Cursor steps).
+    :param fn: Callable object that need to be called (if it is actually callable)
+    :param fn: (callable|None)
+    """
+    if callable(fn):
+        fn()
+
+
 class State(object):
 
+    # States are held in large numbers, so they do not carry a per-instance __dict__.
+    # Hash of the id is precomputed, as states are hashed on every map lookup.
+    __slots__ = ('_id', '_final', '_on_enter', '_on_exit', '_on_loop_enter', '_on_loop_exit', '_hash')
+
     def __init__(self, id, final=False, on_enter=None, on_exit=None, on_loop_enter=None, on_loop_exit=None):
         """
         Initializes a new state.
@@ -25,6 +39,7 @@ class State(object):
 
         # Define private fields
         self._id = None
+        self._hash = None
         self._final = None
         self._on_enter = None
         self._on_exit = None
@@ -101,6 +116,7 @@ class State(object):
         """
         assert value is not None, 'Id cannot be None'
         self._id = value
+        self._hash = hash(value)
 
     @final.setter
     def final(self, value):
@@ -155,7 +171,7 @@ class State(object):
     # The below operators are overridden to support dictionary operations
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.id == other.id
+            return self._id == other._id
         else:
             return False
 
@@ -163,11 +179,13 @@ class State(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(self._id)
+        return self._hash
 
 
 class DeadState(State):
 
+    __slots__ = ()
+
     def __init__(self, id, final=False, on_enter=None, on_loop_enter=None, on_loop_exit=None):
         """
         Initializes a new dead state. Dead state is a state from which there is no return.
@@ -0,0 +1,95 @@
+# encoding: utf-8
+
+from collections import defaultdict, namedtuple
+import time
+
+from state import DeadState
+
+
+# Monotonic high-resolution clock where available (Python 3)
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Counters of a single state: number of times it was entered, exited, looped (a transition into itself),
+# left for the dead state, and the total time spent in it (in seconds)
+StateCounters = namedtuple('StateCounters', ['enters', 'exits', 'loops', 'dead_entries', 'dwell'])
+
+# Copy of all counters: total number of steps, dict from (symbol, src_state_id, dst_state_id) to the number
+# of times the transition fired, and dict from state ids to their StateCounters
+StatsSnapshot = namedtuple('StatsSnapshot', ['steps', 'transitions', 'states'])
+
+
+class Stats(object):
+
+    def __init__(self, current_state=None, clock=_clock):
+        """
+        Initializes new instrumentation counters of an FSM (see FSM.enable_stats()).
+        Every step is recorded: the transition that fired, and enters, exits or loops of the states involved.
+        The time spent in each state (dwell time) is measured from entering the state until leaving it;
+        loops do not leave the state.
+
+        :param current_state: State the FSM is in when the counters are started
+        :type current_state: (State|None)
+        :param clock: Function returning the current time in seconds
+        :type clock: callable
+        """
+        self._clock = clock
+        self._current_state = current_state
+        self.reset()
+
+    def reset(self):
+        """
+        Resets all counters. Dwell time of the current state is measured from now on.
+        """
+        self._steps = 0
+        self._transitions = defaultdict(int)
+        self._enters = defaultdict(int)
+        self._exits = defaultdict(int)
+        self._loops = defaultdict(int)
+        self._dead_entries = defaultdict(int)
+        self._dwell = defaultdict(float)
+        self._since = self._clock()
+
+    def record(self, symbol, src_state, dst_state, loop):
+        """
+        Records a single step. Called by the FSM after each step.
+        :param symbol: Followed symbol
+        :type symbol: object
+        :param src_state: Source state
+        :type src_state: State
+        :param dst_state: Destination state
+        :type dst_state: State
+        :param loop: Indicates whether the step was a loop
+        :type loop: bool
+        """
+        self._steps += 1
+        self._transitions[(symbol, src_state, dst_state)] += 1
+        if loop:
+            self._loops[src_state] += 1
+            return
+        now = self._clock()
+        self._dwell[src_state] += now - self._since
+        self._since = now
+        self._exits[src_state] += 1
+        self._enters[dst_state] += 1
+        if isinstance(dst_state, DeadState):
+            self._dead_entries[src_state] += 1
+        self._current_state = dst_state
+
+    def snapshot(self):
+        """
+        Copies all counters. Dwell time of the current state includes the time spent in it so far.
+        Transitions that never fired and states that were never visited are not included.
+        :rtype: StatsSnapshot
+        """
+        dwell = dict(self._dwell)
+        if self._current_state is not None:
+            dwell[self._current_state] = dwell.get(self._current_state, 0.0) + self._clock() - self._since
+        states = set(dwell) | set(self._enters) | set(self._exits) | set(self._loops)
+        return StatsSnapshot(
+            self._steps,
+            dict(((symbol, src.id, dst.id), count) for ((symbol, src, dst), count) in self._transitions.items()),
+            dict((state.id, StateCounters(self._enters.get(state, 0), self._exits.get(state, 0),
+                                          self._loops.get(state, 0), self._dead_entries.get(state, 0),
+                                          dwell.get(state, 0.0)))
+                 for state in states)
+        )
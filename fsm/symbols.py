@@ -0,0 +1,436 @@
+# encoding: utf-8
+
+from bisect import bisect_right
+
+from fsm_exceptions import StateCannotHaveSameSymbolTransitions
+
+try:
+    _chr = unichr
+    _string_types = (str, unicode)
+except NameError:
+    # Python 3
+    _chr = chr
+    _string_types = (str,)
+
+# Ranges spanning at most this many symbols in total are expanded into the lookup dict of SymbolClasses
+_EXPAND_LIMIT = 1 << 16
+
+
+class SymbolSet(object):
+
+    __slots__ = ('_symbols', '_ranges', '_excluded', '_hash')
+
+    def __init__(self, symbols=(), ranges=(), excluded=()):
+        """
+        Initializes a new set of symbols, used as the symbol of a transition that is followed for any of them.
+        A symbol belongs to the set if it is one of the given symbols, or if it falls into one of the given ranges
+        and it is not excluded. Ranges are inclusive pairs of integers or of single characters, e.g. ('a', 'z');
+        a range of characters only contains characters and a range of integers only integers.
+
+        :param symbols: Individual symbols
+        :type symbols: iterable
+        :param ranges: Inclusive (first, last) pairs
+        :type ranges: iterable
+        :param excluded: Symbols excluded from the ranges
+        :type excluded: iterable
+        """
+        self._symbols = frozenset(symbols)
+        ranges = tuple(sorted((tuple(bounds) for bounds in ranges), key=lambda bounds: _point(bounds[0])))
+        for (first, last) in ranges:
+            assert _point(first) is not None and _point(first)[0] == _point(last)[0], \
+                'Range bounds must be both integers or both single characters'
+            assert _point(first) <= _point(last), 'Range bounds must be ordered'
+        self._ranges = ranges
+        self._excluded = frozenset(excluded)
+        self._hash = hash((self._symbols, self._ranges, self._excluded))
+
+    @property
+    def symbols(self):
+        """
+        :return: Individual symbols
+        :rtype: frozenset
+        """
+        return self._symbols
+
+    @property
+    def ranges(self):
+        """
+        :return: Inclusive (first, last) pairs
+        :rtype: tuple
+        """
+        return self._ranges
+
+    @property
+    def excluded(self):
+        """
+        :return: Symbols excluded from the ranges
+        :rtype: frozenset
+        """
+        return self._excluded
+
+    def union(self, *others):
+        """
+        :return: Set of the symbols belonging to this set or to any of the given sets
+        :rtype: SymbolSet
+        """
+        sets = (self,) + others
+        excluded = set()
+        for symbol_set in sets:
+            excluded.update(symbol for symbol in symbol_set._excluded
+                            if not any(symbol in other for other in sets))
+        return SymbolSet(set().union(*(symbol_set._symbols for symbol_set in sets)),
+                         set().union(*(symbol_set._ranges for symbol_set in sets)), excluded)
+
+    def __contains__(self, symbol):
+        try:
+            if symbol in self._symbols:
+                return True
+        except TypeError:
+            # Unhashable symbol
+            return False
+        if symbol in self._excluded:
+            return False
+        point = _point(symbol)
+        return point is not None and any(_point(first) <= point <= _point(last) for (first, last) in self._ranges)
+
+    def __repr__(self):
+        return 'SymbolSet(symbols={!r}, ranges={!r}, excluded={!r})'.format(
+            sorted(self._symbols, key=repr), list(self._ranges), sorted(self._excluded, key=repr))
+
+    # The below operators are overridden to support dictionary operations
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self._symbols == other._symbols and self._ranges == other._ranges and \
+                   self._excluded == other._excluded
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return self._hash
+
+    def __getstate__(self):
+        return (self._symbols, self._ranges, self._excluded)
+
+    def __setstate__(self, state):
+        (self._symbols, self._ranges, self._excluded) = state
+        self._hash = hash(state)
+
+
+class _Otherwise(object):
+
+    def __repr__(self):
+        return 'OTHERWISE'
+
+    def __reduce__(self):
+        # Pickled by reference, so that it stays a singleton
+        return 'OTHERWISE'
+
+
+# Symbol of a per-state default transition: it is followed for every symbol of the alphabet
+# for which its source state has no other transition
+OTHERWISE = _Otherwise()
+
+
+def is_label(symbol):
+    """
+    :return: True if the given transition symbol stands for several symbols (SymbolSet or OTHERWISE)
+    :rtype: bool
+    """
+    return symbol is OTHERWISE or isinstance(symbol, SymbolSet)
+
+
+class SymbolClasses(object):
+
+    def __init__(self, symbols, outside, starts, interval_classes, labels):
+        """
+        Initializes a new partition of an alphabet into equivalence classes (see partition()).
+        Symbols are looked up in a dict first, and in the sorted ranges of symbols that were not expanded otherwise.
+
+        :param symbols: Dict from individual symbols to their class ids
+        :type symbols: dict
+        :param outside: Symbols excluded from all ranges covering them, which are not in the alphabet
+        :type outside: frozenset
+        :param starts: Sorted starting points of elementary ranges (see _point())
+        :type starts: list
+        :param interval_classes: Class id of each elementary range (-1 for ranges outside of the alphabet)
+        :type interval_classes: list
+        :param labels: Transition symbols (symbols and SymbolSets) each class belongs to, indexed by class id
+        :type labels: list
+        """
+        self._symbols = symbols
+        self._outside = outside
+        self._starts = starts
+        self._interval_classes = interval_classes
+        self._labels = labels
+
+    def __len__(self):
+        """
+        :return: Number of classes
+        :rtype: int
+        """
+        return len(self._labels)
+
+    def get(self, symbol, default=None):
+        """
+        :param symbol: Symbol
+        :type symbol: object
+        :return: Id of the class of the given symbol, default if it is not in the alphabet
+        :rtype: int
+        """
+        class_id = self._symbols.get(symbol)
+        if class_id is not None:
+            return class_id
+        if not self._starts or symbol in self._outside:
+            return default
+        point = _point(symbol)
+        if point is None:
+            return default
+        index = bisect_right(self._starts, point) - 1
+        if index < 0 or self._interval_classes[index] < 0:
+            return default
+        return self._interval_classes[index]
+
+    def __getitem__(self, symbol):
+        class_id = self.get(symbol)
+        if class_id is None:
+            raise KeyError(symbol)
+        return class_id
+
+    def __contains__(self, symbol):
+        return self.get(symbol) is not None
+
+    def labels(self, class_id):
+        """
+        :param class_id: Id of a class
+        :type class_id: int
+        :return: Transition symbols (symbols and SymbolSets) the symbols of the given class belong to
+        :rtype: frozenset
+        """
+        return self._labels[class_id]
+
+    def symbol_sets(self):
+        """
+        :return: Set of all symbols of every class, indexed by class id
+        :rtype: list
+        """
+        members = [[] for _ in self._labels]
+        ranges = [[] for _ in self._labels]
+        excluded = [[] for _ in self._labels]
+        for (index, start) in enumerate(self._starts):
+            class_id = self._interval_classes[index]
+            if class_id >= 0:
+                ranges[class_id].append((_symbol(start), _symbol((start[0], self._starts[index + 1][1] - 1))))
+        for (symbol, class_id) in self._symbols.items():
+            interval_class_id = self._interval_of(symbol) if _point(symbol) is not None else -1
+            if interval_class_id != class_id:
+                # Symbols covered by the range of another class are excluded from it
+                members[class_id].append(symbol)
+                if interval_class_id >= 0:
+                    excluded[interval_class_id].append(symbol)
+        for symbol in self._outside:
+            interval_class_id = self._interval_of(symbol)
+            if interval_class_id >= 0:
+                excluded[interval_class_id].append(symbol)
+        return [SymbolSet(*fields) for fields in zip(members, ranges, excluded)]
+
+    def _interval_of(self, symbol):
+        """
+        Helper function.
+        :return: Class id of the elementary range containing the given symbol (-1 if there is none)
+        :rtype: int
+        """
+        index = bisect_right(self._starts, _point(symbol)) - 1
+        return self._interval_classes[index] if index >= 0 else -1
+
+
+def partition(symbols, symbol_sets):
+    """
+    Partitions an alphabet into equivalence classes: two symbols are equivalent if they belong to exactly
+    the same transition symbols (i.e. they are the same individual symbol, or they belong to the same SymbolSets).
+    :param symbols: Individual symbols of the alphabet
+    :type symbols: iterable
+    :param symbol_sets: SymbolSets of the alphabet
+    :type symbol_sets: iterable
+    :rtype: SymbolClasses
+    """
+    symbols = set(symbols)
+    symbol_sets = list(set(symbol_sets))
+    class_ids = dict()
+    labels = []
+
+    def class_of(signature):
+        if signature not in class_ids:
+            class_ids[signature] = len(labels)
+            labels.append(signature)
+        return class_ids[signature]
+
+    # Elementary ranges, between consecutive bounds of all ranges, with the SymbolSets whose ranges cover them
+    # (excluded symbols are taken out of the ranges, so that they do not get the classes of their sets)
+    events = dict()
+    for symbol_set in symbol_sets:
+        for (first, last) in _covered(symbol_set):
+            events.setdefault(first, []).append((symbol_set, 1))
+            events.setdefault((first[0], last[1] + 1), []).append((symbol_set, -1))
+    starts = sorted(events)
+    signatures = []
+    active = dict()
+    for (index, start) in enumerate(starts):
+        for (symbol_set, delta) in events[start]:
+            active[symbol_set] = active.get(symbol_set, 0) + delta
+            if not active[symbol_set]:
+                del active[symbol_set]
+        # Ranges of different domains never overlap
+        if active and (index + 1 == len(starts) or starts[index + 1][0] == start[0]):
+            signatures.append(frozenset(active))
+        else:
+            signatures.append(None)
+
+    # Individual symbols (including the excluded ones, which fall out of the class of their range)
+    explicit = set(symbols)
+    for symbol_set in symbol_sets:
+        explicit.update(symbol_set.symbols)
+        explicit.update(symbol_set.excluded)
+    explicit_signatures = dict((symbol, frozenset([symbol] if symbol in symbols else []) | frozenset(
+        symbol_set for symbol_set in symbol_sets if symbol in symbol_set)) for symbol in explicit)
+
+    # An elementary range whose symbols are all looked up individually contains no symbol of its own class
+    taken = [0] * len(starts)
+    for symbol in explicit:
+        point = _point(symbol)
+        if point is not None:
+            index = bisect_right(starts, point) - 1
+            if index >= 0 and signatures[index] is not None:
+                taken[index] += 1
+    interval_classes = []
+    for (index, signature) in enumerate(signatures):
+        if signature is not None and taken[index] < starts[index + 1][1] - starts[index][1]:
+            interval_classes.append(class_of(signature))
+        else:
+            interval_classes.append(-1)
+
+    lookup = dict()
+    outside = set()
+    for (symbol, signature) in explicit_signatures.items():
+        if signature:
+            lookup[symbol] = class_of(signature)
+        elif _point(symbol) is not None:
+            outside.add(symbol)
+
+    # Small ranges are expanded, so that any symbol is found with a single dict lookup
+    size = sum(starts[index + 1][1] - start[1] for (index, start) in enumerate(starts)
+               if interval_classes[index] >= 0)
+    if size <= _EXPAND_LIMIT:
+        for (index, start) in enumerate(starts):
+            if interval_classes[index] >= 0:
+                for code in range(start[1], starts[index + 1][1]):
+                    symbol = _symbol((start[0], code))
+                    if symbol not in outside:
+                        lookup.setdefault(symbol, interval_classes[index])
+    return SymbolClasses(lookup, frozenset(outside), starts, interval_classes, labels)
+
+
+class ClassMap(object):
+
+    def __init__(self, classes, maps):
+        """
+        Initializes a new symbol-keyed view of the transitions resolved for every class of symbols (see classify()).
+        It stands in for the transition map (see FSM._map) when the FSM has SymbolSet or OTHERWISE transitions.
+
+        :param classes: Partition of the alphabet
+        :type classes: SymbolClasses
+        :param maps: Inner dicts {src_state: (dst_state, callback)} indexed by class id
+        :type maps: list
+        """
+        self.classes = classes
+        self.maps = maps
+
+    def get(self, symbol, default=None):
+        """
+        :param symbol: Symbol
+        :type symbol: object
+        :return: Inner dict of the class of the given symbol, default if it is not in the alphabet
+        :rtype: dict
+        """
+        class_id = self.classes.get(symbol)
+        return self.maps[class_id] if class_id is not None else default
+
+    def __getitem__(self, symbol):
+        return self.maps[self.classes[symbol]]
+
+    def __contains__(self, symbol):
+        return symbol in self.classes
+
+
+def classify(fsm_map):
+    """
+    Partitions the alphabet of the given transition map (see FSM._map) into classes and resolves the transitions
+    of every class: a state follows its only transition whose symbol covers the class, or its OTHERWISE
+    transition if there is none. Throws an exception if several transitions of a state cover the same class.
+    :param fsm_map: Transition map
+    :type fsm_map: dict
+    :return: Resolved transitions, None if the map has no SymbolSet or OTHERWISE transitions
+    :rtype: (ClassMap|None)
+    """
+    labels = [symbol for symbol in fsm_map if is_label(symbol)]
+    if not labels:
+        return None
+    classes = partition((symbol for symbol in fsm_map if not is_label(symbol)),
+                        (label for label in labels if label is not OTHERWISE))
+    defaults = fsm_map.get(OTHERWISE, {})
+    maps = []
+    for class_id in range(len(classes)):
+        inner_dict = dict()
+        for label in classes.labels(class_id):
+            for (src, value) in fsm_map[label].items():
+                if src in inner_dict:
+                    raise StateCannotHaveSameSymbolTransitions
+                inner_dict[src] = value
+        for (src, value) in defaults.items():
+            inner_dict.setdefault(src, value)
+        maps.append(inner_dict)
+    return ClassMap(classes, maps)
+
+
+def _covered(symbol_set):
+    """
+    Helper function.
+    :return: Ranges of the given SymbolSet as (first, last) pairs of points (see _point()),
+             split around its excluded symbols
+    :rtype: generator
+    """
+    excluded = sorted(point for point in (_point(symbol) for symbol in symbol_set.excluded) if point is not None)
+    for (first, last) in symbol_set.ranges:
+        (first, last) = (_point(first), _point(last))
+        for point in excluded:
+            if first <= point <= last:
+                if first < point:
+                    yield (first, (point[0], point[1] - 1))
+                first = (point[0], point[1] + 1)
+        if first <= last:
+            yield (first, last)
+
+
+def _point(symbol):
+    """
+    Helper function.
+    :return: Position of the given symbol in the space of ranges: (0, integer) or (1, code point),
+             None if the symbol cannot belong to a range
+    :rtype: (tuple|None)
+    """
+    if isinstance(symbol, int) and not isinstance(symbol, bool):
+        return (0, symbol)
+    if isinstance(symbol, _string_types) and len(symbol) == 1:
+        return (1, ord(symbol))
+    return None
+
+
+def _symbol(point):
+    """
+    Helper function. Inverse of _point().
+    :rtype: object
+    """
+    (domain, code) = point
+    return code if domain == 0 else _chr(code)
@@ -0,0 +1,248 @@
+# encoding: utf-8
+
+from array import array
+from collections import namedtuple
+from fsm_exceptions import UnknownSymbol
+
+
+# Outcome of FSM.run() and Cursor.run(): final state, number of consumed symbols and the position of the symbol
+# that led into the dead state (None if the dead state was not entered during the run)
+RunResult = namedtuple('RunResult', ['state', 'consumed', 'dead_at'])
+
+# Outcome of TransitionTable.match(): whether the sequence was accepted, the end state
+# and the number of consumed symbols (less than the length of the sequence if it ran into the dead state)
+MatchResult = namedtuple('MatchResult', ['accepted', 'state', 'position'])
+
+
+class TransitionTable(object):
+
+    def __init__(self, states, alphabet, transition_map, initial_state, dead_state=None, symbol_classes=None):
+        """
+        Compiles the transition map of a validated FSM into a dense, integer indexed table.
+        Every state gets an integer id (row) and every symbol gets an integer id (column).
+        The dead state is given the sentinel id len(states); its row loops back into itself,
+        and every transition that is missing from the map leads into it.
+        When symbol classes are given, columns are the class ids (the alphabet and the map are keyed by them)
+        and symbols are looked up through the classes instead of a dict.
+
+        :param states: Set of regular states of the FSM
+        :type states: set
+        :param alphabet: Set of symbols of the FSM
+        :type alphabet: set
+        :param transition_map: Two-level transition map of the FSM (see FSM._map)
+        :type transition_map: dict
+        :param initial_state: Initial state of the FSM
+        :type initial_state: State
+        :param dead_state: Dead state of the FSM
+        :type dead_state: (DeadState|None)
+        :param symbol_classes: Partition of the alphabet into classes (see symbols.partition())
+        :type symbol_classes: (SymbolClasses|None)
+        """
+        # Initial state always gets id 0, the dead state gets the last id
+        ordered_states = [initial_state] + [state for state in states if state != initial_state]
+        ordered_states.append(dead_state)
+        symbols = tuple(alphabet)
+        dead = len(ordered_states) - 1
+
+        # Flat row-major table: next_states[src * width + symbol] = dst
+        # Undefined transitions point to the dead state sentinel.
+        next_states = array('i', [dead]) * (len(ordered_states) * len(symbols))
+        # Flat list of on_transition callbacks using the same layout as next_states
+        callbacks = [None] * len(next_states)
+
+        state_index = dict((state, index) for (index, state) in enumerate(ordered_states) if state is not None)
+        symbol_index = dict((symbol, index) for (index, symbol) in enumerate(symbols))
+        for (symbol, inner_dict) in transition_map.items():
+            column = symbol_index[symbol]
+            for (src, (dst, on_transition)) in inner_dict.items():
+                cell = state_index[src] * len(symbols) + column
+                next_states[cell] = state_index[dst]
+                callbacks[cell] = on_transition
+        self._setup(ordered_states, symbols, next_states, callbacks, symbol_classes)
+
+    @classmethod
+    def from_arrays(cls, states, symbols, next_states, callbacks, symbol_index=None):
+        """
+        Creates a transition table from already compiled data (e.g. loaded from a file), without any validation.
+        :param states: States indexed by their id, initial state first and the dead state (or None) last
+        :type states: sequence
+        :param symbols: Symbols indexed by their id
+        :type symbols: sequence
+        :param next_states: Flat row-major table of destination state ids, any integer sequence (e.g. memoryview)
+        :type next_states: sequence
+        :param callbacks: Flat list of on_transition callbacks using the same layout as next_states
+        :type callbacks: list
+        :param symbol_index: Lookup from symbols to their ids (e.g. SymbolClasses), built from symbols if undefined
+        :type symbol_index: (dict|SymbolClasses|None)
+        :rtype: TransitionTable
+        """
+        table = cls.__new__(cls)
+        table._setup(states, symbols, next_states, callbacks, symbol_index)
+        return table
+
+    def _setup(self, states, symbols, next_states, callbacks, symbol_index=None):
+        """
+        Helper function. Sets all fields of the table (see from_arrays()).
+        """
+        # Tuple of all states indexed by their id (last item is the dead state, or None)
+        self.states = tuple(states)
+
+        # Tuple of all symbols indexed by their id
+        self.symbols = tuple(symbols)
+
+        # Lookup dicts from states/symbols to their ids (symbols may be looked up through their classes instead)
+        self.state_index = dict((state, index) for (index, state) in enumerate(self.states) if state is not None)
+        self.symbol_index = symbol_index if symbol_index is not None else \
+            dict((symbol, index) for (index, symbol) in enumerate(self.symbols))
+
+        # Id of the initial state and of the dead state (sentinel)
+        self.initial = 0
+        self.dead = len(self.states) - 1
+
+        # Number of columns in the table (size of the alphabet)
+        self.width = len(self.symbols)
+
+        # Flat row-major table of destination state ids, and the on_transition callbacks in the same layout
+        self.next_states = next_states
+        self.callbacks = callbacks
+
+        # Final flags indexed by state id
+        self.final = bytearray(1 if state is not None and state.final else 0 for state in self.states)
+
+        # Callback-free (and picklable) part of the table, sharing its arrays
+        self.recognizer = Recognizer(self.symbol_index, self.next_states, self.final, self.initial, self.dead)
+
+    def __len__(self):
+        """
+        :return: Number of states in the table, including the dead state sentinel.
+        :rtype: int
+        """
+        return len(self.states)
+
+    def next_state(self, state, symbol):
+        """
+        Looks up the id of the destination state.
+        :param state: Id of the source state
+        :type state: int
+        :param symbol: Id of the symbol
+        :type symbol: int
+        :return: Id of the destination state
+        :rtype: int
+        """
+        return self.next_states[state * self.width + symbol]
+
+    def match(self, sequence, state=None):
+        """
+        Follows the given sequence without performing any callbacks and checks whether it ends in a final state.
+        Stops early once the dead state is reached. Any iterable works, including bytes, memoryview and array,
+        which are iterated over without copying.
+        Throws an exception if a symbol is not in the alphabet.
+        :param sequence: Symbols to follow
+        :type sequence: iterable
+        :param state: State to start in, initial state if undefined
+        :type state: (State|None)
+        :return: Accept/reject, end state and number of consumed symbols
+        :rtype: MatchResult
+        """
+        start = self.initial if state is None else self.state_index[state]
+        (current, position) = self.recognizer.follow(sequence, start)
+        return MatchResult(bool(self.final[current]), self.states[current], position)
+
+
+class Recognizer(object):
+
+    def __init__(self, symbol_index, next_states, final, initial, dead):
+        """
+        Initializes a new recognizer. Recognizer is the callback-free part of a transition table:
+        it only knows state ids, so it can be pickled and shipped to other processes.
+
+        :param symbol_index: Lookup from symbols to their ids
+        :type symbol_index: (dict|SymbolClasses)
+        :param next_states: Flat row-major table of destination state ids (see TransitionTable)
+        :type next_states: array
+        :param final: Final flags indexed by state id
+        :type final: bytearray
+        :param initial: Id of the initial state
+        :type initial: int
+        :param dead: Id of the dead state (sentinel)
+        :type dead: int
+        """
+        self.symbol_index = symbol_index
+        self.next_states = next_states
+        self.final = final
+        self.initial = initial
+        self.dead = dead
+        self.width = len(symbol_index)
+
+    def __getstate__(self):
+        # Tables loaded from a file or shared memory are backed by a memoryview, which cannot be pickled
+        state = self.__dict__.copy()
+        if not isinstance(self.next_states, array):
+            state['next_states'] = array('i', self.next_states)
+        return state
+
+    def follow(self, sequence, state=None):
+        """
+        Follows the given sequence, stopping early once the dead state is reached.
+        Throws an exception if a symbol is not in the alphabet.
+        :param sequence: Symbols to follow
+        :type sequence: iterable
+        :param state: Id of the state to start in, initial state if undefined
+        :type state: (int|None)
+        :return: Id of the end state and number of consumed symbols
+        :rtype: tuple
+        """
+        symbol_index = self.symbol_index
+        next_states = self.next_states
+        width = self.width
+        dead = self.dead
+        current = self.initial if state is None else state
+        position = 0
+        if current != dead:
+            for (position, symbol) in enumerate(sequence, 1):
+                column = symbol_index.get(symbol)
+                if column is None:
+                    raise UnknownSymbol(symbol)
+                current = next_states[current * width + column]
+                if current == dead:
+                    break
+        return (current, position)
+
+    def transfer(self, sequence):
+        """
+        Computes where the given sequence leads from every state at once (the transition function of the sequence).
+        Runs in O(n * len(sequence)) in the worst case, but states that converge are only followed once.
+        Throws an exception if a symbol is not in the alphabet.
+        :param sequence: Symbols to follow
+        :type sequence: iterable
+        :return: List of end state ids, indexed by the id of the start state (including the dead state)
+        :rtype: list
+        """
+        symbol_index = self.symbol_index
+        next_states = self.next_states
+        width = self.width
+        # Distinct states being followed, and the position in that list of each start state
+        active = list(range(len(self.final)))
+        origin = list(range(len(self.final)))
+        for symbol in sequence:
+            column = symbol_index.get(symbol)
+            if column is None:
+                raise UnknownSymbol(symbol)
+            active = [next_states[state * width + column] for state in active]
+            if len(active) > 1 and len(set(active)) < len(active):
+                # Some of the states converged, follow them as one from now on
+                positions = dict()
+                for state in active:
+                    positions.setdefault(state, len(positions))
+                origin = [positions[active[position]] for position in origin]
+                active = sorted(positions, key=positions.get)
+        return [active[position] for position in origin]
+
+    def accepts(self, sequence):
+        """
+        :param sequence: Symbols to follow
+        :type sequence: iterable
+        :return: True if the given sequence, followed from the initial state, ends in a final state.
+        :rtype: bool
+        """
+        return bool(self.final[self.follow(sequence)[0]])
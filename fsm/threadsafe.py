@@ -0,0 +1,162 @@
+# encoding: utf-8
+
+from threading import Lock, RLock
+
+from fsm import FSM
+
+
+class ThreadSafeFSM(FSM):
+
+    def __init__(self):
+        """
+        FSM variant that can be shared between threads.
+        Steps of an instance are serialized with a per-instance step lock, so the current state is never torn.
+        Structural edits are serialized with a separate edit lock and never modify the transition map in place:
+        they build a modified copy and swap it in, so stepping threads always see a complete map and do not wait
+        for edits, except for those which depend on the current state: remove_states() and compile() also hold
+        the step lock. Steps on a compiled FSM read its (immutable) transition table without any extra locking.
+
+        Copying costs time proportional to the number of states per edit, so building a large FSM one transition
+        at a time would take quadratic time. Until the FSM is validated or stepped for the first time, nothing
+        can be stepping yet and edits modify the map in place: build the FSM before sharing it with other threads.
+        Later edits copy the map; batch edits (add_transitions(), remove_states()...) copy it only once.
+        """
+        # We are forcing ThreadSafeFSM to be "abstract", each instance must be an instance of its subclass
+        assert type(self) is not ThreadSafeFSM, 'ThreadSafeFSM must be inherited from'
+        super(ThreadSafeFSM, self).__init__()
+
+        # Lock serializing steps of this instance
+        self._step_lock = Lock()
+
+        # Lock serializing structural edits (and validation) of this instance
+        self._edit_lock = RLock()
+
+        # Indicates whether the map may be read by stepping threads (set by the first validation or step)
+        self._published = False
+
+    @FSM.initial_state.setter
+    def initial_state(self, value):
+        """
+        Sets the initial state of the FSM.
+        :param value: Initial state
+        :type value: State
+        """
+        with self._edit_lock:
+            FSM.initial_state.fset(self, value)
+
+    @FSM.dead_state.setter
+    def dead_state(self, value):
+        """
+        Sets the dead state of the FSM.
+        :param value: Dead state
+        :type value: State
+        """
+        with self._edit_lock:
+            FSM.dead_state.fset(self, value)
+
+    @FSM.require_final.setter
+    def require_final(self, value):
+        """
+        Sets whether the FSM must have a final state to be validated.
+        :param value: Whether a final state is required
+        :type value: bool
+        """
+        with self._edit_lock:
+            FSM.require_final.fset(self, value)
+
+    def step(self, symbol):
+        """
+        Follows a transition corresponding to the given symbol and the current state, into the destination state.
+        Throws an exception if the symbol is not in the alphabet.
+        :param symbol: Symbol to follow
+        :param symbol: object
+        """
+        with self._step_lock:
+            self._published = True
+            super(ThreadSafeFSM, self).step(symbol)
+
+    def run(self, symbols, stop_on_dead=False):
+        """
+        Follows transitions for all of the given symbols (see FSM.run()), holding the step lock for the whole batch.
+        """
+        with self._step_lock:
+            self._published = True
+            return super(ThreadSafeFSM, self).run(symbols, stop_on_dead)
+
+    def add_state(self, state):
+        """
+        See FSM.add_state(), serialized with other edits.
+        """
+        with self._edit_lock:
+            super(ThreadSafeFSM, self).add_state(state)
+
+    def add_states(self, states):
+        """
+        See FSM.add_states(), serialized with other edits.
+        """
+        with self._edit_lock:
+            super(ThreadSafeFSM, self).add_states(states)
+
+    def add_transition(self, transition):
+        """
+        See FSM.add_transition(), serialized with other edits.
+        """
+        with self._edit_lock:
+            super(ThreadSafeFSM, self).add_transition(transition)
+
+    def add_transitions(self, transitions):
+        """
+        See FSM.add_transitions(), serialized with other edits.
+        """
+        with self._edit_lock:
+            super(ThreadSafeFSM, self).add_transitions(transitions)
+
+    def remove_states(self, states):
+        """
+        See FSM.remove_states(), serialized with other edits, and with steps: otherwise a concurrent step could move
+        into a state after it was checked not to be the current state.
+        """
+        with self._edit_lock:
+            with self._step_lock:
+                super(ThreadSafeFSM, self).remove_states(states)
+
+    def remove_transitions(self, transitions):
+        """
+        See FSM.remove_transitions(), serialized with other edits.
+        """
+        with self._edit_lock:
+            super(ThreadSafeFSM, self).remove_transitions(transitions)
+
+    def validate(self):
+        """
+        See FSM.validate(), serialized with edits.
+        """
+        with self._edit_lock:
+            self._published = True
+            super(ThreadSafeFSM, self).validate()
+
+    def compile(self):
+        """
+        See FSM.compile(), serialized with edits and with steps (the current state is translated into the table).
+        """
+        with self._edit_lock:
+            with self._step_lock:
+                return super(ThreadSafeFSM, self).compile()
+
+    def _edit_map(self, symbols):
+        """
+        Helper function. Copy-on-write version of FSM._edit_map(): returns a copy of the map in which
+        the inner dicts of the given symbols are copied as well, leaving the published map untouched.
+        The map is modified in place until it is published (see the constructor).
+        :param symbols: Symbols whose inner dicts are going to be modified
+        :type symbols: iterable
+        :return: Transition map
+        :rtype: dict
+        """
+        if not self._published:
+            return self._map
+        fsm_map = dict(self._map)
+        for symbol in symbols:
+            if symbol in fsm_map:
+                fsm_map[symbol] = dict(fsm_map[symbol])
+        return fsm_map
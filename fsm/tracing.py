@@ -0,0 +1,116 @@
+# encoding: utf-8
+
+from collections import namedtuple
+
+from state import DeadState
+
+
+# Single recorded step: followed symbol, source and destination state (or their ids, see TransitionTrace.dump()),
+# whether it was a loop and whether it led into the dead state
+TraceEntry = namedtuple('TraceEntry', ['symbol', 'src_state', 'dst_state', 'loop', 'dead'])
+
+# Flags of a recorded step
+_LOOP = 1
+_DEAD = 2
+
+
+class TransitionTrace(object):
+
+    __slots__ = ('_capacity', '_symbols', '_src_states', '_dst_states', '_flags', '_position', '_count')
+
+    def __init__(self, capacity):
+        """
+        Initializes a new transition trace of an FSM (see FSM.enable_trace()): a ring buffer of the last steps.
+        All slots are preallocated, recording a step only overwrites the oldest one (the buffer holds references
+        to symbols and states, flags are packed in a bytearray).
+
+        :param capacity: Number of recorded steps
+        :type capacity: int
+        """
+        assert capacity > 0, 'Capacity must be positive'
+        self._capacity = capacity
+        self._symbols = [None] * capacity
+        self._src_states = [None] * capacity
+        self._dst_states = [None] * capacity
+        self._flags = bytearray(capacity)
+        # Slot of the next step, and total number of recorded steps
+        self._position = 0
+        self._count = 0
+
+    @property
+    def capacity(self):
+        """
+        :return: Number of steps the trace can hold
+        :rtype: int
+        """
+        return self._capacity
+
+    @property
+    def count(self):
+        """
+        :return: Total number of steps recorded since the trace was started (or cleared)
+        :rtype: int
+        """
+        return self._count
+
+    def __len__(self):
+        """
+        :return: Number of steps currently held in the trace
+        :rtype: int
+        """
+        return min(self._count, self._capacity)
+
+    def record(self, symbol, src_state, dst_state, loop):
+        """
+        Records a single step, overwriting the oldest one if the trace is full. Called by the FSM after each step.
+        :param symbol: Followed symbol
+        :type symbol: object
+        :param src_state: Source state
+        :type src_state: State
+        :param dst_state: Destination state
+        :type dst_state: State
+        :param loop: Indicates whether the step was a loop
+        :type loop: bool
+        """
+        position = self._position
+        self._symbols[position] = symbol
+        self._src_states[position] = src_state
+        self._dst_states[position] = dst_state
+        if loop:
+            self._flags[position] = _LOOP
+        else:
+            self._flags[position] = _DEAD if isinstance(dst_state, DeadState) else 0
+        position += 1
+        self._position = position if position < self._capacity else 0
+        self._count += 1
+
+    def entries(self):
+        """
+        :return: Steps held in the trace, oldest first
+        :rtype: list
+        """
+        if self._count < self._capacity:
+            slots = range(self._count)
+        else:
+            slots = list(range(self._position, self._capacity)) + list(range(self._position))
+        return [TraceEntry(self._symbols[slot], self._src_states[slot], self._dst_states[slot],
+                           bool(self._flags[slot] & _LOOP), bool(self._flags[slot] & _DEAD)) for slot in slots]
+
+    def dump(self):
+        """
+        Same as entries(), with states replaced by their ids (e.g. to be logged as JSON).
+        The dumped steps can be replayed as well (see FSM.replay()).
+        :rtype: list
+        """
+        return [entry._replace(src_state=entry.src_state.id, dst_state=entry.dst_state.id)
+                for entry in self.entries()]
+
+    def clear(self):
+        """
+        Drops all recorded steps.
+        """
+        for slots in (self._symbols, self._src_states, self._dst_states):
+            slots[:] = [None] * self._capacity
+        self._flags[:] = bytearray(self._capacity)
+        self._position = 0
+        self._count = 0
@@ -5,6 +5,10 @@ from state import State, DeadState
 
 class Transition(object):
 
+    # Transitions are held in large numbers, so they do not carry a per-instance __dict__.
+    # Hash is computed once and cached, as transitions are hashed on every set operation.
+    __slots__ = ('_symbol', '_src_state', '_dst_state', '_on_transition', '_hash')
+
     def __init__(self, symbol, src_state, dst_state, on_transition=None):
         """
         Transition diagram:
@@ -31,6 +35,7 @@ class Transition(object):
         self._src_state = None
         self._dst_state = None
         self._on_transition = None
+        self._hash = None
 
         # Set properties
         self.symbol = symbol
@@ -83,6 +88,7 @@ class Transition(object):
         """
         assert value is not None, 'Symbol cannot be None'
         self._symbol = value
+        self._hash = None
 
     @src_state.setter
     def src_state(self, value):
@@ -94,6 +100,7 @@ class Transition(object):
         assert isinstance(value, State), 'Source must be a valid state'
         assert not isinstance(value, DeadState), 'Dead state cannot be part of a transition'
         self._src_state = value
+        self._hash = None
 
     @dst_state.setter
     def dst_state(self, value):
@@ -105,6 +112,7 @@ class Transition(object):
         assert isinstance(value, State), 'Destination must be a valid state'
         assert not isinstance(value, DeadState), 'Dead state cannot be part of a transition'
         self._dst_state = value
+        self._hash = None
 
     @on_transition.setter
     def on_transition(self, value):
@@ -119,9 +127,9 @@ class Transition(object):
     # The below operators are overridden to support dictionary operations
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.symbol == other.symbol and \
-                   self.src_state == other.src_state and \
-                   self.dst_state == other.dst_state
+            return self._symbol == other._symbol and \
+                   self._src_state == other._src_state and \
+                   self._dst_state == other._dst_state
         else:
             return False
 
@@ -129,4 +137,7 @@ class Transition(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash('{}_{}_{}'.format(self.symbol, self.src_state.id, self.dst_state.id))
+        # Computed lazily, as any of the fields may be reassigned through their setters
+        if self._hash is None:
+            self._hash = hash((self._symbol, self._src_state.id, self._dst_state.id))
+        return self._hash
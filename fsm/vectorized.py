@@ -0,0 +1,111 @@
+# encoding: utf-8
+
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Outcome of VectorizedStepper.step(): next state ids, and masks of the instances that changed state,
+# looped in their state (including looping in the dead state), or entered the dead state during this step
+VectorStep = namedtuple('VectorStep', ['states', 'changed', 'looped', 'entered_dead'])
+
+
+class VectorizedStepper(object):
+
+    def __init__(self, table):
+        """
+        Initializes a new vectorized stepper. It advances many independent instances of the same FSM at once,
+        each instance being represented only by the id of its current state (see TransitionTable).
+        Requires numpy.
+
+        :param table: Transition table of a compiled FSM (see FSM.compile())
+        :type table: TransitionTable
+        """
+        if numpy is None:
+            raise ImportError('numpy is required for vectorized stepping')
+        self._table = table
+        # 2D view of the flat transition table (no copy), indexed by [state id, symbol id]
+        self._matrix = numpy.frombuffer(table.next_states, dtype=numpy.intc).reshape(len(table), table.width)
+        # Final flags indexed by state id
+        self._final = numpy.frombuffer(bytes(table.final), dtype=numpy.uint8).astype(bool)
+
+    @property
+    def table(self):
+        """
+        Gets the transition table of the stepper.
+        :return: Transition table
+        :rtype: TransitionTable
+        """
+        return self._table
+
+    def initial_states(self, count):
+        """
+        :param count: Number of instances
+        :type count: int
+        :return: Array of state ids of the given number of instances in the initial state
+        :rtype: numpy.ndarray
+        """
+        return numpy.full(count, self._table.initial, dtype=numpy.intc)
+
+    def state_ids(self, states):
+        """
+        Converts states into an array of state ids.
+        :param states: States
+        :type states: iterable
+        :rtype: numpy.ndarray
+        """
+        state_index = self._table.state_index
+        return numpy.fromiter((state_index[state] for state in states), dtype=numpy.intc)
+
+    def symbol_ids(self, symbols):
+        """
+        Converts symbols into an array of symbol ids.
+        Throws an exception if a symbol is not in the alphabet.
+        :param symbols: Symbols
+        :type symbols: iterable
+        :rtype: numpy.ndarray
+        """
+        symbol_index = self._table.symbol_index
+        try:
+            return numpy.fromiter((symbol_index[symbol] for symbol in symbols), dtype=numpy.intc)
+        except KeyError as e:
+            raise AssertionError('Unknown symbol: {}'.format(e.args[0]))
+
+    def is_final(self, states):
+        """
+        :param states: Array of state ids
+        :type states: numpy.ndarray
+        :return: Mask of the instances that are in a final state
+        :rtype: numpy.ndarray
+        """
+        return self._final[states]
+
+    def is_dead(self, states):
+        """
+        :param states: Array of state ids
+        :type states: numpy.ndarray
+        :return: Mask of the instances that are in the dead state
+        :rtype: numpy.ndarray
+        """
+        return numpy.asarray(states) == self._table.dead
+
+    def step(self, states, symbols):
+        """
+        Advances every instance by one symbol with a single gather over the transition table.
+        No callbacks are performed; the returned masks allow dispatching them in bulk afterwards.
+        :param states: Array of current state ids, one per instance
+        :type states: numpy.ndarray
+        :param symbols: Array of symbol ids (see symbol_ids()), one per instance
+        :type symbols: numpy.ndarray
+        :return: Next state ids and masks of changed/looped/dead-entering instances
+        :rtype: VectorStep
+        """
+        states = numpy.asarray(states)
+        symbols = numpy.asarray(symbols)
+        assert states.shape == symbols.shape, 'States and symbols must have the same shape'
+        next_states = self._matrix[states, symbols]
+        changed = next_states != states
+        return VectorStep(next_states, changed, ~changed, changed & (next_states == self._table.dead))
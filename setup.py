@@ -9,5 +9,8 @@ setup(name='cielo24-fsm',
       author='cielo24',
       author_email='support@cielo24.com',
       url='http://www.cielo24.com',
-      packages=['fsm']
+      packages=['fsm'],
+      extras_require={
+          'vectorized': ['numpy']
+      }
       )
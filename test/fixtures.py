@@ -0,0 +1,102 @@
+# encoding: utf-8
+
+from fsm import FSM
+from threadsafe import ThreadSafeFSM
+from state import State, DeadState
+from transition import Transition
+
+
+class MyFSM(FSM):
+    pass
+
+
+class MyThreadSafeFSM(ThreadSafeFSM):
+    pass
+
+
+# Transitions of the FSM of test_fsm_diagram.png as (symbol, source state, destination state)
+DIAGRAM_TRANSITIONS = [('a', 'q0', 'q2'), ('b', 'q0', 'q1'), ('c', 'q0', 'q0'),
+                       ('a', 'q1', 'q1'), ('b', 'q1', 'q3'),
+                       ('b', 'q2', 'q3'), ('c', 'q2', 'q3'),
+                       ('a', 'q3', 'q2'), ('c', 'q3', 'q1')]
+
+
+def create_diagram(test, callback=None, q0_b=None, **states):
+    """
+    Creates the states and transitions of the FSM of test_fsm_diagram.png, without adding them to any FSM.
+    They are stored in the given test case: states as q0, q1, q2, q3 and ds (the dead state), transitions
+    by their source state and symbol (e.g. q0_a).
+    :param test: Test case
+    :type test: TestCase
+    :param callback: Function giving the callback of the given name (e.g. 'q0_on_exit', 'q0_b' or 'dead_on_enter'),
+                     every default state and transition gets its callbacks from it if defined
+    :type callback: (callable|None)
+    :param q0_b: on_transition callback of the 'b' transition from q0
+    :type q0_b: (callable|None)
+    :param states: States replacing the default ones by name (e.g. to give them callbacks)
+    :type states: dict
+    """
+    def callbacks(name, kinds=('on_enter', 'on_exit', 'on_loop_enter', 'on_loop_exit')):
+        if callback is None:
+            return dict()
+        return dict((kind, callback('{}_{}'.format(name, kind))) for kind in kinds)
+
+    for (name, final) in [('q0', False), ('q1', True), ('q2', False), ('q3', True)]:
+        setattr(test, name, states[name] if name in states else State(name, final=final, **callbacks(name)))
+    test.ds = states['ds'] if 'ds' in states else \
+        DeadState('ds', **callbacks('dead', ('on_enter', 'on_loop_enter', 'on_loop_exit')))
+    for (symbol, src, dst) in DIAGRAM_TRANSITIONS:
+        name = '{}_{}'.format(src, symbol)
+        on_transition = q0_b if name == 'q0_b' and q0_b is not None else \
+            callback(name) if callback is not None else None
+        setattr(test, name, Transition(symbol, getattr(test, src), getattr(test, dst), on_transition=on_transition))
+
+
+def add_diagram(test, fsm, transitions=True, initial=True, dead=True):
+    """
+    Adds the states created by create_diagram() to the given FSM, with the transitions, initial state
+    and dead state unless told otherwise, and validates it if nothing was left out.
+    :param test: Test case
+    :type test: TestCase
+    :param fsm: Empty FSM to populate
+    :type fsm: FSM
+    :param transitions: Indicates whether to add the transitions
+    :type transitions: bool
+    :param initial: Indicates whether to set the initial state
+    :type initial: bool
+    :param dead: Indicates whether to set the dead state
+    :type dead: bool
+    :return: Populated FSM
+    :rtype: FSM
+    """
+    for state in [test.q0, test.q1, test.q2, test.q3]:
+        fsm.add_state(state)
+    if initial:
+        fsm.initial_state = test.q0
+    if dead:
+        fsm.dead_state = test.ds
+    if transitions:
+        for (symbol, src, _) in DIAGRAM_TRANSITIONS:
+            fsm.add_transition(getattr(test, '{}_{}'.format(src, symbol)))
+    if transitions and initial and dead:
+        fsm.validate()
+    return fsm
+
+
+def populate_diagram_fsm(test, fsm, q0_b=None, **states):
+    """
+    Populates the given FSM with the FSM of test_fsm_diagram.png and validates it.
+    Its states and transitions are stored in the given test case (see create_diagram()).
+    :param test: Test case
+    :type test: TestCase
+    :param fsm: Empty FSM to populate
+    :type fsm: FSM
+    :param q0_b: on_transition callback of the 'b' transition from q0
+    :type q0_b: (callable|None)
+    :param states: States replacing the default ones by name (e.g. to give them callbacks)
+    :type states: dict
+    :return: Populated FSM
+    :rtype: FSM
+    """
+    create_diagram(test, q0_b=q0_b, **states)
+    return add_diagram(test, fsm)
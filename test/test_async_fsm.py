@@ -0,0 +1,102 @@
+# encoding: utf-8
+
+import asyncio
+from unittest import TestCase
+from fsm import RunResult
+from state import State, DeadState
+from transition import Transition
+from async_fsm import AsyncFSM
+from fsm_exceptions import *
+
+
+class MyAsyncFSM(AsyncFSM):
+    pass
+
+
+class TestAsyncFSM(TestCase):
+
+    def setUp(self):
+        self.fsm = MyAsyncFSM()
+        self.step_stack = []
+
+        # q0 -b-> q1 (final), q1 -a-> q1, everything else leads into the dead state
+        self.q0 = State('q0', on_exit=self._callback('q0_on_exit'))
+        self.q1 = State('q1', final=True,
+                        on_enter=self._slow_callback('q1_on_enter'),
+                        on_loop_exit=self._callback('q1_on_loop_exit'),
+                        on_loop_enter=self._slow_callback('q1_on_loop_enter'))
+        self.ds = DeadState('ds', on_enter=self._slow_callback('dead_on_enter'))
+        self.fsm.add_state(self.q0)
+        self.fsm.add_state(self.q1)
+        self.fsm.initial_state = self.q0
+        self.fsm.dead_state = self.ds
+        self.fsm.add_transition(Transition('b', self.q0, self.q1, on_transition=self._slow_callback('q0_b')))
+        self.fsm.add_transition(Transition('a', self.q1, self.q1, on_transition=self._callback('q1_a')))
+        self.fsm.validate()
+
+    def _callback(self, value):
+        # Plain (synchronous) callback
+        return lambda: self.step_stack.append(value)
+
+    def _slow_callback(self, value):
+        # Coroutine callback, which yields control to the event loop before recording itself
+        async def callback():
+            await asyncio.sleep(0.01)
+            self.step_stack.append(value)
+        return callback
+
+    def test_inherit_only(self):
+        with self.assertRaises(AssertionError):
+            AsyncFSM()
+
+    def test_step(self):
+        asyncio.run(self.fsm.step('b'))
+        self.assertEqual(self.q1, self.fsm.current_state)
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter'], self.step_stack)
+
+    def test_step_concurrent(self):
+        asyncio.run(self.fsm.step('b', concurrent=True))
+        self.assertEqual(self.q1, self.fsm.current_state)
+        self.assertListEqual(['q0_on_exit'], self.step_stack[:1])
+        self.assertSetEqual({'q0_b', 'q1_on_enter'}, set(self.step_stack[1:]))
+
+    def test_step_serialized(self):
+        async def main():
+            await asyncio.gather(self.fsm.step('b'), self.fsm.step('a'))
+        asyncio.run(main())
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter',
+                              'q1_on_loop_exit', 'q1_a', 'q1_on_loop_enter'], self.step_stack)
+
+    def test_step_compiled(self):
+        self.fsm.compile()
+        asyncio.run(self.fsm.step('b'))
+        asyncio.run(self.fsm.step('b'))
+        self.assertTrue(self.fsm.is_in_dead_state())
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter', 'dead_on_enter'], self.step_stack)
+
+    def test_run(self):
+        async def symbols():
+            for symbol in 'babb':
+                yield symbol
+        result = asyncio.run(self.fsm.run(symbols(), stop_on_dead=True))
+        self.assertEqual(RunResult(self.ds, 3, 2), result)
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter',
+                              'q1_on_loop_exit', 'q1_a', 'q1_on_loop_enter',
+                              'dead_on_enter'], self.step_stack)
+
+    def test_run_unknown_symbol(self):
+        with self.assertRaises(UnknownSymbol):
+            asyncio.run(self.fsm.run(['b', 'unknown_symbol']))
+        self.assertEqual(self.q1, self.fsm.current_state)
+
+    def test_profiling(self):
+        profiler = self.fsm.enable_profiling()
+        asyncio.run(self.fsm.step('b'))
+        asyncio.run(self.fsm.step('a', concurrent=True))
+        report = profiler.report()
+        self.assertSetEqual({('q0', 'on_exit', 'b'), ('q0', 'on_transition', 'b'), ('q1', 'on_enter', 'b'),
+                             ('q1', 'on_loop_exit', 'a'), ('q1', 'on_transition', 'a'), ('q1', 'on_loop_enter', 'a')},
+                            set(report))
+        self.assertTrue(all(summary.count == 1 for summary in report.values()))
+        # Awaited callbacks are timed until they are done
+        self.assertGreaterEqual(report[('q1', 'on_enter', 'b')].max, 0.01)
@@ -0,0 +1,81 @@
+# encoding: utf-8
+
+from unittest import TestCase
+from builder import build, rows_from_dict, rows_from_csv
+from fsm import RunResult
+from state import State, DeadState
+from transition import Transition
+from fixtures import MyFSM, MyThreadSafeFSM
+from fsm_exceptions import *
+
+
+# Parity of the number of 1s: q0 is even, q1 is odd
+PARITY = {
+    '0': {'q0': 'q0', 'q1': 'q1'},
+    '1': {'q0': 'q1', 'q1': 'q0'}
+}
+
+
+class TestBuilder(TestCase):
+
+    def test_build(self):
+        fsm = build(MyFSM(), [('0', 'q0', 'q0'), ('0', 'q1', 'q1'), ('1', 'q0', 'q1'), ('1', 'q1', 'q0')],
+                    'q0', final=['q1'])
+        self.assertEqual(set(['0', '1']), fsm._alphabet)
+        self.assertEqual(4, len(fsm._transitions))
+        self.assertFalse(fsm.initial_state.final)
+        self.assertEqual('q1', fsm.run('0110100').state.id)
+        self.assertTrue(fsm.current_state.final)
+
+    def test_build_dict(self):
+        on_enter = []
+        q1 = State('q1', final=True, on_enter=lambda: on_enter.append('q1'))
+        fsm = build(MyThreadSafeFSM(), rows_from_dict(PARITY), 'q0', states=[q1])
+        self.assertIs(q1, fsm.run('0111').state)
+        self.assertEqual(['q1', 'q1'], on_enter)
+
+    def test_build_csv(self):
+        lines = ['symbol,src,dst', '0,0,0', '1,0,1', '', '0,1,1', '1,1,2']
+        fsm = build(MyFSM(), rows_from_csv(lines, symbol_type=int, state_type=int, header=True), 0, final=[2],
+                    dead_state=DeadState('dead'))
+        self.assertEqual(RunResult(fsm.dead_state, 4, 3), fsm.run([1, 0, 1, 1]))
+        self.assertEqual(set([0, 1]), fsm._alphabet)
+        with self.assertRaises(ValueError):
+            list(rows_from_csv(['0,1']))
+
+    def test_build_errors(self):
+        # Table is checked as a whole before anything is added
+        fsm = MyFSM()
+        with self.assertRaises(StateCannotHaveSameSymbolTransitions):
+            build(fsm, [('0', 'q0', 'q1'), ('1', 'q0', 'q1'), ('0', 'q0', 'q0')], 'q0')
+        self.assertEqual(0, len(fsm._transitions))
+        with self.assertRaises(DuplicateTransition):
+            build(MyFSM(), [('0', 'q0', 'q1'), ('0', 'q0', 'q1')], 'q0')
+        with self.assertRaises(MissingTransitions):
+            build(MyFSM(), [('0', 'q0', 'q1'), ('1', 'q0', 'q1'), ('0', 'q1', 'q1')], 'q0', final=['q1'])
+        fsm = build(MyFSM(), [('0', 'q0', 'q1')], 'q0', validate=False)
+        with self.assertRaises(ValidationRequired):
+            fsm.step('0')
+
+    def test_add_in_bulk(self):
+        fsm = MyFSM()
+        (q0, q1, q2) = (State('q0'), State('q1', final=True), State('q2'))
+        with self.assertRaises(DuplicateState):
+            fsm.add_states([q0, q1, State('q0')])
+        self.assertEqual(0, len(fsm._states))
+        fsm.add_states([q0, q1])
+        fsm.initial_state = q0
+        fsm.dead_state = DeadState('dead')
+        fsm.add_transitions([Transition('a', q0, q1)])
+        fsm.validate()
+        with self.assertRaises(TransitionContainsUnknownState):
+            fsm.add_transitions([Transition('a', q1, q1), Transition('a', q1, q2)])
+        with self.assertRaises(StateCannotHaveSameSymbolTransitions):
+            fsm.add_transitions([Transition('b', q1, q1), Transition('a', q0, q0)])
+        self.assertEqual(set(['a']), fsm._alphabet)
+
+        # States added later become reachable through transitions of the same batch
+        fsm.add_state(q2)
+        fsm.add_transitions([Transition('b', q2, q0), Transition('b', q1, q2)])
+        fsm.validate()
+        self.assertEqual(RunResult(q1, 4, None), fsm.run('abba'))
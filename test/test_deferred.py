@@ -0,0 +1,141 @@
+# encoding: utf-8
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, current_thread
+from unittest import TestCase
+from deferred import DeferredFSM
+from fsm import RunResult
+from state import State, DeadState
+from fixtures import populate_diagram_fsm
+from fsm_exceptions import *
+
+
+class MyDeferredFSM(DeferredFSM):
+    pass
+
+
+class TestDeferredFSM(TestCase):
+
+    def setUp(self):
+        self.steps = []
+        self.threads = set()
+        self.fsm = self._create_fsm()
+
+    def tearDown(self):
+        self.fsm.join()
+
+    def _callback(self, name):
+        def fn():
+            self.threads.add(current_thread())
+            self.steps.append(name)
+        return fn
+
+    def _create_fsm(self, executor=None, prefix=''):
+        # FSM (see test_fsm_diagram.png), callbacks of q0, q1 and the dead state only
+        callback = lambda name: self._callback(prefix + name)
+        q1 = State('q1', final=True, on_enter=callback('q1_on_enter'), on_exit=callback('q1_on_exit'),
+                   on_loop_enter=callback('q1_on_loop_enter'))
+        return populate_diagram_fsm(self, MyDeferredFSM(executor), q0_b=callback('q0_b'), q1=q1,
+                                    q0=State('q0', on_exit=callback('q0_on_exit')),
+                                    ds=DeadState('ds', on_enter=callback('dead_on_enter')))
+
+    def test_abstract(self):
+        with self.assertRaises(AssertionError):
+            DeferredFSM()
+
+    def test_step_is_immediate(self):
+        started = Event()
+        release = Event()
+
+        def blocking():
+            started.set()
+            release.wait(5)
+            self.steps.append('q0_on_exit')
+
+        self.q0.on_exit = blocking
+        self.fsm.step('b')
+        self.assertTrue(started.wait(5))
+        # Current state is updated while callbacks are still being performed
+        self.assertEqual(self.q1, self.fsm.current_state)
+        self.fsm.step('a')
+        self.assertFalse(self.fsm.flush(timeout=0.01))
+        self.assertListEqual([], self.steps)
+        release.set()
+        self.assertTrue(self.fsm.flush())
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter', 'q1_on_loop_enter'], self.steps)
+        self.assertNotIn(current_thread(), self.threads)
+
+    def test_run(self):
+        result = self.fsm.run('bcc', stop_on_dead=True)
+        self.assertEqual(RunResult(self.ds, 2, 1), result)
+        self.fsm.flush()
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter', 'q1_on_exit', 'dead_on_enter'], self.steps)
+        with self.assertRaises(UnknownSymbol):
+            self.fsm.run(['a', 'unknown_symbol'])
+
+    def test_profiling(self):
+        profiler = self.fsm.enable_profiling()
+        self.fsm.run('bab')
+        self.fsm.flush()
+        report = profiler.report()
+        self.assertSetEqual({('q0', 'on_exit', 'b'), ('q0', 'on_transition', 'b'), ('q1', 'on_enter', 'b'),
+                             ('q1', 'on_loop_enter', 'a'), ('q1', 'on_exit', 'b')}, set(report))
+        self.assertTrue(all(summary.count == 1 for summary in report.values()))
+
+    def test_run_unknown_symbol_keeps_callbacks(self):
+        with self.assertRaises(UnknownSymbol):
+            self.fsm.run(['b', 'unknown_symbol'])
+        self.fsm.flush()
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter'], self.steps)
+
+    def test_error_propagation(self):
+        def failing():
+            raise ValueError('q1_on_enter')
+
+        self.q1.on_enter = failing
+        self.fsm.run('bab')
+        with self.assertRaises(ValueError):
+            self.fsm.flush()
+        # Callbacks queued after the failed one are discarded, the error is raised once
+        self.assertListEqual(['q0_on_exit', 'q0_b'], self.steps)
+        self.fsm.flush()
+        self.assertEqual(self.q3, self.fsm.current_state)
+
+    def test_error_raised_by_step(self):
+        failed = Event()
+
+        def failing():
+            failed.set()
+            raise ValueError('dead_on_enter')
+
+        self.ds.on_enter = failing
+        self.fsm.run('bc')
+        self.assertTrue(failed.wait(5))
+        # Wait for the drain to finish without consuming the error
+        with self.fsm._condition:
+            self.fsm._condition.wait_for(lambda: not self.fsm._draining, 5)
+        with self.assertRaises(ValueError):
+            self.fsm.step('a')
+        # Step was not taken
+        self.assertEqual(self.ds, self.fsm.current_state)
+        self.fsm.step('a')
+        self.assertTrue(self.fsm.flush())
+
+    def test_shared_executor_ordering(self):
+        executor = ThreadPoolExecutor(max_workers=4)
+        try:
+            fsms = [self._create_fsm(executor, prefix='{}:'.format(i)) for i in range(8)]
+            for _ in range(50):
+                for fsm in fsms:
+                    fsm.run('bb')
+                    fsm.run('c')
+                    fsm.run('c')
+            for fsm in fsms:
+                fsm.join()
+        finally:
+            executor.shutdown()
+        for i in range(8):
+            prefix = '{}:'.format(i)
+            steps = [step[len(prefix):] for step in self.steps if step.startswith(prefix)]
+            self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter', 'q1_on_exit', 'q1_on_enter', 'q1_on_exit',
+                                  'dead_on_enter'], steps)
@@ -1,121 +1,68 @@
 # encoding: utf-8
 
+import sys
 from unittest import TestCase
 from functools import partial
-from fsm import FSM
+from array import array
+from fsm import RunResult, MatchResult
+from stats import Stats
+from profiler import CallbackProfiler, LatencyHistogram
+from tracing import TraceEntry
+from symbols import SymbolSet, OTHERWISE, partition
 from state import State, DeadState
 from transition import Transition
+from fixtures import MyFSM, create_diagram, add_diagram
 from fsm_exceptions import *
 
 
-class MyFSM(FSM):
-    pass
-
-
 class TestFSM(TestCase):
 
     def setUp(self):
-        # FSM (see test_fsm_diagram.png)
+        # FSM (see test_fsm_diagram.png), every state and transition records its callbacks in the step stack
         self.fsm = MyFSM()
-
-        # States
-        self.q0 = State('q0',
-                        final=False,
-                        on_enter=partial(TestFSM._fake_callback, self, 'q0_on_enter'),
-                        on_exit=partial(TestFSM._fake_callback, self, 'q0_on_exit'),
-                        on_loop_enter=partial(TestFSM._fake_callback, self, 'q0_on_loop_enter'),
-                        on_loop_exit=partial(TestFSM._fake_callback, self, 'q0_on_loop_exit')
-                        )
-        self.q1 = State('q1',
-                        final=True,
-                        on_enter=partial(TestFSM._fake_callback, self, 'q1_on_enter'),
-                        on_exit=partial(TestFSM._fake_callback, self, 'q1_on_exit'),
-                        on_loop_enter=partial(TestFSM._fake_callback, self, 'q1_on_loop_enter'),
-                        on_loop_exit=partial(TestFSM._fake_callback, self, 'q1_on_loop_exit')
-                        )
-        self.q2 = State('q2',
-                        final=False,
-                        on_enter=partial(TestFSM._fake_callback, self, 'q2_on_enter'),
-                        on_exit=partial(TestFSM._fake_callback, self, 'q2_on_exit'),
-                        on_loop_enter=partial(TestFSM._fake_callback, self, 'q2_on_loop_enter'),
-                        on_loop_exit=partial(TestFSM._fake_callback, self, 'q2_on_loop_exit')
-                        )
-        self.q3 = State('q3',
-                        final=True,
-                        on_enter=partial(TestFSM._fake_callback, self, 'q3_on_enter'),
-                        on_exit=partial(TestFSM._fake_callback, self, 'q3_on_exit'),
-                        on_loop_enter=partial(TestFSM._fake_callback, self, 'q3_on_loop_enter'),
-                        on_loop_exit=partial(TestFSM._fake_callback, self, 'q3_on_loop_exit')
-                        )
-        self.ds = DeadState('ds',
-                            final=False,
-                            on_enter=partial(TestFSM._fake_callback, self, 'dead_on_enter'),
-                            on_loop_enter=partial(TestFSM._fake_callback, self, 'dead_on_loop_enter'),
-                            on_loop_exit=partial(TestFSM._fake_callback, self, 'dead_on_loop_exit')
-                            )
-
-        # Transitions
-        self.q0_a = Transition('a', self.q0, self.q2, on_transition=partial(TestFSM._fake_callback, self, 'q0_a'))
-        self.q0_b = Transition('b', self.q0, self.q1, on_transition=partial(TestFSM._fake_callback, self, 'q0_b'))
-        self.q0_c = Transition('c', self.q0, self.q0, on_transition=partial(TestFSM._fake_callback, self, 'q0_c'))
-
-        self.q1_a = Transition('a', self.q1, self.q1, on_transition=partial(TestFSM._fake_callback, self, 'q1_a'))
-        self.q1_b = Transition('b', self.q1, self.q3, on_transition=partial(TestFSM._fake_callback, self, 'q1_b'))
-        # self.q1_c = None
-
-        # self.q2_a = None
-        self.q2_b = Transition('b', self.q2, self.q3, on_transition=partial(TestFSM._fake_callback, self, 'q2_b'))
-        self.q2_c = Transition('c', self.q2, self.q3, on_transition=partial(TestFSM._fake_callback, self, 'q2_c'))
-
-        self.q3_a = Transition('a', self.q3, self.q2, on_transition=partial(TestFSM._fake_callback, self, 'q3_a'))
-        # self.q3_b = None
-        self.q3_c = Transition('c', self.q3, self.q1, on_transition=partial(TestFSM._fake_callback, self, 'q3_c'))
+        create_diagram(self, callback=lambda name: partial(TestFSM._fake_callback, self, name))
 
         # Step stack
         self.step_stack = []
 
-    def _populate_fsm(self, states=True, transitions=True, initial=True, dead=True):
-        # States
-        if states:
-            self.fsm.add_state(self.q0)
-            self.fsm.add_state(self.q1)
-            self.fsm.add_state(self.q2)
-            self.fsm.add_state(self.q3)
-
-        # Initial state
-        if initial:
-            self.fsm.initial_state = self.q0
-
-        # Dead state
-        if dead:
-            self.fsm.dead_state = self.ds
-
-        # Transitions
-        if transitions:
-            self.fsm.add_transition(self.q0_a)
-            self.fsm.add_transition(self.q0_b)
-            self.fsm.add_transition(self.q0_c)
-
-            self.fsm.add_transition(self.q1_a)
-            self.fsm.add_transition(self.q1_b)
-            # self.fsm.add_transition(self.q1_c)
-
-            # self.fsm.add_transition(self.q2_a)
-            self.fsm.add_transition(self.q2_b)
-            self.fsm.add_transition(self.q2_c)
-
-            self.fsm.add_transition(self.q3_a)
-            # self.fsm.add_transition(self.q3_b)
-            self.fsm.add_transition(self.q3_c)
-
-        # Validate
-        if states and transitions and initial and dead:
-            self.fsm.validate()
+    def _populate_fsm(self, transitions=True, initial=True, dead=True):
+        add_diagram(self, self.fsm, transitions=transitions, initial=initial, dead=dead)
 
     def _fake_callback(self, value):
         # fake callback function to be used to test callbacks in the FSM
         self.step_stack.append(value)
 
+    """
+    STATE/TRANSITION TESTS
+    """
+
+    def test_state_slots(self):
+        for obj in [self.q0, self.ds, self.q0_a]:
+            self.assertFalse(hasattr(obj, '__dict__'))
+            with self.assertRaises(AttributeError):
+                obj.some_attribute = None
+        # Callbacks remain mutable
+        self.q0.on_enter = None
+        self.assertIsNone(self.q0.on_enter)
+
+    def test_state_hash(self):
+        state = State('q0')
+        self.assertEqual(self.q0, state)
+        self.assertEqual(hash(self.q0), hash(state))
+        state.id = 'q5'
+        self.assertNotEqual(self.q0, state)
+        self.assertEqual(hash('q5'), hash(state))
+
+    def test_transition_hash(self):
+        transition = Transition('a', State('q0'), State('q2'))
+        self.assertEqual(self.q0_a, transition)
+        self.assertEqual(hash(self.q0_a), hash(transition))
+        self.assertIn(transition, {self.q0_a})
+        transition.dst_state = self.q1
+        self.assertNotEqual(self.q0_a, transition)
+        self.assertNotIn(transition, {self.q0_a})
+        self.assertIn(transition, {Transition('a', self.q0, self.q1)})
+
     """
     ADD STATE TESTS
     """
@@ -264,6 +211,36 @@ class TestFSM(TestCase):
         self.assertNotIn('a', self.fsm._map)
         self.assertTrue(self.fsm._dirty)
 
+    # Many state remove
+    def test_remove_states(self):
+        self._populate_fsm()
+        self.fsm.remove_states([self.q1, self.q3])
+        self.assertSetEqual({self.q0, self.q2}, self.fsm._states)
+        self.assertSetEqual({self.q0_a, self.q0_c}, self.fsm._transitions)
+        self.assertSetEqual({'a', 'c'}, self.fsm._alphabet)
+        self.assertNotIn('b', self.fsm._map)
+        self.assertSetEqual({self.q0_a, self.q0_c}, self.fsm._outgoing[self.q0])
+        self.assertSetEqual({self.q0_a}, self.fsm._incoming[self.q2])
+        self.assertNotIn(self.q1, self.fsm._incoming)
+        self.assertTrue(self.fsm._dirty)
+
+    # Many state remove including the current state (nothing gets removed)
+    def test_remove_states_current(self):
+        self._populate_fsm()
+        self.fsm.step('b')  # Transition into q1
+        with self.assertRaises(CannotModifyStateThatIsCurrent):
+            self.fsm.remove_states([self.q3, self.q1])
+        self.assertIn(self.q3, self.fsm._states)
+        self.assertEqual(9, len(self.fsm._transitions))
+
+    # Many state remove with a state given twice
+    def test_remove_states_duplicate(self):
+        self._populate_fsm()
+        self.fsm.remove_states([self.q3, self.q3])
+        self.assertNotIn(self.q3, self.fsm._states)
+        self.assertNotIn(self.q3_a, self.fsm._transitions)
+        self.assertNotIn(self.q3, self.fsm._outgoing)
+
     """
     REMOVE TRANSITION TESTS
     """
@@ -298,6 +275,31 @@ class TestFSM(TestCase):
         self.assertNotIn('b', self.fsm._map)
         self.assertTrue(self.fsm._dirty)
 
+    # Many transition remove
+    def test_remove_transitions(self):
+        self._populate_fsm()
+        self.fsm.remove_transitions([self.q0_b, self.q1_b, self.q2_b, self.q0_a])
+        self.assertEqual(5, len(self.fsm._transitions))
+        self.assertSetEqual({'a', 'c'}, self.fsm._alphabet)
+        self.assertNotIn('b', self.fsm._map)
+        self.assertSetEqual({self.q0_c}, self.fsm._outgoing[self.q0])
+        self.assertSetEqual({self.q3_a}, self.fsm._incoming[self.q2])
+        self.assertTrue(self.fsm._dirty)
+
+    # Unknown transition remove (nothing gets removed)
+    def test_remove_transitions_unknown(self):
+        self._populate_fsm()
+        with self.assertRaises(KeyError):
+            self.fsm.remove_transitions([self.q0_a, Transition('b', self.q3, self.q3)])
+        self.assertIn(self.q0_a, self.fsm._transitions)
+
+    # Many transition remove with a transition given twice
+    def test_remove_transitions_duplicate(self):
+        self._populate_fsm()
+        self.fsm.remove_transitions([self.q0_a, self.q0_a])
+        self.assertEqual(8, len(self.fsm._transitions))
+        self.assertNotIn(self.q0, self.fsm._map['a'])
+
     """
     SET INITIAL/DEAD STATE TESTS
     """
@@ -389,6 +391,47 @@ class TestFSM(TestCase):
         self.fsm.add_transition(self.q3_b)
         self.fsm.validate()
 
+    def test_validate_removed_initial_state(self):
+        self._populate_fsm()
+        self.fsm.remove_state(self.q0)
+        with self.assertRaises(NoInitialState):
+            self.fsm.validate()
+
+    def test_validate_incremental(self):
+        self._populate_fsm()
+        # Adding reachable states extends the set of reachable states without a full pass
+        q4 = State('q4')
+        self.fsm.add_state(q4)
+        with self.assertRaises(UnreachableStateDetected):
+            self.fsm.validate()
+        self.fsm.add_transition(Transition('b', self.q3, q4))
+        self.assertIn(q4, self.fsm._reachable)
+        self.fsm.validate()
+        # Removing a transition of a reachable state requires a full pass
+        self.fsm.remove_transition(self.q0_b)
+        self.assertIsNone(self.fsm._reachable)
+        self.fsm.validate()
+        self.fsm.remove_transition(self.q3_c)
+        self.fsm.remove_transition(self.q1_a)
+        with self.assertRaises(UnreachableStateDetected):
+            self.fsm.validate()
+        # Removing an unreachable state does not invalidate the set of reachable states
+        reachable = self.fsm._reachable
+        self.fsm.remove_state(self.q1)
+        self.assertIs(reachable, self.fsm._reachable)
+        self.fsm.validate()
+
+    def test_validate_long_chain(self):
+        states = [State(index, final=index % 2 == 0) for index in range(10000)]
+        for state in states:
+            self.fsm.add_state(state)
+        self.fsm.initial_state = states[0]
+        for (src, dst) in zip(states, states[1:]):
+            self.fsm.add_transition(Transition('a', src, dst))
+        self.fsm.add_transition(Transition('a', states[-1], states[0]))
+        self.fsm.validate()
+        self.assertEqual(len(states), len(self.fsm._reachable))
+
     """
     STEP TESTS
     """
@@ -459,3 +502,578 @@ class TestFSM(TestCase):
         self.fsm.add_state(State('new_state'))
         with self.assertRaises(ValidationRequired):
             self.fsm.step('a')
+
+    """
+    COMPILE TESTS
+    """
+
+    def test_compile_dirty(self):
+        self._populate_fsm()
+        self.fsm.add_state(State('new_state'))
+        with self.assertRaises(ValidationRequired):
+            self.fsm.compile()
+        self.assertFalse(self.fsm.is_compiled())
+
+    def test_compile_not_validated(self):
+        # New (empty) FSM is not dirty, but there is nothing to compile
+        with self.assertRaises(ValidationRequired):
+            self.fsm.compile()
+        self.fsm.dead_state = self.ds
+        with self.assertRaises(ValidationRequired):
+            self.fsm.compile()
+        self.assertFalse(self.fsm.is_compiled())
+        self._populate_fsm(transitions=False)
+        with self.assertRaises(ValidationRequired):
+            self.fsm.compile()
+
+    def test_compile_table(self):
+        self._populate_fsm()
+        table = self.fsm.compile()
+        self.assertTrue(self.fsm.is_compiled())
+        self.assertIs(table, self.fsm.table)
+        self.assertEqual(table.states[table.initial], self.q0)
+        self.assertEqual(table.states[table.dead], self.ds)
+        for transition in [self.q0_a, self.q0_b, self.q0_c, self.q1_a, self.q1_b, self.q2_b, self.q2_c, self.q3_a, self.q3_c]:
+            src = table.state_index[transition.src_state]
+            symbol = table.symbol_index[transition.symbol]
+            self.assertEqual(table.states[table.next_state(src, symbol)], transition.dst_state)
+        # Undefined transitions lead into the dead state, dead state loops into itself
+        self.assertEqual(table.next_state(table.state_index[self.q1], table.symbol_index['c']), table.dead)
+        for symbol in ['a', 'b', 'c']:
+            self.assertEqual(table.next_state(table.dead, table.symbol_index[symbol]), table.dead)
+
+    def test_compile_frozen(self):
+        self._populate_fsm()
+        self.fsm.compile()
+        with self.assertRaises(CannotModifyCompiledFSM):
+            self.fsm.add_state(State('new_state'))
+        with self.assertRaises(CannotModifyCompiledFSM):
+            self.fsm.add_transition(Transition('b', self.q3, self.q3))
+        with self.assertRaises(CannotModifyCompiledFSM):
+            self.fsm.remove_state(self.q3)
+        with self.assertRaises(CannotModifyCompiledFSM):
+            self.fsm.remove_transition(self.q0_a)
+        with self.assertRaises(CannotModifyCompiledFSM):
+            self.fsm.initial_state = self.q1
+        with self.assertRaises(CannotModifyCompiledFSM):
+            self.fsm.dead_state = None
+
+    def test_compile_step_sequence(self):
+        self._populate_fsm()
+        self.fsm.compile()
+        for symbol in ['b', 'a', 'b', 'a', 'c', 'b', 'b']:
+            self.fsm.step(symbol)
+        self.assertEqual(self.ds, self.fsm.current_state)
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter',
+                              'q1_on_loop_exit', 'q1_a', 'q1_on_loop_enter',
+                              'q1_on_exit', 'q1_b', 'q3_on_enter',
+                              'q3_on_exit', 'q3_a', 'q2_on_enter',
+                              'q2_on_exit', 'q2_c', 'q3_on_enter',
+                              'q3_on_exit', 'dead_on_enter',
+                              'dead_on_loop_exit', 'dead_on_loop_enter'], self.step_stack)
+
+    def test_compile_step_after_steps(self):
+        self._populate_fsm()
+        self.fsm.step('b')  # Transition into q1
+        self.fsm.compile()
+        self.fsm.step('b')  # Transition into q3
+        self.assertEqual(self.q3, self.fsm.current_state)
+        self.assertTrue(self.fsm.is_in_final_state())
+
+    def test_compile_step_unknown_symbol(self):
+        self._populate_fsm()
+        self.fsm.compile()
+        with self.assertRaises(AssertionError):
+            self.fsm.step('unknown_symbol')
+
+    """
+    RUN TESTS
+    """
+
+    def test_run_regular_sequence(self):
+        self._populate_fsm()
+        result = self.fsm.run(['b', 'a', 'b', 'a', 'c', 'b', 'b'])
+        self.assertEqual(self.ds, result.state)
+        self.assertEqual(self.ds, self.fsm.current_state)
+        self.assertEqual(7, result.consumed)
+        self.assertEqual(5, result.dead_at)
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter',
+                              'q1_on_loop_exit', 'q1_a', 'q1_on_loop_enter',
+                              'q1_on_exit', 'q1_b', 'q3_on_enter',
+                              'q3_on_exit', 'q3_a', 'q2_on_enter',
+                              'q2_on_exit', 'q2_c', 'q3_on_enter',
+                              'q3_on_exit', 'dead_on_enter',
+                              'dead_on_loop_exit', 'dead_on_loop_enter'], self.step_stack)
+
+    def test_run_generator(self):
+        self._populate_fsm()
+        result = self.fsm.run(symbol for symbol in 'bab')
+        self.assertEqual(RunResult(self.q3, 3, None), result)
+        self.assertTrue(self.fsm.is_in_final_state())
+
+    def test_run_stop_on_dead(self):
+        self._populate_fsm()
+        result = self.fsm.run('bcaaa', stop_on_dead=True)
+        self.assertEqual(RunResult(self.ds, 2, 1), result)
+        # Already in dead state, nothing is consumed
+        result = self.fsm.run('aaa', stop_on_dead=True)
+        self.assertEqual(RunResult(self.ds, 0, None), result)
+
+    def test_run_unknown_symbol(self):
+        self._populate_fsm()
+        with self.assertRaises(UnknownSymbol):
+            self.fsm.run(['b', 'unknown_symbol', 'b'])
+        # Symbols preceding the unknown one were consumed
+        self.assertEqual(self.q1, self.fsm.current_state)
+
+    def test_run_dirty_bit(self):
+        self._populate_fsm()
+        self.fsm.add_state(State('new_state'))
+        with self.assertRaises(ValidationRequired):
+            self.fsm.run('a')
+
+    def test_run_compiled(self):
+        self._populate_fsm()
+        self.fsm.step('b')  # Transition into q1
+        self.fsm.compile()
+        result = self.fsm.run('bacbb', stop_on_dead=True)
+        self.assertEqual(RunResult(self.ds, 4, 3), result)
+        self.assertTrue(self.fsm.is_in_dead_state())
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter',
+                              'q1_on_exit', 'q1_b', 'q3_on_enter',
+                              'q3_on_exit', 'q3_a', 'q2_on_enter',
+                              'q2_on_exit', 'q2_c', 'q3_on_enter',
+                              'q3_on_exit', 'dead_on_enter'], self.step_stack)
+        with self.assertRaises(UnknownSymbol):
+            self.fsm.run(['unknown_symbol'])
+
+    """
+    CURSOR TESTS
+    """
+
+    def test_cursor_not_compiled(self):
+        self._populate_fsm()
+        with self.assertRaises(CompilationRequired):
+            self.fsm.cursor()
+
+    def test_cursor_shared_table(self):
+        self._populate_fsm()
+        self.fsm.compile()
+        first = self.fsm.cursor()
+        second = self.fsm.cursor()
+        self.assertIs(first.table, second.table)
+        first.step('b')
+        self.assertEqual(self.q1, first.current_state)
+        self.assertEqual(self.q0, second.current_state)
+        # Cursors do not move the FSM itself
+        self.assertEqual(self.q0, self.fsm.current_state)
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter'], self.step_stack)
+        with self.assertRaises(AttributeError):
+            first.some_attribute = None
+
+    def test_cursor_run(self):
+        self._populate_fsm()
+        self.fsm.compile()
+        cursor = self.fsm.cursor(self.q1)
+        self.assertEqual(RunResult(self.ds, 2, 1), cursor.run('acab', stop_on_dead=True))
+        self.assertTrue(cursor.is_in_dead_state())
+        self.assertListEqual(['q1_on_loop_exit', 'q1_a', 'q1_on_loop_enter',
+                              'q1_on_exit', 'dead_on_enter'], self.step_stack)
+        cursor.reset()
+        self.assertEqual(self.q0, cursor.current_state)
+        self.assertFalse(cursor.is_in_final_state())
+
+    """
+    MINIMIZE TESTS
+    """
+
+    def test_minimize_dirty(self):
+        self._populate_fsm()
+        self.fsm.add_state(State('new_state'))
+        with self.assertRaises(ValidationRequired):
+            self.fsm.minimize()
+
+    def test_minimize_callbacks(self):
+        # All states of the test FSM have their own callbacks, nothing can be merged
+        self._populate_fsm()
+        (fsm, mapping) = self.fsm.minimize()
+        self.assertIsInstance(fsm, MyFSM)
+        self.assertSetEqual(self.fsm._states, fsm._states)
+        self.assertSetEqual(self.fsm._transitions, fsm._transitions)
+        self.assertEqual(self.ds, mapping[self.ds])
+        self.assertEqual(self.q0, fsm.initial_state)
+
+    def test_minimize_equivalent_states(self):
+        # q0 -a-> q1, q0 -b-> q2, both q1 and q2 are final and loop on 'a' into each other
+        q = [State('q0'), State('q1', final=True), State('q2', final=True), State('q3')]
+        for state in q:
+            self.fsm.add_state(state)
+        self.fsm.initial_state = q[0]
+        self.fsm.dead_state = self.ds
+        for (symbol, src, dst) in [('a', 0, 1), ('b', 0, 2), ('a', 1, 2), ('a', 2, 1), ('b', 1, 3), ('b', 2, 3),
+                                   ('a', 3, 3)]:
+            self.fsm.add_transition(Transition(symbol, q[src], q[dst]))
+        self.fsm.validate()
+        (fsm, mapping) = self.fsm.minimize()
+        self.assertEqual(3, len(fsm._states))
+        self.assertIs(mapping[q[1]], mapping[q[2]])
+        self.assertIsNot(mapping[q[0]], mapping[q[3]])
+        self.assertEqual(self.ds, fsm.dead_state)
+        for sequence in ['a', 'b', 'aa', 'ba', 'ab', 'bab', 'abaa', 'aaaa']:
+            self.fsm.run(sequence)
+            fsm.run(sequence)
+            self.assertEqual(mapping[self.fsm.current_state], fsm.current_state)
+            self.assertEqual(self.fsm.is_in_final_state(), fsm.is_in_final_state())
+            self.fsm._current_state = None
+            fsm._current_state = None
+
+    """
+    MATCH TESTS
+    """
+
+    def test_match_not_compiled(self):
+        self._populate_fsm()
+        with self.assertRaises(CompilationRequired):
+            self.fsm.match('bab')
+
+    def test_match(self):
+        self._populate_fsm()
+        self.fsm.compile()
+        self.assertEqual(MatchResult(True, self.q3, 3), self.fsm.match('bab'))
+        self.assertEqual(MatchResult(False, self.q2, 4), self.fsm.match('baba'))
+        self.assertEqual(MatchResult(False, self.q0, 0), self.fsm.match(''))
+        # Stops as soon as the dead state is reached
+        self.assertEqual(MatchResult(False, self.ds, 2), self.fsm.match(['b', 'c', 'unknown_symbol']))
+        self.assertTrue(self.fsm.accepts(iter('bab')))
+        self.assertFalse(self.fsm.accepts('bc'))
+        with self.assertRaises(UnknownSymbol):
+            self.fsm.match(['b', 'unknown_symbol'])
+        # No callbacks and no change of the current state
+        self.assertListEqual([], self.step_stack)
+        self.assertEqual(self.q0, self.fsm.current_state)
+
+    def test_match_buffers(self):
+        # Byte-level FSM, accepting sequences of ones with at least one
+        zero = State(0)
+        one = State(1, final=True)
+        self.fsm.add_state(zero)
+        self.fsm.add_state(one)
+        self.fsm.initial_state = zero
+        self.fsm.dead_state = self.ds
+        self.fsm.add_transition(Transition(1, zero, one))
+        self.fsm.add_transition(Transition(1, one, one))
+        self.fsm.add_transition(Transition(0, one, one))
+        self.fsm.validate()
+        self.fsm.compile()
+        data = bytearray([1, 1, 0, 1])
+        if sys.version_info[0] >= 3:
+            # Python 2 memoryview yields one-character strings instead of integers
+            self.assertEqual(MatchResult(True, one, 4), self.fsm.match(memoryview(data)))
+        self.assertEqual(MatchResult(True, one, 4), self.fsm.match(array('B', data)))
+        self.assertEqual(MatchResult(False, self.ds, 1), self.fsm.match(bytearray([0, 1])))
+
+    def test_stats_disabled(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        self.assertIsNone(self.fsm.stats)
+        self.fsm.step('b')
+        self.assertIsNone(self.fsm.stats)
+
+    def _assert_stats(self, stats):
+        snapshot = stats.snapshot()
+        self.assertEqual(6, snapshot.steps)
+        self.assertDictEqual({('b', 'q0', 'q1'): 1, ('a', 'q1', 'q1'): 1, ('b', 'q1', 'q3'): 1,
+                              ('c', 'q3', 'q1'): 1, ('c', 'q1', 'ds'): 1, ('a', 'ds', 'ds'): 1},
+                             snapshot.transitions)
+        self.assertSetEqual({'q0', 'q1', 'q3', 'ds'}, set(snapshot.states))
+        self.assertEqual((0, 1, 0, 0), snapshot.states['q0'][:4])
+        self.assertEqual((2, 2, 1, 1), snapshot.states['q1'][:4])
+        self.assertEqual((1, 1, 0, 0), snapshot.states['q3'][:4])
+        self.assertEqual((1, 0, 1, 0), snapshot.states['ds'][:4])
+        self.assertTrue(all(counters.dwell >= 0 for counters in snapshot.states.values()))
+
+    def test_stats_step_and_run(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        stats = self.fsm.enable_stats()
+        self.assertIs(stats, self.fsm.enable_stats())
+        for symbol in 'bab':
+            self.fsm.step(symbol)
+        self.fsm.run('cca')
+        self._assert_stats(stats)
+        stats.reset()
+        self.assertEqual(0, stats.snapshot().steps)
+        self.assertListEqual(['ds'], list(stats.snapshot().states))
+        self.fsm.disable_stats()
+        self.assertIsNone(self.fsm.stats)
+
+    def test_stats_compiled(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        self.fsm.compile()
+        stats = self.fsm.enable_stats()
+        for symbol in 'bab':
+            self.fsm.step(symbol)
+        self.fsm.run('cca')
+        self._assert_stats(stats)
+
+    def test_stats_dwell(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        now = [0.0]
+        stats = Stats(self.q0, clock=lambda: now[0])
+        self.fsm._stats = stats
+        for (symbol, elapsed) in [('b', 1.0), ('a', 2.0), ('b', 4.0), ('c', 8.0)]:
+            now[0] += elapsed
+            self.fsm.step(symbol)
+        now[0] += 16.0
+        snapshot = stats.snapshot()
+        self.assertEqual(1.0, snapshot.states['q0'].dwell)
+        # Loops do not leave the state, the current state includes the time spent in it so far
+        self.assertEqual(2.0 + 4.0 + 16.0, snapshot.states['q1'].dwell)
+        self.assertEqual(8.0, snapshot.states['q3'].dwell)
+
+    def test_profiling_labels(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        profiler = self.fsm.enable_profiling()
+        self.assertIs(profiler, self.fsm.profiler)
+        for symbol in 'ba':
+            self.fsm.step(symbol)
+        self.fsm.run('bcc')
+        self.assertListEqual(['q0_on_exit', 'q0_b', 'q1_on_enter', 'q1_on_loop_exit', 'q1_a', 'q1_on_loop_enter',
+                              'q1_on_exit', 'q1_b', 'q3_on_enter', 'q3_on_exit', 'q3_c', 'q1_on_enter',
+                              'q1_on_exit', 'dead_on_enter'], self.step_stack)
+        report = profiler.report()
+        self.assertSetEqual({('q0', 'on_exit', 'b'), ('q0', 'on_transition', 'b'), ('q1', 'on_enter', 'b'),
+                             ('q1', 'on_loop_exit', 'a'), ('q1', 'on_transition', 'a'), ('q1', 'on_loop_enter', 'a'),
+                             ('q1', 'on_exit', 'b'), ('q1', 'on_transition', 'b'), ('q3', 'on_enter', 'b'),
+                             ('q3', 'on_exit', 'c'), ('q3', 'on_transition', 'c'), ('q1', 'on_enter', 'c'),
+                             ('q1', 'on_exit', 'c'), ('ds', 'on_enter', 'c')}, set(report))
+        self.assertTrue(all(summary.count == 1 for summary in report.values()))
+        self.fsm.disable_profiling()
+        self.assertIsNone(self.fsm.profiler)
+
+    def test_profiling_compiled(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        self.fsm.compile()
+        profiler = self.fsm.enable_profiling()
+        result = self.fsm.run('bcca', stop_on_dead=True)
+        self.assertEqual(RunResult(self.ds, 2, 1), result)
+        self.assertEqual(['q0_on_exit', 'q0_b', 'q1_on_enter', 'q1_on_exit', 'dead_on_enter'], self.step_stack)
+        self.assertEqual(1, profiler.report()[('ds', 'on_enter', 'c')].count)
+        with self.assertRaises(UnknownSymbol):
+            self.fsm.run(['unknown_symbol'])
+
+    def test_profiling_slow_callbacks(self):
+        now = [0.0]
+        slow = []
+        self.q0_b.on_transition = lambda: now.__setitem__(0, now[0] + 0.5)
+        self._populate_fsm()
+        self.fsm.validate()
+        self.fsm._profiler = CallbackProfiler(0.1, lambda label, latency: slow.append((label, latency)),
+                                              clock=lambda: now[0])
+        self.fsm.step('b')
+        self.assertListEqual([(('q0', 'on_transition', 'b'), 0.5)], slow)
+        summary = self.fsm.profiler.report()[('q0', 'on_transition', 'b')]
+        self.assertEqual((1, 0.5, 0.5, 0.5, 0.5), summary)
+        self.fsm.profiler.reset()
+        self.assertDictEqual({}, self.fsm.profiler.report())
+
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(0, histogram.percentile(50))
+        for latency in [0.001] * 98 + [0.1, 2.0]:
+            histogram.add(latency)
+        summary = histogram.summary()
+        self.assertEqual(100, summary.count)
+        self.assertEqual(2.0, summary.max)
+        # Percentiles are within a bucket (~19%) of the true value
+        self.assertTrue(0.001 <= summary.p50 < 0.0012)
+        self.assertTrue(0.1 <= summary.p99 < 0.12)
+        self.assertEqual(2.0, histogram.percentile(100))
+
+    def test_trace_ring_buffer(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        self.assertIsNone(self.fsm.trace)
+        trace = self.fsm.enable_trace(capacity=3)
+        self.assertIs(trace, self.fsm.trace)
+        self.fsm.step('b')
+        self.assertListEqual([TraceEntry('b', self.q0, self.q1, False, False)], trace.entries())
+        self.fsm.run('abcc')
+        self.assertEqual(5, trace.count)
+        self.assertEqual(3, len(trace))
+        self.assertListEqual([TraceEntry('b', self.q1, self.q3, False, False),
+                              TraceEntry('c', self.q3, self.q1, False, False),
+                              TraceEntry('c', self.q1, self.ds, False, True)], trace.entries())
+        self.assertListEqual([('b', 'q1', 'q3', False, False), ('c', 'q3', 'q1', False, False),
+                              ('c', 'q1', 'ds', False, True)], trace.dump())
+        trace.clear()
+        self.assertListEqual([], trace.entries())
+        self.fsm.disable_trace()
+        self.assertIsNone(self.fsm.trace)
+
+    def test_trace_compiled(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        self.fsm.compile()
+        trace = self.fsm.enable_trace()
+        self.fsm.step('b')
+        self.fsm.run('a')
+        self.assertListEqual([('b', 'q0', 'q1', False, False), ('a', 'q1', 'q1', True, False)], trace.dump())
+
+    def test_replay(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        trace = self.fsm.enable_trace(capacity=2)
+        self.fsm.run('bab')
+        other = MyFSM()
+        for state in [self.q0, self.q1, self.q2, self.q3]:
+            other.add_state(state)
+        other.initial_state = self.q0
+        other.dead_state = self.ds
+        for transition in [self.q0_a, self.q0_b, self.q0_c, self.q1_a, self.q1_b, self.q2_b, self.q2_c, self.q3_a,
+                           self.q3_c]:
+            other.add_transition(transition)
+        other.validate()
+        del self.step_stack[:]
+        # No callbacks are performed
+        self.assertEqual(self.q3, other.replay(trace))
+        self.assertEqual(self.q3, other.current_state)
+        self.assertListEqual([], self.step_stack)
+        # Dumped trace (state ids), compiled FSM
+        other.compile()
+        self.assertEqual(self.ds, other.replay([('c', 'q3', 'q1', False, False), ('c', 'q1', 'ds', False, True),
+                                                ('a', 'ds', 'ds', True, False)]))
+        other.step('a')
+        self.assertEqual(self.ds, other.current_state)
+
+    def test_replay_mismatch(self):
+        self._populate_fsm()
+        self.fsm.validate()
+        self.fsm.step('b')
+        with self.assertRaises(ReplayMismatch):
+            self.fsm.replay([('a', 'q0', 'q1', False, False)])
+        with self.assertRaises(ReplayMismatch):
+            self.fsm.replay([('b', 'q0', 'q1', False, False), ('b', 'q3', 'q1', False, False)])
+        with self.assertRaises(ReplayMismatch):
+            self.fsm.replay([('b', 'unknown_state', 'q1', False, False)])
+        with self.assertRaises(UnknownSymbol):
+            self.fsm.replay([('unknown_symbol', 'q0', 'q1', False, False)])
+        self.assertEqual(self.q1, self.fsm.current_state)
+        self.assertEqual(self.q1, self.fsm.replay([]))
+
+    def test_symbol_set(self):
+        letters = SymbolSet(['_'], [('a', 'z'), ('A', 'Z')], excluded=['q'])
+        self.assertIn('_', letters)
+        self.assertIn('m', letters)
+        self.assertIn('M', letters)
+        self.assertNotIn('q', letters)
+        self.assertNotIn('0', letters)
+        self.assertNotIn(ord('m'), letters)
+        self.assertNotIn('ab', letters)
+        self.assertIn('q', letters.union(SymbolSet(['q'])))
+        self.assertEqual(letters, SymbolSet(['_'], [('A', 'Z'), ('a', 'z')], excluded=['q']))
+
+        # Large ranges are looked up by bisection
+        classes = partition([5], [SymbolSet(ranges=[(0, 10 ** 9)]), SymbolSet(ranges=[(10 ** 6, 2 * 10 ** 9)])])
+        self.assertEqual(4, len(classes))
+        self.assertEqual(classes[0], classes[10 ** 6 - 1])
+        self.assertEqual(classes[10 ** 6], classes[10 ** 9])
+        self.assertNotEqual(classes[0], classes[5])
+        self.assertNotEqual(classes[0], classes[10 ** 9 + 1])
+        self.assertNotIn(-1, classes)
+        self.assertNotIn(2 * 10 ** 9 + 1, classes)
+
+    def _populate_identifier_fsm(self, dead_state=True):
+        # Identifier: a letter or underscore, followed by letters, digits or underscores
+        letters = SymbolSet(['_'], [('a', 'z'), ('A', 'Z')])
+        self.fsm.add_state(self.q0)
+        self.fsm.add_state(self.q1)
+        self.fsm.initial_state = self.q0
+        if dead_state:
+            self.fsm.dead_state = self.ds
+        self.fsm.add_transition(Transition(letters, self.q0, self.q1))
+        self.fsm.add_transition(Transition(letters.union(SymbolSet(ranges=[('0', '9')])), self.q1, self.q1))
+        if dead_state:
+            self.fsm.validate()
+
+    def test_symbol_classes(self):
+        self._populate_identifier_fsm()
+        self.assertEqual(set(), self.fsm._alphabet)
+        self.assertEqual(RunResult(self.q1, 4, None), self.fsm.run('x_1Z'))
+        self.fsm.step('9')
+        self.assertEqual(self.q1, self.fsm.current_state)
+        with self.assertRaises(UnknownSymbol):
+            self.fsm.run('a-')
+        with self.assertRaises(AssertionError):
+            self.fsm.step('-')
+
+        # Table columns are the classes: letters and underscore, digits
+        self.fsm.compile()
+        self.assertEqual(2, self.fsm.table.width)
+        self.assertTrue(self.fsm.accepts('_a1'))
+        self.assertEqual(MatchResult(False, self.ds, 1), self.fsm.match('1a'))
+        self.fsm.step('a')
+        self.assertEqual(self.q1, self.fsm.current_state)
+
+    def test_symbol_classes_conflict(self):
+        self._populate_identifier_fsm()
+        self.fsm.add_transition(Transition('k', self.q0, self.q0))
+        with self.assertRaises(ValidationRequired):
+            self.fsm.step('k')
+        with self.assertRaises(StateCannotHaveSameSymbolTransitions):
+            self.fsm.validate()
+
+    def test_symbol_classes_excluded(self):
+        # Letters but 'm' and 'n', and 'm' to 'n': disjoint sets, without a class covering both
+        self.fsm.add_state(self.q0)
+        self.fsm.add_state(self.q1)
+        self.fsm.initial_state = self.q0
+        self.fsm.dead_state = self.ds
+        self.fsm.add_transition(Transition(SymbolSet(ranges=[('a', 'z')], excluded=['m', 'n']), self.q0, self.q0))
+        self.fsm.add_transition(Transition(SymbolSet(ranges=[('m', 'n')]), self.q0, self.q1))
+        self.fsm.validate()
+        self.assertEqual(2, len(self.fsm._class_map.classes))
+        self.assertEqual(RunResult(self.q1, 3, None), self.fsm.run('azn'))
+        classes = partition([], [SymbolSet(ranges=[(0, 9)], excluded=[5]), SymbolSet(ranges=[(5, 5)])])
+        self.assertNotEqual(classes[4], classes[5])
+        self.assertEqual(classes[4], classes[6])
+
+    def test_symbol_classes_otherwise(self):
+        self._populate_identifier_fsm(dead_state=False)
+        self.fsm.add_transition(Transition('-', self.q1, self.q0))
+        # Digits and '-' are missing in the initial state
+        with self.assertRaises(MissingTransitions):
+            self.fsm.validate()
+
+        self.fsm.add_transition(Transition(OTHERWISE, self.q0, self.q0))
+        self.fsm.validate()
+        self.assertEqual(RunResult(self.q1, 3, None), self.fsm.run('7ab'))
+        self.fsm.step('-')
+        self.assertEqual(self.q0, self.fsm.current_state)
+        self.fsm.step('-')
+        self.assertEqual(self.q0, self.fsm.current_state)
+
+    def test_symbol_classes_minimize(self):
+        (a, b, f) = (State('a'), State('b'), State('f', final=True))
+        for state in (self.q0, a, b, f):
+            self.fsm.add_state(state)
+        self.fsm.initial_state = self.q0
+        self.fsm.dead_state = self.ds
+        self.fsm.add_transition(Transition(SymbolSet(ranges=[(0, 255)]), self.q0, a))
+        for state in (a, b):
+            self.fsm.add_transition(Transition(0, state, f))
+            self.fsm.add_transition(Transition(OTHERWISE, state, b))
+        self.fsm.add_transition(Transition(SymbolSet(ranges=[(1, 255)]), f, self.q0))
+        self.fsm.validate()
+
+        (minimized, mapping) = self.fsm.minimize()
+        self.assertEqual(3, len(minimized._states))
+        self.assertEqual(mapping[a], mapping[b])
+        self.fsm.compile()
+        minimized.compile()
+        for symbols in (b'\x01\x00', b'\x01\x02\x03\x00', b'\x05\x00\x07', b'\x05\x00\x07\x00', b'\x05\x00\x00'):
+            self.assertEqual(self.fsm.match(bytearray(symbols)).accepted, minimized.match(bytearray(symbols)).accepted)
@@ -0,0 +1,142 @@
+# encoding: utf-8
+
+from functools import partial
+from unittest import TestCase
+from lazy import LazyFSM, CacheInfo
+from fsm import RunResult
+from state import State, DeadState
+from fsm_exceptions import *
+
+
+class CounterFSM(LazyFSM):
+
+    def __init__(self, test, dead=True, cache_size=4096):
+        # Needed by create_state()
+        self.test = test
+        self.calls = 0
+        # Counter of non-negative integers: decrementing zero leads into the dead state
+        super(CounterFSM, self).__init__(self.transition, 0, lambda n: n % 10 == 0,
+                                         dead_state=DeadState('dead', on_enter=partial(test.step_stack.append,
+                                                                                       'dead_on_enter'))
+                                         if dead else None,
+                                         alphabet=['inc', 'dec', 'keep'], cache_size=cache_size)
+
+    def transition(self, n, symbol):
+        self.calls += 1
+        if symbol == 'inc':
+            return n + 1
+        elif symbol == 'dec':
+            return n - 1 if n > 0 else None
+        return n
+
+    def create_state(self, id):
+        stack = self.test.step_stack
+        return State(id, final=id % 10 == 0,
+                     on_enter=partial(stack.append, '{}_on_enter'.format(id)),
+                     on_exit=partial(stack.append, '{}_on_exit'.format(id)),
+                     on_loop_enter=partial(stack.append, '{}_on_loop_enter'.format(id)))
+
+
+class TestLazyFSM(TestCase):
+
+    def setUp(self):
+        self.step_stack = []
+        self.fsm = CounterFSM(self)
+
+    def test_abstract(self):
+        with self.assertRaises(AssertionError):
+            LazyFSM(lambda state, symbol: state, 0, lambda state: True)
+
+    def test_step(self):
+        self.assertEqual(0, self.fsm.current_state.id)
+        self.assertTrue(self.fsm.is_in_final_state())
+        self.fsm.step('inc')
+        self.fsm.step('keep')
+        self.assertEqual(1, self.fsm.current_state.id)
+        self.assertFalse(self.fsm.is_in_final_state())
+        self.assertListEqual(['0_on_exit', '1_on_enter', '1_on_loop_enter'], self.step_stack)
+        with self.assertRaises(AssertionError):
+            self.fsm.step('unknown_symbol')
+
+    def test_dead_state(self):
+        result = self.fsm.run(['inc', 'dec', 'dec', 'inc'])
+        self.assertEqual(RunResult(self.fsm.dead_state, 4, 2), result)
+        self.assertTrue(self.fsm.is_in_dead_state())
+        self.assertListEqual(['0_on_exit', '1_on_enter', '1_on_exit', '0_on_enter', '0_on_exit', 'dead_on_enter'],
+                             self.step_stack)
+        # Already in the dead state
+        self.assertEqual(RunResult(self.fsm.dead_state, 1, None), self.fsm.run(['inc']))
+        self.assertEqual(RunResult(self.fsm.dead_state, 0, None), self.fsm.run(['inc'], stop_on_dead=True))
+
+    def test_missing_dead_state(self):
+        fsm = CounterFSM(self, dead=False)
+        with self.assertRaises(MissingTransitions):
+            fsm.step('dec')
+
+    def test_run_stop_on_dead(self):
+        result = self.fsm.run(['dec', 'inc'], stop_on_dead=True)
+        self.assertEqual(RunResult(self.fsm.dead_state, 1, 0), result)
+        with self.assertRaises(UnknownSymbol):
+            CounterFSM(self).run(['inc', 'unknown_symbol'])
+
+    def test_cache(self):
+        self.fsm.run(['inc', 'dec'] * 5)
+        # Only (0, inc) and (1, dec) are computed
+        self.assertEqual(2, self.fsm.calls)
+        self.assertEqual(CacheInfo(8, 2, 0, 2, 4096), self.fsm.cache_info())
+        self.fsm.cache_clear()
+        self.assertEqual(CacheInfo(0, 0, 0, 0, 4096), self.fsm.cache_info())
+
+    def test_cache_eviction(self):
+        fsm = CounterFSM(self, cache_size=2)
+        fsm.run(['inc', 'inc', 'dec', 'dec'])
+        # (0, inc), (1, inc), (2, dec) evicting (0, inc), (1, dec) evicting (1, inc)
+        self.assertEqual(CacheInfo(0, 4, 2, 2, 2), fsm.cache_info())
+        # Least recently used entry is evicted
+        fsm.run(['inc', 'dec'])
+        self.assertEqual(CacheInfo(1, 5, 3, 2, 2), fsm.cache_info())
+        self.assertEqual(0, fsm.current_state.id)
+
+    def test_large_state_space(self):
+        fsm = CounterFSM(self, cache_size=100)
+        fsm.run(['inc'] * 10000)
+        self.assertEqual(10000, fsm.current_state.id)
+        self.assertTrue(fsm.is_in_final_state())
+        self.assertEqual(100, fsm.cache_info().size)
+
+    def test_not_supported(self):
+        for operation in (partial(self.fsm.add_state, State('q0')), partial(self.fsm.add_states, [State('q0')]),
+                          partial(self.fsm.add_transition, None), partial(self.fsm.add_transitions, []),
+                          partial(self.fsm.remove_states, []), partial(self.fsm.remove_transitions, []),
+                          self.fsm.compile, self.fsm.minimize):
+            with self.assertRaises(UnsupportedOperation):
+                operation()
+        self.assertEqual(0, self.fsm.current_state.id)
+
+    def test_replay(self):
+        trace = self.fsm.enable_trace()
+        self.fsm.run(['inc', 'inc', 'keep', 'dec'])
+        fsm = CounterFSM(self)
+        del self.step_stack[:]
+        self.assertEqual(1, fsm.replay(trace).id)
+        self.assertEqual(1, fsm.current_state.id)
+        self.assertEqual([], self.step_stack)
+        # States given by their ids, stepping into and staying in the dead state
+        steps = [('dec', 0, 'dead', False, True), ('inc', 'dead', 'dead', True, False)]
+        self.assertIs(fsm.dead_state, fsm.replay(steps))
+        with self.assertRaises(ReplayMismatch):
+            fsm.replay([('inc', 0, 1, False, False), ('inc', 1, 3, False, False)])
+        with self.assertRaises(ReplayMismatch):
+            fsm.replay([('inc', 0, 1, False, False), ('inc', 2, 3, False, False)])
+        with self.assertRaises(ReplayMismatch):
+            CounterFSM(self, dead=False).replay([('dec', 0, 'dead', False, True)])
+        with self.assertRaises(UnknownSymbol):
+            fsm.replay([('unknown_symbol', 0, 0, True, False)])
+        self.assertTrue(fsm.is_in_dead_state())
+
+    def test_stats(self):
+        stats = self.fsm.enable_stats()
+        self.fsm.run(['inc', 'keep', 'dec'])
+        snapshot = stats.snapshot()
+        self.assertEqual(3, snapshot.steps)
+        self.assertEqual(1, snapshot.states[1].loops)
@@ -0,0 +1,150 @@
+# encoding: utf-8
+
+from itertools import product
+from unittest import TestCase
+from nfa import NFA, LazyDFA, DFA, EPSILON
+from state import State
+from transition import Transition
+from fixtures import MyFSM
+from fsm_exceptions import *
+
+
+def third_from_last(n=3):
+    # Strings over {a, b} whose n-th symbol from the end is 'a': the minimal DFA has 2^n states
+    nfa = NFA()
+    states = [State(index, final=index == n) for index in range(n + 1)]
+    for state in states:
+        nfa.add_state(state)
+    nfa.initial_state = states[0]
+    nfa.add_transition(Transition('a', states[0], states[0]))
+    nfa.add_transition(Transition('b', states[0], states[0]))
+    nfa.add_transition(Transition('a', states[0], states[1]))
+    for index in range(1, n):
+        nfa.add_transition(Transition('a', states[index], states[index + 1]))
+        nfa.add_transition(Transition('b', states[index], states[index + 1]))
+    return nfa
+
+
+def words(alphabet, max_length):
+    for length in range(max_length + 1):
+        for word in product(alphabet, repeat=length):
+            yield word
+
+
+class TestNFA(TestCase):
+
+    def setUp(self):
+        # a*b or a(ba)*, with epsilon transitions from the initial state into both branches
+        self.nfa = NFA()
+        (self.s, self.p, self.q, self.r, self.t) = (State('s'), State('p'), State('q', final=True), State('r'),
+                                                    State('t', final=True))
+        for state in (self.s, self.p, self.q, self.r, self.t):
+            self.nfa.add_state(state)
+        self.nfa.initial_state = self.s
+        for transition in (Transition(EPSILON, self.s, self.p), Transition(EPSILON, self.s, self.r),
+                           Transition('a', self.p, self.p), Transition('b', self.p, self.q),
+                           Transition('a', self.r, self.t), Transition('b', self.t, self.r)):
+            self.nfa.add_transition(transition)
+
+    def _expected(self, word):
+        alternating = all(symbol == ('a' if index % 2 == 0 else 'b') for (index, symbol) in enumerate(word))
+        return (len(word) > 0 and word[-1] == 'b' and all(symbol == 'a' for symbol in word[:-1])) or \
+            (len(word) % 2 == 1 and alternating)
+
+    def test_nfa(self):
+        self.assertEqual(frozenset(['a', 'b']), self.nfa.alphabet)
+        self.assertEqual(frozenset(['s', 'p', 'r']), self.nfa.initial_subset())
+        self.assertEqual(frozenset(['p', 't']), self.nfa.subset_step(self.nfa.initial_subset(), 'a'))
+        for word in words('ab', 6):
+            self.assertEqual(self._expected(word), self.nfa.accepts(word), word)
+        with self.assertRaises(UnknownSymbol):
+            self.nfa.accepts('abc')
+
+    def test_nfa_errors(self):
+        with self.assertRaises(DuplicateState):
+            self.nfa.add_state(State('s'))
+        with self.assertRaises(DuplicateTransition):
+            self.nfa.add_transition(Transition('a', self.p, self.p))
+        with self.assertRaises(TransitionContainsUnknownState):
+            self.nfa.add_transition(Transition('a', self.p, State('unknown')))
+        with self.assertRaises(NoInitialState):
+            NFA().to_dfa()
+
+    def test_determinize(self):
+        dfa = self.nfa.determinize()
+        self.assertIsInstance(dfa, LazyDFA)
+        self.assertEqual(frozenset(['s', 'p', 'r']), dfa.current_state.id)
+        for word in words('ab', 6):
+            if len(word) % 3 == 0:
+                dfa.cache_clear()
+            dfa._set_current_state(dfa.initial_state)
+            result = dfa.run(word)
+            self.assertEqual(self._expected(word), result.state.final, word)
+            self.assertEqual(len(word), result.consumed)
+        dfa._set_current_state(dfa.initial_state)
+        dfa.run('bb')
+        self.assertTrue(dfa.is_in_dead_state())
+        self.assertEqual(frozenset(), dfa.current_state.id)
+
+    def test_determinize_cache(self):
+        nfa = third_from_last(4)
+        dfa = nfa.determinize(cache_size=8)
+        for word in words('ab', 8):
+            dfa._set_current_state(dfa.initial_state)
+            self.assertEqual(nfa.accepts(word), dfa.run(word).state.final, word)
+        info = dfa.cache_info()
+        self.assertEqual(8, info.size)
+        self.assertEqual(8, info.capacity)
+        self.assertGreater(info.evictions, 0)
+
+    def test_to_dfa(self):
+        dfa = self.nfa.to_dfa()
+        self.assertIsInstance(dfa, DFA)
+        # Sets of NFA states: {s, p, r}, {p, t}, {p}, {q}, {q, r}, {r} and {t}
+        self.assertEqual(7, len(dfa._states))
+        self.assertEqual(frozenset(), dfa.dead_state.id)
+        dfa.compile()
+        for word in words('ab', 6):
+            self.assertEqual(self._expected(word), dfa.accepts(word), word)
+
+        # Subset construction blows up exponentially, minimization keeps all of the states
+        dfa = third_from_last(4).to_dfa(target=MyFSM())
+        self.assertIsInstance(dfa, MyFSM)
+        self.assertEqual(16, len(dfa._states))
+        self.assertEqual(16, len(dfa.minimize()[0]._states))
+
+    def test_to_dfa_degenerate(self):
+        # Only the empty word: no transition can be reached from the initial state
+        nfa = NFA()
+        (s, p, q) = (State('s'), State('p', final=True), State('q'))
+        for state in (s, p, q):
+            nfa.add_state(state)
+        nfa.initial_state = s
+        nfa.add_transition(Transition(EPSILON, s, p))
+        nfa.add_transition(Transition('a', q, p))
+        dfa = nfa.to_dfa()
+        self.assertIsNone(dfa.dead_state)
+        self.assertEqual(2, len(dfa._states))
+        dfa.compile()
+        for word in words('a', 3):
+            self.assertEqual(nfa.accepts(word), dfa.accepts(word), word)
+
+        # No final state can be reached: nothing is accepted
+        nfa = NFA()
+        for state in (s, p, q):
+            nfa.add_state(state)
+        nfa.initial_state = s
+        nfa.add_transition(Transition('a', s, s))
+        nfa.add_transition(Transition('b', q, p))
+        dfa = nfa.to_dfa()
+        self.assertFalse(any(state.final for state in dfa._states))
+        self.assertFalse(dfa.run('aaa').state.final)
+        dfa.validate()
+
+        # Without any symbol there is no FSM
+        nfa = NFA()
+        nfa.add_state(p)
+        nfa.initial_state = p
+        self.assertTrue(nfa.accepts(''))
+        with self.assertRaises(EmptySetOfTransitions):
+            nfa.to_dfa()
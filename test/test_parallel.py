@@ -0,0 +1,54 @@
+# encoding: utf-8
+
+from unittest import TestCase
+from fixtures import MyFSM, populate_diagram_fsm
+from random import Random
+from parallel import recognize_many, recognize_parallel
+from fsm_exceptions import *
+
+
+class TestParallel(TestCase):
+
+    def setUp(self):
+        # FSM (see test_fsm_diagram.png)
+        self.fsm = populate_diagram_fsm(self, MyFSM())
+        self.table = self.fsm.compile()
+        self.sequences = ['bab', 'baba', '', 'bc', 'cccb', 'acac', 'abab', 'bbacc', 'ca', 'b']
+
+    def _expected(self):
+        return [(index,) + tuple(self.table.match(sequence)[:2]) for (index, sequence) in enumerate(self.sequences)]
+
+    def test_recognize_many_ordered(self):
+        results = list(recognize_many(self.table, iter(self.sequences), max_workers=2, chunk_size=3))
+        self.assertListEqual(self._expected(), results)
+
+    def test_recognize_many_unordered(self):
+        results = list(recognize_many(self.table, self.sequences, max_workers=2, chunk_size=2, ordered=False))
+        self.assertListEqual(self._expected(), sorted(results, key=lambda result: result[0]))
+
+    def test_recognize_many_unknown_symbol(self):
+        with self.assertRaises(UnknownSymbol):
+            list(recognize_many(self.table, ['bab', 'unknown_symbol'], max_workers=1))
+
+    def test_transfer(self):
+        recognizer = self.table.recognizer
+        for sequence in self.sequences:
+            mapping = recognizer.transfer(sequence)
+            self.assertEqual(len(self.table), len(mapping))
+            for state in range(len(self.table)):
+                self.assertEqual(recognizer.follow(sequence, state)[0], mapping[state])
+
+    def test_recognize_parallel(self):
+        random = Random(0)
+        for length in [0, 1, 10, 100]:
+            # Sequences that stay out of the dead state for a while: ('b' 'a'* 'b' ('a' 'c')*)*
+            sequence = ''.join(random.choice(['ba', 'bb', 'ab', 'ac', 'ca']) for _ in range(length))
+            expected = self.table.match(sequence)
+            self.assertEqual((expected.accepted, expected.state),
+                             recognize_parallel(self.table, sequence, max_workers=2, chunk_size=7))
+            self.assertEqual((expected.accepted, expected.state),
+                             recognize_parallel(self.table, iter(sequence), max_workers=2, chunk_size=7))
+
+    def test_recognize_parallel_unknown_symbol(self):
+        with self.assertRaises(UnknownSymbol):
+            recognize_parallel(self.table, 'bab' * 10 + 'x', max_workers=1, chunk_size=4)
@@ -0,0 +1,142 @@
+# encoding: utf-8
+
+from functools import partial
+from unittest import TestCase
+from product import product, project, ProductState, INTERSECTION, UNION
+from state import State, DeadState
+from transition import Transition
+from fixtures import MyFSM
+from fsm_exceptions import *
+
+
+class TestProduct(TestCase):
+
+    def setUp(self):
+        self.step_stack = []
+
+    def _component(self, name, start, stop, dead=True):
+        # Toggle: start leads into the final state (and loops in it), stop leads back; stop before start is dead
+        fsm = MyFSM()
+        states = [State((name, index), final=bool(index), **dict(
+            (kind, partial(self.step_stack.append, (name, index, kind)))
+            for kind in ('on_enter', 'on_exit', 'on_loop_enter', 'on_loop_exit'))) for index in range(2)]
+        fsm.add_states(states)
+        fsm.initial_state = states[0]
+        if dead:
+            fsm.dead_state = DeadState((name, 'dead'), on_enter=partial(self.step_stack.append, (name, 'dead')),
+                                       on_loop_enter=partial(self.step_stack.append, (name, 'dead_loop')))
+        fsm.add_transitions([
+            Transition(start, states[0], states[1], on_transition=partial(self.step_stack.append, (name, start))),
+            Transition(start, states[1], states[1]),
+            Transition(stop, states[1], states[0], on_transition=partial(self.step_stack.append, (name, stop)))])
+        if not dead:
+            fsm.add_transition(Transition(stop, states[0], states[0]))
+        fsm.validate()
+        return fsm
+
+    def test_product(self):
+        billing = self._component('billing', 'pay', 'cancel')
+        media = self._component('media', 'upload', 'cancel', dead=False)
+        qa = self._component('qa', 'upload', 'reject')
+        combined = product([billing, media, qa])
+        self.assertEqual(set(['pay', 'upload', 'cancel', 'reject']), combined._alphabet)
+        # Any combination can be reached here (regular states of media are both reachable with and without cancel)
+        self.assertEqual(3 * 2 * 3, len(combined._states))
+        self.assertEqual(((billing.initial_state, media.initial_state, qa.initial_state)),
+                         combined.initial_state.components)
+        self.assertIsInstance(combined, MyFSM)
+
+        events = ['upload', 'pay', 'upload', 'cancel', 'pay', 'upload', 'reject', 'reject', 'pay', 'cancel', 'cancel']
+        for (length, final) in ((1, False), (2, True), (4, False), (6, True), (7, False)):
+            self.step_stack = []
+            components = [self._component('billing', 'pay', 'cancel'),
+                          self._component('media', 'upload', 'cancel', dead=False),
+                          self._component('qa', 'upload', 'reject')]
+            # Each component only receives its own symbols
+            for symbol in events[:length]:
+                for component in components:
+                    if symbol in component._alphabet:
+                        component.step(symbol)
+            expected = self.step_stack
+            self.step_stack = []
+            combined = product([self._component('billing', 'pay', 'cancel'),
+                                self._component('media', 'upload', 'cancel', dead=False),
+                                self._component('qa', 'upload', 'reject')])
+            combined.run(events[:length])
+            self.assertEqual(expected, self.step_stack)
+            self.assertEqual(final, combined.current_state.final)
+            self.assertEqual(tuple(component.current_state for component in components), project(combined))
+
+    def test_product_union(self):
+        combined = product([self._component('billing', 'pay', 'cancel'), self._component('qa', 'upload', 'reject')],
+                           accept=UNION)
+        combined.compile()
+        self.assertTrue(combined.accepts(['pay']))
+        self.assertTrue(combined.accepts(['pay', 'cancel', 'upload']))
+        self.assertFalse(combined.accepts(['cancel', 'reject']))
+        combined = product([self._component('billing', 'pay', 'cancel'), self._component('qa', 'upload', 'reject')],
+                           accept=INTERSECTION)
+        combined.compile()
+        self.assertFalse(combined.accepts(['pay']))
+        self.assertTrue(combined.accepts(['upload', 'pay']))
+
+    def test_product_reachable(self):
+        # Components in lockstep: only the pairs of equal states are reachable
+        combined = product([self._component('a', 'pay', 'cancel'), self._component('b', 'pay', 'cancel')])
+        self.assertEqual(set([(('a', 0), ('b', 0)), (('a', 1), ('b', 1)), (('a', 'dead'), ('b', 'dead'))]),
+                         set(state.id for state in combined._states))
+        self.assertEqual(3 * 2, len(combined._transitions))
+
+    def test_product_empty_language(self):
+        # a accepts only the empty word, b only 'go': no word is accepted by both
+        a = MyFSM()
+        (a0, a1) = (State('a0', final=True), State('a1'))
+        a.add_states([a0, a1])
+        a.initial_state = a0
+        a.add_transitions([Transition('go', a0, a1), Transition('go', a1, a1)])
+        a.validate()
+        b = MyFSM()
+        (b0, b1) = (State('b0'), State('b1', final=True))
+        b.add_states([b0, b1])
+        b.initial_state = b0
+        b.dead_state = DeadState('b_dead')
+        b.add_transition(Transition('go', b0, b1))
+        b.validate()
+        combined = product([a, b], accept=INTERSECTION)
+        self.assertFalse(any(state.final for state in combined._states))
+        self.assertEqual(3, len(combined._states))
+        self.assertFalse(combined.run(['go', 'go']).state.final)
+        self.assertTrue(product([a, b], accept=UNION).initial_state.final)
+        self.assertFalse(combined.require_final)
+        # Edits are validated with the same setting
+        combined.add_state(State('other'))
+        combined.add_transition(Transition('go', State('other'), State('other')))
+        with self.assertRaises(UnreachableStateDetected):
+            combined.validate()
+        combined.remove_state(State('other'))
+        combined.validate()
+        self.assertFalse(combined.minimize()[0].require_final)
+        combined.require_final = True
+        with self.assertRaises(NoFinalState):
+            combined.validate()
+
+    def test_project(self):
+        components = [self._component('billing', 'pay', 'cancel'), self._component('qa', 'upload', 'reject')]
+        combined = product(components, target=MyFSM())
+        combined.run(['pay', 'reject'])
+        del self.step_stack[:]
+        states = project(combined, components)
+        self.assertIsInstance(combined.current_state, ProductState)
+        self.assertEqual((('billing', 1), ('qa', 'dead')), combined.current_state.id)
+        self.assertEqual(states, (components[0].current_state, components[1].current_state))
+        self.assertTrue(components[1].is_in_dead_state())
+        self.assertEqual([], self.step_stack)
+        # Components continue from the projected states
+        components[0].step('cancel')
+        self.assertEqual(components[0].initial_state, components[0].current_state)
+
+    def test_product_dirty(self):
+        fsm = self._component('billing', 'pay', 'cancel')
+        fsm.add_state(State('other'))
+        with self.assertRaises(ValidationRequired):
+            product([fsm])
@@ -0,0 +1,111 @@
+# encoding: utf-8
+
+import os
+import pickle
+import shutil
+import tempfile
+from unittest import TestCase
+from state import State, DeadState
+from fixtures import MyFSM, populate_diagram_fsm
+from cursor import Cursor
+from serialization import dump, dumps, load, loads, _HEADER
+from fsm_exceptions import *
+
+
+# Callbacks must be importable by their names to be serialized
+step_stack = []
+
+
+def q1_on_enter():
+    step_stack.append('q1_on_enter')
+
+
+def q0_b():
+    step_stack.append('q0_b')
+
+
+def dead_on_enter():
+    step_stack.append('dead_on_enter')
+
+
+class TestSerialization(TestCase):
+
+    def setUp(self):
+        # FSM (see test_fsm_diagram.png)
+        del step_stack[:]
+        self.fsm = populate_diagram_fsm(self, MyFSM(), q0_b=q0_b, q1=State('q1', final=True, on_enter=q1_on_enter),
+                                        ds=DeadState('ds', on_enter=dead_on_enter))
+        self.table = self.fsm.compile()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _assert_equivalent(self, table):
+        self.assertTupleEqual(self.table.states, table.states)
+        self.assertTupleEqual(self.table.symbols, table.symbols)
+        self.assertListEqual(list(self.table.next_states), list(table.next_states))
+        self.assertEqual(self.table.final, table.final)
+        self.assertIs(q1_on_enter, table.states[table.state_index[self.q1]].on_enter)
+        self.assertIs(dead_on_enter, table.states[table.dead].on_enter)
+        for sequence in ['bab', 'baba', 'bc', 'cccb']:
+            self.assertEqual(self.table.match(sequence), table.match(sequence))
+
+    def test_dumps_loads(self):
+        table = loads(dumps(self.table))
+        self._assert_equivalent(table)
+        cursor = Cursor(table)
+        cursor.run('bc')
+        self.assertListEqual(['q0_b', 'q1_on_enter', 'dead_on_enter'], step_stack)
+
+    def test_dump_load(self):
+        path = os.path.join(self.directory, 'fsm.bin')
+        dump(self.table, path)
+        table = load(path)
+        self._assert_equivalent(table)
+        # Table is a view of the memory-mapped file
+        self.assertIsInstance(table.next_states, memoryview)
+        # Recognizer can still be shipped to other processes
+        recognizer = pickle.loads(pickle.dumps(table.recognizer))
+        self.assertTrue(recognizer.accepts('bab'))
+
+    def test_loads_checksum(self):
+        data = bytearray(dumps(self.table))
+        data[-1] ^= 0xff
+        with self.assertRaises(SerializationError):
+            loads(data)
+        # Corruption goes unnoticed without verification
+        loads(data, verify=False)
+
+    def test_load_checksum(self):
+        path = os.path.join(self.directory, 'fsm.bin')
+        data = bytearray(dumps(self.table))
+        data[-1] ^= 0xff
+        with open(path, 'wb') as f:
+            f.write(data)
+        # Table is only verified on demand, so that its pages are not all read
+        load(path)
+        with self.assertRaises(SerializationError):
+            load(path, verify=True)
+        # Metadata is always verified
+        data[-1] ^= 0xff
+        data[_HEADER.size + 2] ^= 0xff
+        with open(path, 'wb') as f:
+            f.write(data)
+        with self.assertRaises(SerializationError):
+            load(path)
+
+    def test_loads_invalid(self):
+        with self.assertRaises(SerializationError):
+            loads(b'CFSM')
+        with self.assertRaises(SerializationError):
+            loads(b'XFSM' + dumps(self.table)[4:])
+
+    def test_dumps_invalid(self):
+        self.q2.on_enter = lambda: None
+        with self.assertRaises(SerializationError):
+            dumps(self.table)
+        self.q2.on_enter = None
+        self.q2.id = ('q', 2)
+        with self.assertRaises(SerializationError):
+            dumps(self.table)
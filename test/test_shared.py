@@ -0,0 +1,68 @@
+# encoding: utf-8
+
+import multiprocessing
+from multiprocessing import shared_memory
+from unittest import TestCase
+from fixtures import MyFSM, populate_diagram_fsm
+from cursor import Cursor
+from shared import SharedTable
+
+
+def _worker(shared, sequences, results):
+    table = shared.attach()
+    results.put([(table.match(sequence).accepted, table.match(sequence).state.id) for sequence in sequences])
+    shared.detach()
+
+
+class TestShared(TestCase):
+
+    def setUp(self):
+        # FSM (see test_fsm_diagram.png)
+        self.fsm = populate_diagram_fsm(self, MyFSM())
+        self.table = self.fsm.compile()
+
+    def _assert_unlinked(self, name):
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+    def test_publish_attach_detach(self):
+        shared = SharedTable.publish(self.table)
+        table = shared.attach()
+        self.assertIs(table, shared.table)
+        self.assertListEqual(list(self.table.next_states), list(table.next_states))
+        self.assertTrue(table.next_states.readonly)
+        cursor = Cursor(table)
+        cursor.run('ba')
+        self.assertEqual('q1', cursor.current_state.id)
+        shared.detach()
+        self.assertIsNone(shared.table)
+        self._assert_unlinked(shared.name)
+        # Detaching twice has no effect
+        shared.detach()
+
+    def test_unlinked_by_last_handle(self):
+        shared = SharedTable.publish(self.table)
+        other = SharedTable(shared.name, shared._lock)
+        table = other.attach()
+        shared.detach()
+        self.assertTrue(table.match('bab').accepted)
+        other.detach()
+        self._assert_unlinked(shared.name)
+
+    def test_workers(self):
+        context = multiprocessing.get_context('fork')
+        shared = SharedTable.publish(self.table, context.Lock())
+        sequences = ['bab', 'baba', 'bc', 'cccb']
+        expected = [(self.table.match(sequence).accepted, self.table.match(sequence).state.id)
+                    for sequence in sequences]
+        results = context.Queue()
+        workers = [context.Process(target=_worker, args=(shared, sequences, results)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for _ in workers:
+            self.assertListEqual(expected, results.get(timeout=10))
+        for worker in workers:
+            worker.join()
+            self.assertEqual(0, worker.exitcode)
+        shared.detach()
+        self._assert_unlinked(shared.name)
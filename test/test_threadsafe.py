@@ -0,0 +1,155 @@
+# encoding: utf-8
+
+from threading import Thread
+from unittest import TestCase
+from state import State, DeadState
+from transition import Transition
+from threadsafe import ThreadSafeFSM
+from fixtures import MyThreadSafeFSM
+from fsm_exceptions import *
+
+
+class TestThreadSafeFSM(TestCase):
+
+    def setUp(self):
+        self.fsm = MyThreadSafeFSM()
+        self.enter_count = 0
+        self.exit_count = 0
+
+        # q0 -a-> q1 -a-> q0, 'b' loops in both states
+        self.q0 = State('q0', on_enter=self._enter, on_exit=self._exit)
+        self.q1 = State('q1', final=True, on_enter=self._enter, on_exit=self._exit)
+        self.ds = DeadState('ds')
+        self.fsm.add_state(self.q0)
+        self.fsm.add_state(self.q1)
+        self.fsm.initial_state = self.q0
+        self.fsm.dead_state = self.ds
+        self.q0_a = Transition('a', self.q0, self.q1)
+        self.q1_a = Transition('a', self.q1, self.q0)
+        self.q0_b = Transition('b', self.q0, self.q0)
+        self.q1_b = Transition('b', self.q1, self.q1)
+        for transition in [self.q0_a, self.q1_a, self.q0_b, self.q1_b]:
+            self.fsm.add_transition(transition)
+        self.fsm.validate()
+
+    def _enter(self):
+        self.enter_count += 1
+
+    def _exit(self):
+        self.exit_count += 1
+
+    def test_inherit_only(self):
+        with self.assertRaises(AssertionError):
+            ThreadSafeFSM()
+
+    def test_copy_on_write(self):
+        published = self.fsm._map
+        inner_dict = published['a']
+        self.fsm.remove_transition(self.q1_a)
+        self.assertIsNot(published, self.fsm._map)
+        # Published map is left untouched
+        self.assertIn(self.q1, inner_dict)
+        self.assertNotIn(self.q1, self.fsm._map['a'])
+        self.assertIs(published['b'], self.fsm._map['b'])
+        published = self.fsm._map
+        self.fsm.add_transition(Transition('c', self.q1, self.q0))
+        self.assertNotIn('c', published)
+        self.assertIn('c', self.fsm._alphabet)
+
+    def test_remove_duplicates(self):
+        # Published map must not keep a transition given twice
+        self.fsm.remove_transitions([self.q1_b, self.q1_b])
+        self.assertNotIn(self.q1, self.fsm._map['b'])
+        self.fsm.validate()
+        self.fsm.step('a')
+        self.fsm.step('b')
+        self.assertTrue(self.fsm.is_in_dead_state())
+
+    def test_build_in_place(self):
+        # Map is not copied before it is published by the first validation or step
+        fsm = MyThreadSafeFSM()
+        (q0, q1) = (State('q0'), State('q1', final=True))
+        fsm.add_states([q0, q1])
+        fsm.initial_state = q0
+        fsm.dead_state = DeadState('ds')
+        fsm_map = fsm._map
+        fsm.add_transition(Transition('a', q0, q1))
+        fsm.add_transitions([Transition('a', q1, q0), Transition('b', q0, q0)])
+        self.assertIs(fsm_map, fsm._map)
+        fsm.validate()
+        fsm.add_transition(Transition('b', q1, q1))
+        self.assertIsNot(fsm_map, fsm._map)
+        self.assertNotIn(q1, fsm_map['b'])
+
+    def test_remove_states_waits_for_steps(self):
+        q2 = State('q2')
+        self.fsm.add_state(q2)
+        # A step in progress holds the step lock: the current state cannot change while it is being checked
+        self.fsm._step_lock.acquire()
+        remover = Thread(target=self.fsm.remove_states, args=([q2],))
+        remover.start()
+        remover.join(0.1)
+        self.assertTrue(remover.is_alive())
+        self.assertIn(q2, self.fsm._states)
+        self.fsm._step_lock.release()
+        remover.join()
+        self.assertNotIn(q2, self.fsm._states)
+
+    def test_concurrent_compile(self):
+        errors = []
+
+        def stepper():
+            try:
+                for _ in range(2000):
+                    self.fsm.step('a')
+            except Exception as e:
+                errors.append(e)
+        threads = [Thread(target=stepper) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        table = self.fsm.compile()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual([], errors)
+        # Current index follows the current state across the switch to the table
+        self.assertEqual(self.q0, self.fsm.current_state)
+        self.assertIs(self.fsm.current_state, table.states[self.fsm._current_index])
+
+    def test_concurrent_steps(self):
+        def worker():
+            for _ in range(1000):
+                self.fsm.step('a')
+        threads = [Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Every step was a complete exit -> enter pair, and an even number of 'a' steps leads back to q0
+        self.assertEqual(8000, self.enter_count)
+        self.assertEqual(8000, self.exit_count)
+        self.assertEqual(self.q0, self.fsm.current_state)
+
+    def test_concurrent_edits(self):
+        errors = []
+
+        def stepper():
+            for _ in range(2000):
+                try:
+                    self.fsm.step('b')
+                except ValidationRequired:
+                    pass
+                except Exception as e:
+                    errors.append(e)
+
+        def editor():
+            for _ in range(200):
+                self.fsm.remove_transition(self.q0_b)
+                self.fsm.add_transition(self.q0_b)
+                self.fsm.validate()
+        threads = [Thread(target=stepper) for _ in range(4)] + [Thread(target=editor)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual([], errors)
+        self.assertEqual(self.q0, self.fsm.current_state)
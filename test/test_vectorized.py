@@ -0,0 +1,44 @@
+# encoding: utf-8
+
+from unittest import TestCase, skipIf
+from fixtures import MyFSM, populate_diagram_fsm
+from vectorized import VectorizedStepper, numpy
+
+
+@skipIf(numpy is None, 'numpy is not installed')
+class TestVectorizedStepper(TestCase):
+
+    def setUp(self):
+        # FSM (see test_fsm_diagram.png)
+        self.fsm = populate_diagram_fsm(self, MyFSM())
+        self.stepper = VectorizedStepper(self.fsm.compile())
+
+    def test_step(self):
+        states = self.stepper.state_ids([self.q0, self.q0, self.q1, self.q1, self.ds])
+        symbols = self.stepper.symbol_ids(['b', 'c', 'a', 'c', 'a'])
+        result = self.stepper.step(states, symbols)
+        table = self.stepper.table
+        self.assertListEqual([self.q1, self.q0, self.q1, self.ds, self.ds],
+                             [table.states[state] for state in result.states])
+        self.assertListEqual([True, False, False, True, False], result.changed.tolist())
+        self.assertListEqual([False, True, True, False, True], result.looped.tolist())
+        self.assertListEqual([False, False, False, True, False], result.entered_dead.tolist())
+
+    def test_step_matches_fsm(self):
+        sequences = ['bab', 'aca', 'cccb', 'bcaa', 'abab']
+        states = self.stepper.initial_states(len(sequences))
+        for position in range(4):
+            symbols = self.stepper.symbol_ids([sequence[position % len(sequence)] for sequence in sequences])
+            states = self.stepper.step(states, symbols).states
+        final = self.stepper.is_final(states).tolist()
+        dead = self.stepper.is_dead(states).tolist()
+        for (index, sequence) in enumerate(sequences):
+            cursor = self.fsm.cursor()
+            cursor.run(sequence[position % len(sequence)] for position in range(4))
+            self.assertEqual(cursor.current_state, self.stepper.table.states[states[index]])
+            self.assertEqual(cursor.is_in_final_state(), final[index])
+            self.assertEqual(cursor.is_in_dead_state(), dead[index])
+
+    def test_unknown_symbol(self):
+        with self.assertRaises(AssertionError):
+            self.stepper.symbol_ids(['a', 'unknown_symbol'])